@@ -0,0 +1,253 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .classify import IntentLabel, aclassify_batch, classify_batch
+from .config import CLASSIFY_BATCH_MAX_ITEMS
+from .llm import aclose_models
+from .state import Ticket
+
+
+# ------------------------------ I/O utils ------------------------------
+
+class JsonlWriter:
+    """Append-only JSONL file shared by worker threads; every row is flushed and fsynced."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        if self._f.tell() and not _ends_with_newline(path):
+            self._f.write("\n")  # terminate a torn last line so the next row stays parseable
+
+    def write(self, row: Dict[str, Any]) -> None:
+        line = json.dumps(row, default=str, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._f.write(line)
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self) -> None:
+        self._f.close()
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+def _read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    if not path or not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash; that ticket is simply redone
+
+def completed_ids(output_path: str) -> Set[str]:
+    """Tickets already finished (or parked for approval) in a previous run. Errors are retried."""
+    return {str(r["ticket_id"]) for r in _read_jsonl(output_path) if r.get("status") != "error"}
+
+def iter_tickets(input_path: str, *, skip: Set[str]) -> Iterator[Ticket]:
+    """
+    Stream Ticket rows from JSONL. Each line is a Ticket dict; `channel` and
+    `created_at` may be omitted (defaults: "email", now).
+    """
+    for row in _read_jsonl(input_path):
+        if str(row.get("id")) in skip:
+            continue
+        row.setdefault("channel", "email")
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        yield Ticket(**row)
+
+
+# ------------------------------ Runner ---------------------------------
+
+def _windows(tickets: Iterator[Ticket], size: int) -> Iterator[List[Ticket]]:
+    while True:
+        window = list(islice(tickets, size))
+        if not window:
+            return
+        yield window
+
+def _dump(obj: Any) -> Any:
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, list):
+        return [_dump(x) for x in obj]
+    return obj
+
+def _summarize(ticket: Ticket, thread_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    draft = state.get("draft")
+    return {
+        "ticket_id": ticket.id,
+        "thread_id": thread_id,
+        "status": "pending_approval" if state.get("__interrupt__") else "done",
+        "intents": state.get("intents", []),
+        "missing_requirements": state.get("missing_requirements") or [],
+        "actions": _dump(state.get("actions")),
+        "approvals": state.get("approvals", {}),
+        "executed": _dump(state.get("executed") or []),
+        "draft": getattr(draft, "markdown", None),
+    }
+
+class BatchRunner:
+    """
+    Runs a JSONL file of tickets through the graph with bounded concurrency.
+    Results are appended to `output_path` as each ticket finishes; tickets that
+    stop at the HIL interrupt are also queued to `pending_path` (no stdin prompt).
+    Re-running with the same output skips tickets already recorded there.
+    With `preclassify`, tickets are read in windows and labeled by one bulk
+    classification call per window; the graph's classify node then skips them.
+    """
+
+    def __init__(
+        self,
+        graph: Any,
+        *,
+        output_path: str,
+        pending_path: str,
+        concurrency: int = 8,
+        thread_prefix: str = "batch",
+        preclassify: bool = False,
+        classify_window: int = CLASSIFY_BATCH_MAX_ITEMS,
+    ):
+        self.graph = graph
+        self.output_path = output_path
+        self.pending_path = pending_path
+        self.concurrency = max(1, concurrency)
+        self.thread_prefix = thread_prefix
+        self.preclassify = preclassify
+        self.classify_window = max(1, classify_window)
+        self.counts = {"done": 0, "pending_approval": 0, "error": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def _thread_id(self, ticket: Ticket) -> str:
+        # Deterministic, so a parked ticket can later be resumed with Command(resume=...).
+        return f"{self.thread_prefix}-{ticket.id}"
+
+    def _record(self, out: JsonlWriter, pending: JsonlWriter, ticket: Ticket, thread_id: str,
+                state: Optional[Dict[str, Any]], error: Optional[BaseException]) -> None:
+        if error is not None:
+            row = {"ticket_id": ticket.id, "thread_id": thread_id, "status": "error", "error": repr(error)}
+        else:
+            row = _summarize(ticket, thread_id, state)
+        if row["status"] == "pending_approval":
+            pending.write({
+                "ticket_id": ticket.id,
+                "thread_id": thread_id,
+                "plan": row["actions"],
+                "queued_at": datetime.now(timezone.utc).isoformat(),
+            })
+        out.write(row)
+        with self._lock:
+            self.counts[row["status"]] += 1
+
+    @staticmethod
+    def _input(ticket: Ticket, label: Optional[IntentLabel]) -> Dict[str, Any]:
+        if label is None:
+            return {"ticket": ticket}
+        return {"ticket": ticket, "preclassified": {"intents": label.intents, "severity": label.severity}}
+
+    def _process(self, out: JsonlWriter, pending: JsonlWriter, ticket: Ticket,
+                 label: Optional[IntentLabel] = None) -> None:
+        thread_id = self._thread_id(ticket)
+        try:
+            state = self.graph.invoke(self._input(ticket, label), {"configurable": {"thread_id": thread_id}})
+        except Exception as e:
+            self._record(out, pending, ticket, thread_id, None, e)
+        else:
+            self._record(out, pending, ticket, thread_id, state, None)
+
+    async def _aprocess(self, out: JsonlWriter, pending: JsonlWriter, ticket: Ticket,
+                        label: Optional[IntentLabel] = None) -> None:
+        thread_id = self._thread_id(ticket)
+        try:
+            state = await self.graph.ainvoke(self._input(ticket, label), {"configurable": {"thread_id": thread_id}})
+        except Exception as e:
+            self._record(out, pending, ticket, thread_id, None, e)
+        else:
+            self._record(out, pending, ticket, thread_id, state, None)
+
+    def _tickets(self, input_path: str) -> Iterator[Ticket]:
+        done = completed_ids(self.output_path)
+        self.counts["skipped"] = len(done)
+        return iter_tickets(input_path, skip=done)
+
+    def _labeled(self, tickets: Iterator[Ticket]) -> Iterator[Tuple[Ticket, Optional[IntentLabel]]]:
+        if not self.preclassify:
+            for ticket in tickets:
+                yield ticket, None
+            return
+        for window in _windows(tickets, self.classify_window):
+            try:
+                labels = classify_batch((t.id, t.text) for t in window)
+            except Exception:
+                labels = {}  # fall back to per-ticket classification inside the graph
+            for ticket in window:
+                yield ticket, labels.get(ticket.id)
+
+    def run(self, input_path: str) -> Dict[str, int]:
+        """Thread-pool mode: up to `concurrency` tickets in flight, input read lazily."""
+        tickets = self._tickets(input_path)
+        out, pending = JsonlWriter(self.output_path), JsonlWriter(self.pending_path)
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as pool:
+                in_flight = set()
+                for ticket, label in self._labeled(tickets):
+                    if len(in_flight) >= self.concurrency:
+                        _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    in_flight.add(pool.submit(self._process, out, pending, ticket, label))
+                wait(in_flight)
+        finally:
+            out.close()
+            pending.close()
+        return dict(self.counts)
+
+    async def arun(self, input_path: str) -> Dict[str, int]:
+        """Async mode: `concurrency` workers on one event loop via graph.ainvoke."""
+        tickets = self._tickets(input_path)
+        out, pending = JsonlWriter(self.output_path), JsonlWriter(self.pending_path)
+
+        queue: "asyncio.Queue[Optional[Tuple[Ticket, Optional[IntentLabel]]]]" = asyncio.Queue(self.concurrency * 2)
+
+        async def producer() -> None:
+            # Reads (and, with preclassify, bulk-labels) the next window while workers drain the queue.
+            try:
+                size = self.classify_window if self.preclassify else 1
+                for window in _windows(tickets, size):
+                    labels: Dict[str, IntentLabel] = {}
+                    if self.preclassify:
+                        try:
+                            labels = await aclassify_batch((t.id, t.text) for t in window)
+                        except Exception:
+                            labels = {}
+                    for ticket in window:
+                        await queue.put((ticket, labels.get(ticket.id)))
+            finally:
+                for _ in range(self.concurrency):
+                    await queue.put(None)
+
+        async def worker() -> None:
+            while (item := await queue.get()) is not None:
+                await self._aprocess(out, pending, *item)
+
+        try:
+            await asyncio.gather(producer(), *(worker() for _ in range(self.concurrency)))
+        finally:
+            out.close()
+            pending.close()
+            await aclose_models()
+        return dict(self.counts)
@@ -0,0 +1,190 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+_TOKEN = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+# ------------------------------ Index ----------------------------------
+
+class BM25Index:
+    """
+    Compact BM25 inverted index over numpy arrays.
+
+    Postings are stored term-major (CSR): for term t, rows indptr[t]:indptr[t+1]
+    of `post_doc` / `post_tf` list the documents containing it. The full BM25
+    contribution of every posting is precomputed into `post_w`, so a query is a
+    gather of its terms' postings plus one bincount, and top-k is a partial sort.
+    Instances are immutable; `updated()` returns a new index.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        post_doc: np.ndarray,
+        post_tf: np.ndarray,
+        doc_len: np.ndarray,
+        *,
+        k1: float = 1.5,
+        b: float = 0.75,
+        post_w: Optional[np.ndarray] = None,
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.post_doc = post_doc
+        self.post_tf = post_tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.post_w = post_w if post_w is not None else self._weights()
+
+    @property
+    def n_docs(self) -> int:
+        return int(self.doc_len.shape[0])
+
+    # ---- build ----
+
+    @classmethod
+    def from_tokens(cls, docs_tokens: Sequence[Sequence[str]], **params: Any) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        lookup = vocab.setdefault
+        doc_len = np.fromiter((len(toks) for toks in docs_tokens), dtype=np.int64, count=len(docs_tokens))
+        flat = np.fromiter(
+            (lookup(tok, len(vocab)) for toks in docs_tokens for tok in toks),
+            dtype=np.int64, count=int(doc_len.sum()),
+        )
+        # Count (doc, term) pairs in one vectorized pass instead of per-document dicts.
+        owner = np.repeat(np.arange(len(docs_tokens), dtype=np.int64), doc_len)
+        pairs, tfs = np.unique(owner * max(len(vocab), 1) + flat, return_counts=True)
+        docs, terms = np.divmod(pairs, max(len(vocab), 1))
+        return cls._from_coo(
+            vocab,
+            terms.astype(np.int32),
+            docs.astype(np.int32),
+            tfs.astype(np.float32),
+            doc_len.astype(np.float32),
+            **params,
+        )
+
+    @classmethod
+    def _from_coo(cls, vocab, terms, docs, tfs, doc_len, **params: Any) -> "BM25Index":
+        order = np.lexsort((docs, terms))
+        terms, docs, tfs = terms[order], docs[order], tfs[order]
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=indptr[1:])
+        return cls(vocab, indptr, docs, tfs, doc_len, **params)
+
+    def _weights(self) -> np.ndarray:
+        n = max(self.n_docs, 1)
+        df = np.diff(self.indptr).astype(np.float32)
+        # Lucene-style IDF: always positive, unlike classic Okapi for very common terms.
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(self.doc_len.mean()) if self.n_docs else 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_len / max(avgdl, 1e-9))
+        term_of_post = np.repeat(np.arange(len(df), dtype=np.int32), np.diff(self.indptr))
+        tf = self.post_tf
+        return (idf[term_of_post] * tf * (self.k1 + 1.0) / (tf + norm[self.post_doc])).astype(np.float32)
+
+    # ---- edit ----
+
+    def updated(self, *, remove: Iterable[int] = (), add_tokens: Sequence[Sequence[str]] = ()) -> "BM25Index":
+        """
+        New index with the given document positions removed and new documents
+        appended (surviving docs keep their relative order). Existing postings
+        are filtered and re-sorted as arrays; only new documents are tokenized.
+        """
+        counts = np.diff(self.indptr)
+        terms = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+        docs, tfs, doc_len = self.post_doc, self.post_tf, self.doc_len
+
+        drop = np.fromiter(remove, dtype=np.int64)
+        if drop.size:
+            keep_doc = np.ones(self.n_docs, dtype=bool)
+            keep_doc[drop] = False
+            remap = np.cumsum(keep_doc, dtype=np.int64) - 1
+            keep_post = keep_doc[docs]
+            terms, docs, tfs = terms[keep_post], remap[docs[keep_post]].astype(np.int32), tfs[keep_post]
+            doc_len = doc_len[keep_doc]
+
+        vocab = dict(self.vocab)
+        if add_tokens:
+            fresh = BM25Index.from_tokens(add_tokens, k1=self.k1, b=self.b)
+            # Map the new docs' local term ids into the shared vocabulary.
+            local_to_global = np.empty(len(fresh.vocab), dtype=np.int32)
+            for tok, local in fresh.vocab.items():
+                local_to_global[local] = vocab.setdefault(tok, len(vocab))
+            f_terms = np.repeat(local_to_global, np.diff(fresh.indptr))
+            terms = np.concatenate([terms, f_terms])
+            docs = np.concatenate([docs, fresh.post_doc + np.int32(doc_len.shape[0])])
+            tfs = np.concatenate([tfs, fresh.post_tf])
+            doc_len = np.concatenate([doc_len, fresh.doc_len])
+
+        # Terms whose last document was removed keep an empty postings row.
+        return BM25Index._from_coo(vocab, terms, docs, tfs, doc_len, k1=self.k1, b=self.b)
+
+    # ---- query ----
+
+    def scores(self, tokens: Sequence[str]) -> np.ndarray:
+        rows = [self.vocab[t] for t in tokens if t in self.vocab]
+        if not rows or not self.n_docs:
+            return np.zeros(self.n_docs, dtype=np.float32)
+        docs = np.concatenate([self.post_doc[self.indptr[t]:self.indptr[t + 1]] for t in rows])
+        weights = np.concatenate([self.post_w[self.indptr[t]:self.indptr[t + 1]] for t in rows])
+        return np.bincount(docs, weights=weights, minlength=self.n_docs)
+
+    def top_k(self, tokens: Sequence[str], k: int) -> List[Tuple[int, float]]:
+        """(doc position, score) pairs, best first; documents with no matching term are omitted."""
+        scores = self.scores(tokens)
+        hits = np.flatnonzero(scores > 0)
+        if hits.size > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+
+# ----------------------------- Retriever -------------------------------
+
+class NativeBM25Retriever(BaseRetriever):
+    """
+    Sparse leg for SimpleHybridRetriever backed by BM25Index.
+    `docs[i]` / `ids[i]` describe document position i in the index.
+    """
+
+    index: Any
+    docs: List[Document]
+    ids: List[str]
+    k: int = 4
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_documents(cls, docs: List[Document], ids: List[str], **kwargs: Any) -> "NativeBM25Retriever":
+        index = BM25Index.from_tokens([tokenize(d.page_content) for d in docs])
+        return cls(index=index, docs=list(docs), ids=list(ids), **kwargs)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: Any = None) -> List[Document]:
+        return [self.docs[i] for i, _ in self.index.top_k(tokenize(query), self.k)]
+
+    def updated(self, *, remove_ids: Iterable[str] = (), add: Sequence[Tuple[str, Document]] = ()) -> "NativeBM25Retriever":
+        """Copy with chunks retired by id and (id, Document) pairs appended."""
+        gone = set(remove_ids)
+        positions = [i for i, doc_id in enumerate(self.ids) if doc_id in gone]
+        index = self.index.updated(remove=positions, add_tokens=[tokenize(d.page_content) for _, d in add])
+        keep = [i for i, doc_id in enumerate(self.ids) if doc_id not in gone]
+        return self.model_copy(update={
+            "index": index,
+            "docs": [self.docs[i] for i in keep] + [d for _, d in add],
+            "ids": [self.ids[i] for i in keep] + [doc_id for doc_id, _ in add],
+        })
@@ -0,0 +1,394 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+    writes_sort_key,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from .config import CHECKPOINT_KEEP_LAST, CHECKPOINT_TTL_S, CHECKPOINT_WRITE_BATCH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    parent_id TEXT, type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB,
+    versions TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, channel TEXT NOT NULL, version TEXT NOT NULL,
+    type TEXT, value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL, checkpoint_ns TEXT NOT NULL, checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL, idx INTEGER NOT NULL, channel TEXT, type TEXT, value BLOB, task_path TEXT,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY, closed_at REAL
+);
+"""
+
+_THREAD_TABLES = ("checkpoints", "blobs", "writes", "threads")
+
+
+class SQLiteSaver(BaseCheckpointSaver[int]):
+    """
+    LangGraph checkpointer on a local SQLite file (WAL).
+    - Channel values are stored once per version (blobs), not per checkpoint.
+    - Only the latest `keep_last` checkpoints per thread are kept (0 = all).
+    - Threads marked closed are deleted `ttl` seconds later (0 = never).
+    - Pending writes are buffered and flushed in one executemany on the next
+      checkpoint, read, or once `write_batch` rows pile up. Interrupt/error
+      writes flush immediately so parked HIL tickets are never lost.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        keep_last: int = 5,
+        ttl: float = 0.0,
+        write_batch: int = 64,
+        serde: Any = None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep_last = keep_last
+        self.ttl = ttl
+        self.write_batch = max(1, write_batch)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._pending: List[Tuple[bool, tuple]] = []  # (replace?, writes row)
+        self._last_prune = 0.0
+
+    # ---- helpers ----
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+        ignore = [row for replace, row in self._pending if not replace]
+        replace = [row for replace, row in self._pending if replace]
+        self._pending = []
+        cols = "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path)"
+        marks = "(?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        with self._conn:
+            if ignore:
+                self._conn.executemany(f"INSERT OR IGNORE INTO writes {cols} VALUES {marks}", ignore)
+            if replace:
+                self._conn.executemany(f"INSERT OR REPLACE INTO writes {cols} VALUES {marks}", replace)
+
+    def flush(self) -> None:
+        """Write any buffered pending writes."""
+        with self._lock:
+            self._flush_locked()
+
+    def _tuple(self, thread_id: str, checkpoint_ns: str, row: tuple) -> CheckpointTuple:
+        checkpoint_id, parent_id, ctype, cblob, mtype, mblob, _ = row
+        checkpoint: Checkpoint = self.serde.loads_typed((ctype, cblob))
+        wanted = {(ch, str(v)) for ch, v in checkpoint["channel_versions"].items()}
+        values: Dict[str, Any] = {}
+        # Compaction keeps a thread's blob set small, so one scan beats a query per channel.
+        for channel, version, btype, value in self._conn.execute(
+            "SELECT channel, version, type, value FROM blobs WHERE thread_id=? AND checkpoint_ns=?",
+            (thread_id, checkpoint_ns),
+        ):
+            if (channel, version) in wanted and btype != "empty":
+                values[channel] = self.serde.loads_typed((btype, value))
+        writes = self._conn.execute(
+            "SELECT task_id, idx, channel, type, value, task_path FROM writes "
+            "WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        writes.sort(key=lambda w: writes_sort_key(w[5] or "", w[0], w[1]))
+        return CheckpointTuple(
+            config={"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            checkpoint={**checkpoint, "channel_values": values},
+            metadata=self.serde.loads_typed((mtype, mblob)),
+            pending_writes=[(w[0], w[2], self.serde.loads_typed((w[3], w[4]))) for w in writes],
+            parent_config=(
+                {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id}}
+                if parent_id else None
+            ),
+        )
+
+    def _compact_locked(self, thread_id: str, checkpoint_ns: str) -> None:
+        """Drop all but the newest `keep_last` checkpoints of a thread, plus orphaned writes/blobs."""
+        if self.keep_last <= 0:
+            return
+        rows = self._conn.execute(
+            "SELECT checkpoint_id, versions FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? "
+            "ORDER BY checkpoint_id DESC",
+            (thread_id, checkpoint_ns),
+        ).fetchall()
+        if len(rows) <= self.keep_last:
+            return
+        keep = rows[:self.keep_last]
+        live = {(ch, str(v)) for _, versions in keep for ch, v in json.loads(versions).items()}
+        oldest_kept = keep[-1][0]
+        stale_blobs = [
+            (thread_id, checkpoint_ns, ch, ver)
+            for ch, ver in self._conn.execute(
+                "SELECT channel, version FROM blobs WHERE thread_id=? AND checkpoint_ns=?", (thread_id, checkpoint_ns)
+            )
+            if (ch, ver) not in live
+        ]
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id<?",
+                (thread_id, checkpoint_ns, oldest_kept),
+            )
+            self._conn.execute(
+                "DELETE FROM writes WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id<?",
+                (thread_id, checkpoint_ns, oldest_kept),
+            )
+            self._conn.executemany(
+                "DELETE FROM blobs WHERE thread_id=? AND checkpoint_ns=? AND channel=? AND version=?", stale_blobs
+            )
+
+    # ---- retention ----
+
+    def mark_closed(self, thread_id: str) -> None:
+        """Start the TTL clock for a finished thread (a new run on it reopens it)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO threads (thread_id, closed_at) VALUES (?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET closed_at=excluded.closed_at",
+                (thread_id, time.time()),
+            )
+
+    def prune_closed(self, ttl: Optional[float] = None) -> int:
+        """Delete threads closed more than `ttl` seconds ago. Returns how many were removed."""
+        ttl = self.ttl if ttl is None else ttl
+        cutoff = time.time() - ttl
+        with self._lock:
+            self._flush_locked()
+            expired = [r[0] for r in self._conn.execute(
+                "SELECT thread_id FROM threads WHERE closed_at IS NOT NULL AND closed_at<=?", (cutoff,)
+            )]
+            with self._conn:
+                for table in _THREAD_TABLES:
+                    self._conn.executemany(f"DELETE FROM {table} WHERE thread_id=?", [(t,) for t in expired])
+            self._last_prune = time.monotonic()
+        return len(expired)
+
+    def _maybe_prune_locked(self) -> None:
+        # Amortized: at most one sweep per minute (or per TTL, if shorter).
+        if self.ttl > 0 and time.monotonic() - self._last_prune >= min(60.0, self.ttl):
+            self.prune_closed()
+
+    # ---- BaseCheckpointSaver ----
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            self._flush_locked()
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata, versions "
+                    "FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? AND checkpoint_id=?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata, versions "
+                    "FROM checkpoints WHERE thread_id=? AND checkpoint_ns=? ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            tup = self._tuple(thread_id, checkpoint_ns, row)
+        if checkpoint_id:
+            # Keep the caller's config (it may carry extra configurable keys).
+            tup = tup._replace(config=config)
+        return tup
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        where, args = [], []
+        if config:
+            where.append("thread_id=?")
+            args.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                where.append("checkpoint_ns=?")
+                args.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id=?")
+                args.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id<?")
+            args.append(before_id)
+        sql = ("SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata_type, metadata, versions "
+               "FROM checkpoints" + (" WHERE " + " AND ".join(where) if where else "") +
+               " ORDER BY thread_id, checkpoint_ns, checkpoint_id DESC")
+        with self._lock:
+            self._flush_locked()
+            rows = self._conn.execute(sql, args).fetchall()
+        for row in rows:
+            if limit is not None and limit <= 0:
+                break
+            if filter:
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+            with self._lock:
+                tup = self._tuple(row[0], row[1], row[2:])
+            if limit is not None:
+                limit -= 1
+            yield tup
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values: Dict[str, Any] = c.pop("channel_values")  # type: ignore[misc]
+        blobs = [
+            (thread_id, checkpoint_ns, ch, str(v),
+             *(self.serde.dumps_typed(values[ch]) if ch in values else ("empty", b"")))
+            for ch, v in new_versions.items()
+        ]
+        ctype, cblob = self.serde.dumps_typed(c)
+        meta = get_checkpoint_metadata(config, metadata)
+        mtype, mblob = self.serde.dumps_typed(meta)
+        with self._lock:
+            self._flush_locked()
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?)", blobs)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                     ctype, cblob, mtype, mblob, json.dumps(checkpoint["channel_versions"], default=str)),
+                )
+                if meta.get("source") == "input":
+                    # A new run on this thread: it's live again.
+                    self._conn.execute("DELETE FROM threads WHERE thread_id=?", (thread_id,))
+            self._compact_locked(thread_id, checkpoint_ns)
+            self._maybe_prune_locked()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows, urgent = [], False
+        for i, (channel, value) in enumerate(writes):
+            idx = WRITES_IDX_MAP.get(channel, i)
+            urgent = urgent or idx < 0
+            rows.append((idx < 0, (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel,
+                                   *self.serde.dumps_typed(value), task_path)))
+        with self._lock:
+            self._pending.extend(rows)
+            if urgent or len(self._pending) >= self.write_batch:
+                self._flush_locked()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._flush_locked()
+            with self._conn:
+                for table in _THREAD_TABLES:
+                    self._conn.execute(f"DELETE FROM {table} WHERE thread_id=?", (thread_id,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            self._conn.close()
+
+    # SQLite calls are short and serialized by the lock; run them off the event loop.
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+# State models that may be deserialized from a checkpoint file.
+_STATE_TYPES = [("app.state", name) for name in
+                ("Ticket", "RetrievalChunk", "DraftReply", "ActionStep", "ActionPlan", "ToolResult")]
+
+def make_checkpointer(backend: str, path: str) -> BaseCheckpointSaver:
+    """"memory" (InMemorySaver, lost on restart) or "sqlite" (SQLiteSaver at `path`)."""
+    serde = JsonPlusSerializer(allowed_msgpack_modules=_STATE_TYPES)
+    if backend == "sqlite":
+        return SQLiteSaver(
+            path,
+            keep_last=CHECKPOINT_KEEP_LAST,
+            ttl=CHECKPOINT_TTL_S,
+            write_batch=CHECKPOINT_WRITE_BATCH,
+            serde=serde,
+        )
+    if backend == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver(serde=serde)
+    raise ValueError(f"Unknown CHECKPOINT_BACKEND {backend!r} (expected 'memory' or 'sqlite')")
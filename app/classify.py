@@ -1,21 +1,200 @@
 # Copyright Lukas Licon 2025. All Rights Reserved.
+import asyncio
+import json
 import os
+import threading
 from pydantic import BaseModel, Field
-from typing import List, Literal
-from langchain_openai import ChatOpenAI
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Optional, Tuple
+from langchain_core.messages import HumanMessage, SystemMessage
+from .config import CLASSIFY_BATCH_MAX_ITEMS, CLASSIFY_BATCH_TOKEN_BUDGET, CLASSIFY_FAST_PATH
+from .keywords import KeywordMatcher
+from .limits import LLM_LIMIT
+from .llm import get_chat_model, get_structured_model
+from .plan import _looks_like_billing
 
 class IntentLabel(BaseModel):
     intents: List[str] = Field(description="billing, access, bug, feature, outage")
     severity: Literal["low", "normal", "high"]
 
-def get_llm():
+class TicketIntentLabel(IntentLabel):
+    ticket_id: str
+
+class BatchIntentLabels(BaseModel):
+    items: List[TicketIntentLabel] = Field(description="exactly one entry per input ticket_id")
+
+def _api_key() -> str:
     key = os.getenv("OPENAI_API_KEY")
     if not key:
         raise RuntimeError("OPENAI_API_KEY is not set. Set it or create a .env file.")
-    return ChatOpenAI(model="gpt-4o-mini", api_key=key)
+    return key
+
+def get_llm():
+    return get_chat_model(api_key=_api_key(), model="gpt-4o-mini")
+
+# ---- local fast path ----
+
+# Signals for the non-billing intents. If any fire, the ticket is ambiguous and goes to the LLM.
+_OTHER_INTENTS = {
+    "access": ["login", "log in", "signin", "sign in", "password", "locked out", "2fa", "mfa", "can't access", "cant access"],
+    "bug": ["bug", "crash", "crashes", "crashed", "error", "broken", "not working"],
+    "feature": ["feature request", "please add", "would be nice"],
+    "outage": ["outage", "is down", "site down", "unavailable"],
+}
+_OTHER_INTENT_MATCHER = KeywordMatcher(kw for kws in _OTHER_INTENTS.values() for kw in kws)
+_HIGH_SEVERITY = KeywordMatcher(["chargeback", "fraud", "lawyer", "legal action", "dispute"])
+
+# Optional lightweight local model: text -> IntentLabel when confident, else None.
+_local_model: Optional[Callable[[str], Optional[IntentLabel]]] = None
+
+_stats: Dict[str, int] = {"local": 0, "llm": 0}
+_stats_lock = threading.Lock()
+
+def register_local_classifier(fn: Optional[Callable[[str], Optional[IntentLabel]]]) -> None:
+    """Install (or clear with None) a local model consulted after the keyword rules."""
+    global _local_model
+    _local_model = fn
+
+def classify_fast(text: str) -> Optional[IntentLabel]:
+    """
+    Deterministic first tier. Returns a label only for unambiguous refund
+    tickets (refund keywords, no other-intent signals); None means "ask the LLM".
+    """
+    if _looks_like_billing(text) and not _OTHER_INTENT_MATCHER.search(text):
+        severity = "high" if _HIGH_SEVERITY.search(text) else "normal"
+        return IntentLabel(intents=["billing"], severity=severity)
+    if _local_model is not None:
+        return _local_model(text)
+    return None
+
+def classify_stats() -> Dict[str, float]:
+    """How many tickets were labeled locally vs. by the LLM."""
+    with _stats_lock:
+        local, llm = _stats["local"], _stats["llm"]
+    total = local + llm
+    return {"local": local, "llm": llm, "local_fraction": (local / total) if total else 0.0}
+
+def _count(tier: str) -> None:
+    with _stats_lock:
+        _stats[tier] += 1
+
+def _local_label(text: str) -> Optional[IntentLabel]:
+    if CLASSIFY_FAST_PATH:
+        label = classify_fast(text)
+        if label is not None:
+            _count("local")
+            return label
+    _count("llm")
+    return None
 
 def classify(text: str) -> IntentLabel:
-    llm = get_llm()
-    classifier = llm.with_structured_output(IntentLabel)
+    label = _local_label(text)
+    if label is not None:
+        return label
+    classifier = get_structured_model(IntentLabel, api_key=_api_key(), model="gpt-4o-mini")
     # ❗️Pass a STRING, not {"input": ...}
     return classifier.invoke(text)
+
+async def aclassify(text: str) -> IntentLabel:
+    label = _local_label(text)
+    if label is not None:
+        return label
+    classifier = get_structured_model(IntentLabel, api_key=_api_key(), model="gpt-4o-mini")
+    async with LLM_LIMIT:
+        return await classifier.ainvoke(text)
+
+
+# ---- bulk classification ----
+
+_BATCH_SYSTEM = (
+    "You classify customer support tickets. For EVERY ticket in the input, return one item "
+    "with its exact ticket_id, intents (any of: billing, access, bug, feature, outage) and "
+    "severity (low, normal, high). Do not skip, merge or invent tickets."
+)
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 chars/token for English, plus per-item JSON and label overhead.
+    return len(text) // 4 + 24
+
+def _token_batches(items: List[Tuple[str, str]]) -> Iterator[List[Tuple[str, str]]]:
+    batch: List[Tuple[str, str]] = []
+    used = 0
+    for tid, text in items:
+        cost = _estimate_tokens(text)
+        if batch and (used + cost > CLASSIFY_BATCH_TOKEN_BUDGET or len(batch) >= CLASSIFY_BATCH_MAX_ITEMS):
+            yield batch
+            batch, used = [], 0
+        batch.append((tid, text))
+        used += cost
+    if batch:
+        yield batch
+
+def _batch_messages(batch: List[Tuple[str, str]]):
+    lines = "\n".join(json.dumps({"ticket_id": tid, "text": text}, ensure_ascii=False) for tid, text in batch)
+    return [SystemMessage(content=_BATCH_SYSTEM), HumanMessage(content=lines)]
+
+def _collect(batch: List[Tuple[str, str]], result: Optional[BatchIntentLabels]) -> Tuple[Dict[str, IntentLabel], List[Tuple[str, str]]]:
+    """Split a batch response into parsed labels and the tickets it failed to cover."""
+    wanted = {tid for tid, _ in batch}
+    got: Dict[str, IntentLabel] = {}
+    for item in getattr(result, "items", None) or []:
+        if item.ticket_id in wanted and item.ticket_id not in got:
+            got[item.ticket_id] = IntentLabel(intents=item.intents, severity=item.severity)
+    return got, [(tid, text) for tid, text in batch if tid not in got]
+
+def _split_local(tickets: Iterable[Tuple[str, str]]) -> Tuple[Dict[str, IntentLabel], List[Tuple[str, str]]]:
+    labels: Dict[str, IntentLabel] = {}
+    remote: List[Tuple[str, str]] = []
+    for tid, text in tickets:
+        label = _local_label(text)
+        if label is not None:
+            labels[tid] = label
+        else:
+            remote.append((tid, text))
+    return labels, remote
+
+def classify_batch(tickets: Iterable[Tuple[str, str]]) -> Dict[str, IntentLabel]:
+    """
+    Classify many (ticket_id, text) pairs. Clear-cut tickets use the local fast
+    path; the rest are packed into structured requests bounded by
+    CLASSIFY_BATCH_TOKEN_BUDGET / CLASSIFY_BATCH_MAX_ITEMS. Tickets a batch
+    response drops or garbles are retried one by one.
+    """
+    labels, remote = _split_local(tickets)
+    if not remote:
+        return labels
+    batcher = get_structured_model(BatchIntentLabels, api_key=_api_key(), model="gpt-4o-mini")
+    single = get_structured_model(IntentLabel, api_key=_api_key(), model="gpt-4o-mini")
+    for batch in _token_batches(remote):
+        try:
+            result = batcher.invoke(_batch_messages(batch))
+        except Exception:
+            result = None
+        got, leftovers = _collect(batch, result)
+        labels.update(got)
+        for tid, text in leftovers:
+            labels[tid] = single.invoke(text)
+    return labels
+
+async def aclassify_batch(tickets: Iterable[Tuple[str, str]]) -> Dict[str, IntentLabel]:
+    """Async classify_batch; token batches are sent concurrently under the LLM limit."""
+    labels, remote = _split_local(tickets)
+    if not remote:
+        return labels
+    batcher = get_structured_model(BatchIntentLabels, api_key=_api_key(), model="gpt-4o-mini")
+    single = get_structured_model(IntentLabel, api_key=_api_key(), model="gpt-4o-mini")
+
+    async def one_batch(batch: List[Tuple[str, str]]) -> Dict[str, IntentLabel]:
+        try:
+            async with LLM_LIMIT:
+                result = await batcher.ainvoke(_batch_messages(batch))
+        except Exception:
+            result = None
+        got, leftovers = _collect(batch, result)
+        for tid, text in leftovers:
+            async with LLM_LIMIT:
+                got[tid] = await single.ainvoke(text)
+        return got
+
+    for got in await asyncio.gather(*(one_batch(b) for b in _token_batches(remote))):
+        labels.update(got)
+    return labels
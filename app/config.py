@@ -8,6 +8,18 @@ def _int(name: str, default: int) -> int:
     except Exception:
         return default
 
+def _float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+def _bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
+
 # Dollar thresholds expressed in cents
 REFUND_CAP_CENTS              = _int("REFUND_CAP_CENTS", 5000)   # $50 policy cap
 LOW_THRESHOLD_CENTS           = _int("LOW_THRESHOLD_CENTS", 2000) # <=$20 auto
@@ -16,9 +28,84 @@ MEDIUM_THRESHOLD_CENTS        = _int("MEDIUM_THRESHOLD_CENTS", 5000) # >$20 & <=
 
 EXPLANATION_MIN_CHARS = int(os.getenv("EXPLANATION_MIN_CHARS", "0"))
 
+# Refund blocks + evidence rules (JSON/YAML policy pack); "" = bundled app/policies/default.json
+POLICY_PACK_PATH              = os.getenv("POLICY_PACK_PATH", "")
+
 # Models
 OPENAI_CHAT_MODEL             = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
 OPENAI_EMBED_MODEL            = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small")
 
+# Drafting: "template" (rendered per disposition, no LLM), "polish" (template rewritten by the LLM), "llm" (free-form)
+DRAFT_MODE                    = os.getenv("DRAFT_MODE", "template").lower()
+# LLM draft cache keyed by model + fully rendered prompt; size 0 disables
+DRAFT_CACHE_SIZE              = _int("DRAFT_CACHE_SIZE", 512)
+DRAFT_CACHE_TTL_S             = _float("DRAFT_CACHE_TTL_S", 3600.0)
+# Settlement time quoted in approved replies (e.g. "3-5") when no KB snippet states one; "" = "a few"
+REFUND_SETTLEMENT_DAYS        = os.getenv("REFUND_SETTLEMENT_DAYS", "")
+# Follow-up time quoted in escalated replies (e.g. "1-2"); "" = no timeframe promised
+ESCALATION_RESPONSE_DAYS      = os.getenv("ESCALATION_RESPONSE_DAYS", "")
+
+# Shared OpenAI HTTP client pool (one per process / event loop)
+LLM_MAX_CONNECTIONS           = _int("LLM_MAX_CONNECTIONS", 100)
+LLM_MAX_KEEPALIVE             = _int("LLM_MAX_KEEPALIVE", 20)
+LLM_KEEPALIVE_EXPIRY_S        = _float("LLM_KEEPALIVE_EXPIRY_S", 60.0)
+LLM_TIMEOUT_S                 = _float("LLM_TIMEOUT_S", 60.0)
+LLM_MAX_RETRIES               = _int("LLM_MAX_RETRIES", 2)
+
+# Max in-flight calls per external dependency when running the graph async
+LLM_MAX_CONCURRENCY           = _int("LLM_MAX_CONCURRENCY", 32)
+EMBED_MAX_CONCURRENCY         = _int("EMBED_MAX_CONCURRENCY", 32)
+TOOL_MAX_CONCURRENCY          = _int("TOOL_MAX_CONCURRENCY", 16)
+
+# Classify clear-cut refund tickets locally; only ambiguous ones call the LLM
+CLASSIFY_FAST_PATH            = _bool("CLASSIFY_FAST_PATH", True)
+# Bulk classification: estimated prompt tokens and tickets per structured request
+CLASSIFY_BATCH_TOKEN_BUDGET   = _int("CLASSIFY_BATCH_TOKEN_BUDGET", 6000)
+CLASSIFY_BATCH_MAX_ITEMS      = _int("CLASSIFY_BATCH_MAX_ITEMS", 50)
+
+# Embedding cache: in-process LRU entries, plus an optional SQLite file ("" disables)
+EMBED_CACHE_SIZE              = _int("EMBED_CACHE_SIZE", 10000)
+EMBED_CACHE_PATH              = os.getenv("EMBED_CACHE_PATH", "")
+
+# Retriever construction: "lazy" (first ticket), "background" (thread at import), "eager" (at import)
+RETRIEVER_WARMUP              = os.getenv("RETRIEVER_WARMUP", "lazy").lower()
+
+# Hybrid retrieval: each leg runs on its own pool of RETRIEVER_LEG_WORKERS in-flight
+# calls and is dropped from fusion past its timeout; timeouts in seconds (0 = no limit)
+RETRIEVER_SPARSE_TIMEOUT_S    = _float("RETRIEVER_SPARSE_TIMEOUT_S", 2.0) or None
+RETRIEVER_DENSE_TIMEOUT_S     = _float("RETRIEVER_DENSE_TIMEOUT_S", 3.0) or None
+RETRIEVER_LEG_WORKERS         = _int("RETRIEVER_LEG_WORKERS", 32)
+# Chunks kept after RRF fusion (0 = keep every fused candidate)
+RETRIEVER_FINAL_K             = _int("RETRIEVER_FINAL_K", 8) or None
+
+# Retrieval result cache (normalized ticket text + KB version); size 0 disables
+RETRIEVAL_CACHE_SIZE          = _int("RETRIEVAL_CACHE_SIZE", 1024)
+RETRIEVAL_CACHE_TTL_S         = _float("RETRIEVAL_CACHE_TTL_S", 300.0)
+
+# On-disk KB index (FAISS + docstore + BM25 stats), keyed by KB content hash; "" disables
+KB_INDEX_DIR                  = os.getenv("KB_INDEX_DIR", ".kb_index") or None
+# Published index versions kept on disk; older ones are deleted after each save (0 = keep all)
+KB_INDEX_KEEP                 = _int("KB_INDEX_KEEP", 2)
+
+# Graph checkpoints: "memory" (lost on restart) or "sqlite" (WAL file; parked HIL tickets survive restarts)
+CHECKPOINT_BACKEND            = os.getenv("CHECKPOINT_BACKEND", "memory").lower()
+CHECKPOINT_DB_PATH            = os.getenv("CHECKPOINT_DB_PATH", ".checkpoints.sqlite")
+# SQLite retention: checkpoints kept per thread (0 = all), seconds a closed thread is kept (0 = forever)
+CHECKPOINT_KEEP_LAST          = _int("CHECKPOINT_KEEP_LAST", 5)
+CHECKPOINT_TTL_S              = _float("CHECKPOINT_TTL_S", 86400.0)
+# Pending node writes buffered before one batched insert
+CHECKPOINT_WRITE_BATCH        = _int("CHECKPOINT_WRITE_BATCH", 64)
+
+# Tool idempotency store (SQLite; ":memory:" = this process only, "" = off) and retention of finished calls
+IDEMPOTENCY_DB_PATH           = os.getenv("IDEMPOTENCY_DB_PATH", ".idempotency.sqlite")
+IDEMPOTENCY_TTL_S             = _float("IDEMPOTENCY_TTL_S", 7 * 86400.0)
+# Seconds a pending tool call holds its key; after a crash the call is retried once this expires (0 = never)
+IDEMPOTENCY_LEASE_S           = _float("IDEMPOTENCY_LEASE_S", 300.0)
+
+# Tracing: per-node / LLM / embedding / tool spans with tokens and cost; off = no wrappers at all
+TRACE_ENABLED                 = _bool("TRACE_ENABLED", False)
+TRACE_PATH                    = os.getenv("TRACE_PATH", "")   # JSONL span log ("" = in-memory only)
+TRACE_MAX_SAMPLES             = _int("TRACE_MAX_SAMPLES", 100000)   # latency samples kept per span name
+
 # Escalation
-SUPPORT_ESCALATION_EMAIL      = os.getenv("SUPPORT_ESCALATION_EMAIL", "support@example.com")
+SUPPORT_ESCALATION_EMAIL      = os.getenv("SUPPORT_ESCALATION_EMAIL", "support@example.com")
\ No newline at end of file
@@ -1,18 +1,24 @@
 # Copyright Lukas Licon 2025. All Rights Reserved.
 
+import hashlib
 import os
-from typing import List
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import SystemMessage, HumanMessage
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage
 from .state import CaseState, DraftReply
-from .config import OPENAI_CHAT_MODEL
+from .cache import LRUCache
+from .config import DRAFT_CACHE_SIZE, DRAFT_CACHE_TTL_S, DRAFT_MODE, OPENAI_CHAT_MODEL
+from .limits import LLM_LIMIT
+from .llm import get_chat_model
 from .policy import required_evidence_for, which_missing  # <-- fallback
+from .telemetry import count
+from .templates import Disposition, render_reply
 
 def get_llm():
     key = os.getenv("OPENAI_API_KEY")
     if not key:
         raise RuntimeError("OPENAI_API_KEY is not set.")
-    return ChatOpenAI(model=OPENAI_CHAT_MODEL, temperature=0, api_key=key)
+    return get_chat_model(api_key=key, model=OPENAI_CHAT_MODEL, temperature=0)
 
 def _format_snippets(retrieved: List[dict]) -> str:
     if not retrieved:
@@ -59,105 +65,257 @@ def _strip_md_fence(text: str) -> str:
             t = "\n".join(t.splitlines()[:-1])
     return t.strip()
 
-def draft_reply(state: CaseState) -> DraftReply:
-    llm = get_llm()
-    snippets_md = _format_snippets(state.get("retrieved", []))
-
+def _disposition(state: CaseState) -> Tuple[Disposition, List[str]]:
+    """Which reply this case gets, plus the evidence still missing (MISSING only)."""
     ticket = state.get("ticket")
     meta = ticket.metadata if ticket else {}
-    amount_cents = meta.get("amount_cents")
-    amount_str = _format_amount(amount_cents)
-    order_id = meta.get("order_id", "")
     text = ticket.text if ticket else ""
 
-    approvals = state.get("approvals", {})
-    actions_flag = approvals.get("actions", None)  # True | False | None
-    plan = state.get("actions")
-    escalated = _has_escalation(plan)
-
     # 1) Prefer planner-provided missing list…
     missing = state.get("missing_requirements", [])
 
     # …but if it isn't there (e.g., older plan_node), recompute as a fallback.
     if not missing:
+        amount_cents = meta.get("amount_cents")
         required = required_evidence_for(cents=amount_cents or 0, metadata=meta, text=text)
         missing = which_missing(required=required, metadata=meta, text=text)
-
-    # Evidence-first: if missing items, ask for them explicitly.
     if missing:
-        need_lines = "\n".join(f"- {x}" for x in _humanize_requirements(missing))
-        prompt = f"""You are a support copilot.
+        return "MISSING", missing
 
-Required information is missing; ask for ONLY the listed items. Do not promise a refund yet.
+    actions_flag = state.get("approvals", {}).get("actions", None)  # True | False | None
+    if actions_flag is True:
+        return "APPROVED", []
+    if actions_flag is False:
+        return "DENIED", []
+    if _has_escalation(state.get("actions")):
+        return "ESCALATED", []
+    return "PENDING", []
 
-Ticket context:
-- Order ID (if provided): {order_id or "(not provided)"}
-- Requested refund amount: {amount_str or "(unspecified)"}
+def _cited(state: CaseState) -> Tuple[List[str], List[str]]:
+    """(citation sources, snippet texts), aligned: [n] in a reply refers to entry n-1."""
+    citations: List[str] = []
+    texts: List[str] = []
+    for c in state.get("retrieved", []):
+        src = c.get("source") or c.get("url") or c.get("doc_id")
+        if src:
+            citations.append(src)
+            texts.append(c.get("text", ""))
+    return citations, texts
 
-Required items:
-{need_lines}
+def _citations(state: CaseState) -> List[str]:
+    return _cited(state)[0]
 
-Rules:
+# Trailing text that might still turn into the closing fence; held back until more arrives.
+_PENDING_TAIL = re.compile(r"\s*(?:`{1,3}\s*)?$")
+
+class FenceStripper:
+    """
+    Incremental _strip_md_fence for streamed output: feed() returns the text
+    that is safe to show so far, finish() flushes the rest.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._head = True     # still deciding whether the reply opens with a fence
+        self._fenced = False
+
+    def feed(self, chunk: str) -> str:
+        self._buf += chunk or ""
+        if self._head:
+            t = self._buf.lstrip()
+            if not t or (len(t) < 3 and "```".startswith(t)):
+                return ""
+            if t.startswith("```"):
+                if "\n" not in t:
+                    return ""
+                t = t.split("\n", 1)[1]
+                self._fenced = True
+            self._head = False
+            self._buf = t.lstrip()
+        cut = _PENDING_TAIL.search(self._buf).start()
+        out, self._buf = self._buf[:cut], self._buf[cut:]
+        return out
+
+    def finish(self) -> str:
+        if self._head:  # never saw real content (e.g. only a bare fence)
+            self._head = False
+            return _strip_md_fence(self._buf)
+        tail, self._buf = self._buf, ""
+        if self._fenced and tail.strip() == "```":
+            return ""
+        return tail.rstrip()
+
+# ---- prompts ----
+# Everything that doesn't depend on the ticket lives in the system message and
+# per-ticket values come last, in the human message, so identical tickets render
+# identical prompts (the response cache below keys on them). Provider prompt
+# caching only starts at 1024-token prefixes; these system messages are ~300
+# and ~100 tokens, so expect no cached input tokens from them.
+
+_DRAFT_SYSTEM = """You are a support copilot. Follow the instructions precisely.
+
+You draft the reply to a customer's refund request. The request gives policy snippets, the Decision, the ticket context and the customer message.
+
+Decision MISSING (required information is missing):
+- Ask for ONLY the listed required items. Do not promise a refund yet.
 - Be empathetic and concise.
 - Use snippet citations like [n] only for policy lines.
 - Do not mention any other dollar amounts than the requested refund (if provided).
-- Output ONLY the final reply in Markdown.
 
-Customer message:
-\"\"\"{text}\"\"\"
+Any other Decision:
+- APPROVED: State clearly that the refund has been initiated using the exact requested amount and include timeline.
+- DENIED: Explain politely that we cannot process the refund without approval; offer next steps.
+- ESCALATED: Explain that the request exceeds automated limits and has been escalated to support; set expectations.
+- PENDING: Do NOT imply the refund has been processed; say you can proceed once approval is confirmed.
+- If you mention a dollar amount, it MUST be exactly the requested refund amount (do NOT use policy caps).
+- You may reference policy limits from snippets with [n], but never substitute them for the refund amount.
+- Keep it concise, empathetic, and action-oriented.
+- Cite policy statements with [n].
 
-Snippets:
-{snippets_md}
-"""
-        msg = llm.invoke([SystemMessage(content="Follow the instructions precisely."),
-                          HumanMessage(content=prompt)])
-        clean = _strip_md_fence(msg.content)
-        return DraftReply(ticket_id=ticket.id, markdown=clean, citations=[])
+Output ONLY the final reply in Markdown."""
 
-    # Otherwise tri-state + escalation tone.
-    if actions_flag is True:
-        disposition = "APPROVED"
-        guidance = "State clearly that the refund has been initiated using the exact requested amount shown below and include timeline."
-    elif actions_flag is False:
-        disposition = "DENIED"
-        guidance = "Explain politely that we cannot process the refund without approval; offer next steps."
-    elif escalated:
-        disposition = "ESCALATED"
-        guidance = "Explain that the request exceeds automated limits and has been escalated to support; set expectations."
-    else:
-        disposition = "PENDING"
-        guidance = "Do NOT imply the refund has been processed; say you can proceed once approval is confirmed."
+_POLISH_SYSTEM = """You are a support copilot. Follow the instructions precisely.
+
+Rewrite the draft reply you are given so it reads naturally and acknowledges the customer's message.
+
+Rules:
+- Keep every fact exactly as written: amounts, order numbers, requested items, timelines and [n] citations.
+- Do not add promises, amounts or policy statements that are not in the draft.
+- Output ONLY the final reply in Markdown."""
+
+def _customer_text(ticket) -> str:
+    # Whitespace-normalized so re-sent / re-wrapped copies of a message render the same prompt.
+    return " ".join((ticket.text if ticket else "").split())
 
-    prompt = f"""You are a support copilot.
+def _build_prompt(state: CaseState) -> Tuple[List[BaseMessage], List[str]]:
+    """Messages for the drafting LLM call, plus the citations the reply may use."""
+    snippets_md = _format_snippets(state.get("retrieved", []))
+
+    ticket = state.get("ticket")
+    meta = ticket.metadata if ticket else {}
+    amount_str = _format_amount(meta.get("amount_cents"))
+    order_id = meta.get("order_id", "")
+
+    disposition, missing = _disposition(state)
+    need_lines = ""
+    if disposition == "MISSING":
+        need_lines = "\nRequired items:\n" + "\n".join(f"- {x}" for x in _humanize_requirements(missing)) + "\n"
+
+    prompt = f"""Snippets:
+{snippets_md}
 
 Decision: {disposition}
-Guidance: {guidance}
 
 Ticket context (must use exactly):
 - Order ID (if provided): {order_id or "(not provided)"}
 - Requested refund amount: {amount_str or "(unspecified)"}
+{need_lines}
+Customer message:
+\"\"\"{_customer_text(ticket)}\"\"\"
+"""
+    citations = [] if disposition == "MISSING" else _citations(state)
+    return [SystemMessage(content=_DRAFT_SYSTEM), HumanMessage(content=prompt)], citations
 
-Rules:
-- If you mention a dollar amount, it MUST be exactly the requested refund amount above (do NOT use policy caps).
-- You may reference policy limits from snippets with [n], but never substitute them for the refund amount.
-- Keep it concise, empathetic, and action-oriented.
-- Cite policy statements with [n].
-- Output ONLY the final reply in Markdown.
+def _render_template(state: CaseState) -> Tuple[str, List[str]]:
+    """Deterministic reply for the case's disposition, plus its citations."""
+    disposition, missing = _disposition(state)
+    meta = state["ticket"].metadata
+    citations, snippets = ([], []) if disposition == "MISSING" else _cited(state)
+    markdown = render_reply(
+        disposition,
+        amount=_format_amount(meta.get("amount_cents")),
+        order_id=meta.get("order_id") or "",
+        needs=_humanize_requirements(missing),
+        snippets=snippets,
+    )
+    return markdown, citations
 
-Customer message:
-\"\"\"{text}\"\"\"
+def _polish_prompt(state: CaseState, templated: str) -> List[BaseMessage]:
+    prompt = f"""Draft reply:
+{templated}
 
-Snippets:
-{snippets_md}
+Customer message:
+\"\"\"{_customer_text(state["ticket"])}\"\"\"
 """
-    msg = llm.invoke([SystemMessage(content="Follow the instructions precisely."),
-                      HumanMessage(content=prompt)])
-    clean = _strip_md_fence(msg.content)
+    return [SystemMessage(content=_POLISH_SYSTEM), HumanMessage(content=prompt)]
 
-    citations: List[str] = []
-    for c in state.get("retrieved", []):
-        src = c.get("source") or c.get("url") or c.get("doc_id")
-        if src:
-            citations.append(src)
+# ---- response cache ----
 
-    return DraftReply(ticket_id=ticket.id, markdown=clean, citations=citations)
+_responses = LRUCache(DRAFT_CACHE_SIZE, ttl=DRAFT_CACHE_TTL_S)
+
+def _cache_key(messages: List[BaseMessage]) -> str:
+    h = hashlib.sha256(f"{OPENAI_CHAT_MODEL}\0".encode("utf-8"))
+    for m in messages:
+        h.update(f"{m.type}\0{m.content}\0".encode("utf-8"))
+    return h.hexdigest()
+
+def draft_cache_stats() -> Dict[str, Any]:
+    return _responses.stats()
+
+def _llm_messages(state: CaseState) -> Tuple[Optional[List[BaseMessage]], str, List[str]]:
+    """(messages or None when the reply is already known, known markdown, citations)."""
+    if DRAFT_MODE == "llm":
+        messages, citations = _build_prompt(state)
+    else:
+        markdown, citations = _render_template(state)
+        if DRAFT_MODE != "polish":
+            return None, markdown, citations
+        messages = _polish_prompt(state, markdown)
+    cached = _responses.get(_cache_key(messages))
+    if cached is not None:
+        count("cache", "draft", cache_hits=1)
+        return None, cached, citations
+    return messages, "", citations
+
+def draft_reply(state: CaseState, *, on_token: Optional[Callable[[str], None]] = None) -> DraftReply:
+    """
+    Draft the customer reply. With `on_token`, LLM output is streamed and
+    passed on fence-stripped as it arrives (a known reply is sent whole).
+    """
+    ticket_id = state["ticket"].id
+    messages, markdown, citations = _llm_messages(state)
+    if messages is None:
+        if on_token is not None:
+            on_token(markdown)
+        return DraftReply(ticket_id=ticket_id, markdown=markdown, citations=citations)
+    if on_token is None:
+        raw = get_llm().invoke(messages).content
+    else:
+        stripper, parts = FenceStripper(), []
+        for chunk in get_llm().stream(messages):
+            parts.append(chunk.content)
+            piece = stripper.feed(chunk.content)
+            if piece:
+                on_token(piece)
+        piece = stripper.finish()
+        if piece:
+            on_token(piece)
+        raw = "".join(parts)
+    markdown = _strip_md_fence(raw)
+    _responses.put(_cache_key(messages), markdown)
+    return DraftReply(ticket_id=ticket_id, markdown=markdown, citations=citations)
+
+async def adraft_reply(state: CaseState, *, on_token: Optional[Callable[[str], None]] = None) -> DraftReply:
+    ticket_id = state["ticket"].id
+    messages, markdown, citations = _llm_messages(state)
+    if messages is None:
+        if on_token is not None:
+            on_token(markdown)
+        return DraftReply(ticket_id=ticket_id, markdown=markdown, citations=citations)
+    async with LLM_LIMIT:
+        if on_token is None:
+            raw = (await get_llm().ainvoke(messages)).content
+        else:
+            stripper, parts = FenceStripper(), []
+            async for chunk in get_llm().astream(messages):
+                parts.append(chunk.content)
+                piece = stripper.feed(chunk.content)
+                if piece:
+                    on_token(piece)
+            piece = stripper.finish()
+            if piece:
+                on_token(piece)
+            raw = "".join(parts)
+    markdown = _strip_md_fence(raw)
+    _responses.put(_cache_key(messages), markdown)
+    return DraftReply(ticket_id=ticket_id, markdown=markdown, citations=citations)
@@ -0,0 +1,217 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Protocol, Tuple
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+from .cache import LRUCache
+from .config import EMBED_CACHE_PATH, EMBED_CACHE_SIZE, OPENAI_EMBED_MODEL
+from .limits import EMBED_LIMIT
+from .llm import shared_http_client
+from .telemetry import estimate_cost, span
+
+
+# ------------------------------ Stores ---------------------------------
+
+class EmbeddingStore(Protocol):
+    """Persistent tier behind the in-process LRU (e.g. SQLite, LMDB)."""
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]: ...
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]) -> None: ...
+
+
+class SQLiteEmbeddingStore:
+    """Vectors as float32 blobs in a local SQLite file (WAL, safe across processes)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        out: Dict[str, List[float]] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                for key, blob in self._conn.execute(f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", batch):
+                    out[key] = array("f", blob).tolist()
+        return out
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]) -> None:
+        rows = [(key, array("f", vec).tobytes()) for key, vec in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+
+# --------------------------- Cached wrapper ----------------------------
+
+# Default output sizes; other models (or a `dimensions` override) are probed once.
+_KNOWN_DIMS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed cache in front of any Embeddings.
+    Keys are (kind, model, sha256(text)); lookups go LRU -> store -> provider,
+    and each distinct missing text is embedded once per call.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        *,
+        model: str,
+        lru_size: int = 10_000,
+        store: Optional[EmbeddingStore] = None,
+    ):
+        self.underlying = underlying
+        self.model = model
+        self.lru = LRUCache(lru_size)
+        self.store = store
+        self.store_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dim: Optional[int] = None
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{kind}:{self.model}:{digest}"
+
+    def _lookup(self, kind: str, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+        """Return (keys, found vectors by key, missing texts by key)."""
+        keys = [self._key(kind, t) for t in texts]
+        found: Dict[str, List[float]] = {}
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in pending:
+                continue
+            vec = self.lru.get(key)
+            if vec is not None:
+                found[key] = vec
+            else:
+                pending[key] = text
+
+        if pending and self.store is not None:
+            stored = self.store.get_many(list(pending))
+            for key, vec in stored.items():
+                found[key] = vec
+                self.lru.put(key, vec)
+                del pending[key]
+            with self._lock:
+                self.store_hits += len(stored)
+
+        with self._lock:
+            self.misses += len(pending)
+        return keys, found, pending
+
+    def _remember(self, found: Dict[str, List[float]], computed: Dict[str, List[float]]) -> None:
+        for key, vec in computed.items():
+            self.lru.put(key, vec)
+            found[key] = vec
+        if computed and self.store is not None:
+            self.store.put_many(computed.items())
+
+    def _span(self, texts: List[str], pending: Dict[str, str]):
+        # Token count is estimated (~4 chars/token); the embeddings API response isn't surfaced here.
+        tokens = sum(len(t) for t in pending.values()) // 4
+        return span("embed", self.model, texts=len(texts), cache_hits=len(texts) - len(pending),
+                    tokens_in=tokens, cost_usd=estimate_cost(self.model, tokens))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._lookup("doc", texts)
+        if pending:
+            with self._span(texts, pending):
+                vecs = self.underlying.embed_documents(list(pending.values()))
+            self._remember(found, dict(zip(pending, vecs)))
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, pending = self._lookup("query", [text])
+        if pending:
+            with self._span([text], pending):
+                vec = self.underlying.embed_query(text)
+            self._remember(found, {keys[0]: vec})
+        return found[keys[0]]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, pending = self._lookup("doc", texts)
+        if pending:
+            async with EMBED_LIMIT:
+                with self._span(texts, pending):
+                    vecs = await self.underlying.aembed_documents(list(pending.values()))
+            self._remember(found, dict(zip(pending, vecs)))
+        return [found[k] for k in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, pending = self._lookup("query", [text])
+        if pending:
+            async with EMBED_LIMIT:
+                with self._span([text], pending):
+                    vec = await self.underlying.aembed_query(text)
+            self._remember(found, {keys[0]: vec})
+        return found[keys[0]]
+
+    @property
+    def dimension(self) -> int:
+        dim = self._dim
+        if dim is None:
+            dim = getattr(self.underlying, "dimensions", None)
+            if not dim and type(self.underlying) is OpenAIEmbeddings:
+                dim = _KNOWN_DIMS.get(self.model)
+            if not dim:
+                dim = len(self.embed_query("dimension probe"))
+            self._dim = dim
+        return dim
+
+    @property
+    def signature(self) -> str:
+        """Which vector space this produces (provider, model, dimension); part of index fingerprints."""
+        return f"{type(self.underlying).__name__}:{self.model}:{self.dimension}"
+
+    def stats(self) -> Dict[str, int]:
+        """LRU hits, persistent-store hits, and true misses (provider calls per text)."""
+        return {"hits": self.lru.hits, "store_hits": self.store_hits, "misses": self.misses}
+
+
+# ------------------------------ Factory --------------------------------
+
+_embeddings: Optional[CachedEmbeddings] = None
+_embeddings_lock = threading.Lock()
+
+def get_embeddings() -> CachedEmbeddings:
+    """Process-wide cached OpenAI embeddings, configured from app.config."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                store = SQLiteEmbeddingStore(EMBED_CACHE_PATH) if EMBED_CACHE_PATH else None
+                _embeddings = CachedEmbeddings(
+                    OpenAIEmbeddings(model=OPENAI_EMBED_MODEL, http_client=shared_http_client()),
+                    model=OPENAI_EMBED_MODEL,
+                    lru_size=EMBED_CACHE_SIZE,
+                    store=store,
+                )
+    return _embeddings
+
+def set_embeddings(underlying: Optional[Embeddings], *, model: str = OPENAI_EMBED_MODEL) -> None:
+    """Replace the provider behind get_embeddings() (e.g. app.fakes offline); None restores OpenAI."""
+    global _embeddings
+    with _embeddings_lock:
+        _embeddings = None if underlying is None else CachedEmbeddings(
+            underlying, model=model, lru_size=EMBED_CACHE_SIZE, store=None,
+        )
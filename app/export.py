@@ -1,17 +1,52 @@
 # Copyright Lukas Licon 2025. All Rights Reserved.
 
+import asyncio
 from typing import List
+from .idempotency import get_store, idempotency_key
+from .limits import TOOL_LIMIT
 from .state import ActionPlan, ActionStep, ToolResult
-from .tools import TOOLS
+from .telemetry import count, span
+from .tools import TOOLS, ToolRejected
 
 def execute_plan(plan: ActionPlan) -> List[ToolResult]:
+    """
+    Run each step once per idempotency key: a replayed step (retried node,
+    resumed thread, redelivered ticket) returns the recorded ToolResult.
+    A tool that raises ToolRejected failed cleanly and may be retried; any
+    other exception leaves its key in doubt until the lease runs out or the
+    call is reconciled (see app.idempotency).
+    """
+    store = get_store()
     results: List[ToolResult] = []
     for step in plan.steps:
         schema, impl = TOOLS[step.tool]
         args = schema(**step.args)
+        key = idempotency_key(plan.ticket_id, step.tool, args.model_dump())
+        if store is not None:
+            replay = store.begin(key, ticket_id=plan.ticket_id, tool=step.tool)
+            if replay is not None:
+                count("cache", f"tool:{step.tool}", cache_hits=1)
+                results.append(replay)
+                continue
         try:
-            out = impl(args)
-            results.append(ToolResult(tool=step.tool, ok=True, result=out))
+            with span("tool", step.tool):
+                out = impl(args, idempotency_key=key)
+            result = ToolResult(tool=step.tool, ok=True, result=out, idempotency_key=key)
+        except ToolRejected as e:
+            result = ToolResult(tool=step.tool, ok=False, error=str(e), result={}, idempotency_key=key)
         except Exception as e:
-            results.append(ToolResult(tool=step.tool, ok=False, error=str(e), result=None))
+            # May have landed (e.g. a timeout after the provider accepted it): never retry blindly.
+            result = ToolResult(tool=step.tool, ok=False, error=f"outcome unknown: {e}", result={}, idempotency_key=key)
+            if store is not None:
+                store.mark_in_doubt(key, result)
+            results.append(result)
+            continue
+        if store is not None:
+            store.complete(key, result)
+        results.append(result)
     return results
+
+async def aexecute_plan(plan: ActionPlan) -> List[ToolResult]:
+    """Async variant; tool implementations are sync, so they run on a worker thread."""
+    async with TOOL_LIMIT:
+        return await asyncio.to_thread(execute_plan, plan)
@@ -0,0 +1,169 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""
+Deterministic local stand-ins for ChatOpenAI and OpenAIEmbeddings, with a
+configurable simulated latency. For offline benchmarks and CI; never used
+unless install() is called.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from .plan import _looks_like_billing
+
+
+# ------------------------------ Chat model -----------------------------
+
+_REPLY = (
+    "Thanks for reaching out, and sorry for the trouble with your order. "
+    "We've reviewed your request against our refund policy [1] and will keep you updated. "
+    "Refunds typically settle within a few business days [2]."
+)
+
+def _text_of(x: Any) -> str:
+    if isinstance(x, str):
+        return x
+    if isinstance(x, list):
+        return "\n".join(_text_of(m) for m in x)
+    return str(getattr(x, "content", x))
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+def fake_label(text: str):
+    """Keyword stand-in for the intent classifier."""
+    from .classify import IntentLabel
+
+    t = (text or "").lower()
+    intents = ["billing"] if _looks_like_billing(t) or "charge" in t else []
+    if "crash" in t or "error" in t:
+        intents.append("bug")
+    if "log in" in t or "password" in t:
+        intents.append("access")
+    severity = "high" if "chargeback" in t or "fraud" in t else "normal"
+    return IntentLabel(intents=intents or ["feature"], severity=severity)
+
+
+class FakeChatModel(BaseChatModel):
+    """Fixed reply after `latency_s`; token usage is estimated from text length."""
+
+    model: str = "fake-chat"
+    latency_s: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model}
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        usage = {"input_tokens": _tokens(_text_of(messages)), "output_tokens": _tokens(_REPLY)}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=_REPLY, usage_metadata=usage))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_s)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency_s)
+        return self._result(messages)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        # Half the latency to the first token, the rest spread over the words.
+        words = _REPLY.split(" ")
+        time.sleep(self.latency_s / 2)
+        for i, w in enumerate(words):
+            time.sleep(self.latency_s / 2 / len(words))
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=w if i == 0 else " " + w))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema: Any, **kwargs: Any):
+        from .classify import BatchIntentLabels, TicketIntentLabel
+
+        def label(inp: Any):
+            if schema is BatchIntentLabels:
+                # Prompt is one JSON line per ticket (see classify._batch_messages).
+                items = []
+                for line in _text_of(inp[-1] if isinstance(inp, list) else inp).splitlines():
+                    row = json.loads(line)
+                    items.append(TicketIntentLabel(ticket_id=row["ticket_id"], **fake_label(row["text"]).model_dump()))
+                return BatchIntentLabels(items=items)
+            return fake_label(_text_of(inp))
+
+        # Go through the chat model so latency, callbacks and token usage match a real call.
+        def invoke(inp: Any):
+            self.invoke(inp)
+            return label(inp)
+
+        async def ainvoke(inp: Any):
+            await self.ainvoke(inp)
+            return label(inp)
+
+        return RunnableLambda(invoke, afunc=ainvoke, name="fake_structured")
+
+
+# ------------------------------ Embeddings -----------------------------
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: deterministic, and similar texts land close together."""
+
+    def __init__(self, *, size: int = 64, latency_s: float = 0.0):
+        self.size = size
+        self.latency_s = latency_s
+
+    def _vec(self, text: str) -> List[float]:
+        v = [0.0] * self.size
+        for word in (text or "").lower().split():
+            h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            v[h % self.size] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in v)) or 1.0
+        return [x / norm for x in v]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_s)
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_s)
+        return self._vec(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency_s)
+        return [self._vec(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency_s)
+        return self._vec(text)
+
+
+# ------------------------------ Install --------------------------------
+
+def install(*, llm_latency_ms: float = 0.0, embed_latency_ms: float = 0.0, embed_size: int = 64) -> None:
+    """Route get_chat_model() and get_embeddings() to the fakes for this process."""
+    from .embeddings import set_embeddings
+    from .llm import set_chat_model_factory
+
+    latency = llm_latency_ms / 1000
+
+    def factory(*, model: Optional[str] = None, temperature: Optional[float] = None, callbacks=None):
+        return FakeChatModel(model=model or "fake-chat", latency_s=latency, callbacks=callbacks)
+
+    set_chat_model_factory(factory)
+    set_embeddings(FakeEmbeddings(size=embed_size, latency_s=embed_latency_ms / 1000), model="fake-embed")
@@ -1,70 +1,155 @@
 # Copyright Lukas Licon 2025. All Rights Reserved.
 
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.types import Overwrite
 
 from .state import CaseState
-from .retriever import build_hybrid_retriever
-from .classify import classify
-from .draft import draft_reply
+from .kb import KBIndexManager
+from .config import CHECKPOINT_BACKEND, CHECKPOINT_DB_PATH, RETRIEVER_WARMUP
+from .checkpoint import make_checkpointer
+from .telemetry import traced_node
+from .classify import classify, aclassify
+from .draft import draft_reply, adraft_reply
 from .verify import verify_grounding
 from .plan import plan_actions
 from .hil import interrupt_approval
-from .export import execute_plan
+from .export import execute_plan, aexecute_plan
 
 workflow = StateGraph(CaseState)
 
 def ingest_ticket(state: CaseState):
-    return {"ticket": state["ticket"]}
+    """
+    Start every run from a clean slate: a thread can carry several tickets
+    (e.g. run.py's fixed --thread), and checkpointed fields from the previous
+    one must not leak into this one. Reducer fields are replaced, not merged.
+    """
+    pre = state.get("preclassified") or {}
+    out = {
+        "ticket": state["ticket"],
+        "intents": Overwrite(list(pre.get("intents") or [])),
+        "retrieved": Overwrite([]),
+        "draft": None,
+        "actions": None,
+        "approvals": {},
+        "executed": Overwrite([]),
+        "artifacts": {},
+        "policy_flags": Overwrite([]),
+        "missing_requirements": [],
+        "preclassified": None,  # consumed; a later run must pass its own
+    }
+    if pre.get("severity"):
+        out["severity"] = pre["severity"]
+    return out
 
 def classify_intent(state: CaseState):
+    if state.get("intents"):
+        return {}  # pre-classified for this run (see ingest_ticket)
     out = classify(state["ticket"].text)
     return {"intents": out.intents, "severity": out.severity}
 
+async def aclassify_intent(state: CaseState):
+    if state.get("intents"):
+        return {}
+    out = await aclassify(state["ticket"].text)
+    return {"intents": out.intents, "severity": out.severity}
+
 _FAKE_CHUNKS = [
     {"text": "Refunds up to $50 within 30 days.", "meta": {"doc_id": "kb1", "url": "kb://refunds"}},
     {"text": "Refunds typically settle within 3–5 business days.", "meta": {"doc_id": "kb2", "url": "kb://settlement"}}
 ]
-_retriever = build_hybrid_retriever(_FAKE_CHUNKS)
+# Built on first retrieval (or via warmup()), not at import. Edit via kb.upsert()/kb.delete().
+kb = KBIndexManager(_FAKE_CHUNKS)
+
+def warmup(*, background: bool = False):
+    """Build the KB retriever ahead of the first ticket (e.g. before forking workers)."""
+    return kb.warmup(background=background)
+
+def _to_refs(hits):
+    # Checkpoints keep only (doc_id, score); text and source are looked up in the KB when needed.
+    return [{"doc_id": h.id or h.metadata.get("doc_id", ""), "score": h.metadata.get("score", 0.0)} for h in hits]
+
+def resolve_chunks(refs):
+    """Expand retrieval refs into snippet dicts (doc_id, source, text, score); unknown ids are dropped."""
+    out = []
+    for r in refs or []:
+        chunk = kb.get_chunk(r["doc_id"])
+        if chunk is None:
+            continue  # removed from the KB since retrieval
+        out.append({
+            "doc_id": r["doc_id"],
+            "source": (chunk.get("meta") or {}).get("url", ""),
+            "text": chunk["text"],
+            "score": r["score"],
+        })
+    return out
 
 def retrieve_context(state: CaseState):
-    hits = _retriever.invoke(state["ticket"].text)
-    chunks = [{
-        "doc_id": h.metadata.get("doc_id", ""),
-        "source": h.metadata.get("url", ""),
-        "text": h.page_content,
-        "score": h.metadata.get("score", 0.0),
-    } for h in hits]
-    return {"retrieved": chunks}
+    return {"retrieved": _to_refs(kb.search(state["ticket"].text))}
+
+async def aretrieve_context(state: CaseState):
+    return {"retrieved": _to_refs(await kb.asearch(state["ticket"].text))}
+
+def _draft_writer(state: CaseState):
+    """
+    Forwarder of draft text to `stream_mode="custom"` consumers, or None when
+    nobody is listening so the draft is generated with a plain invoke.
+    """
+    write = get_stream_writer()
+    # LangGraph hands nodes a bare no-op unless custom streaming is on; the live
+    # writer closes over the run's stream queue.
+    if write.__closure__ is None:
+        return None
+    ticket_id = state["ticket"].id
+    return lambda text: write({"event": "draft_token", "ticket_id": ticket_id, "text": text})
+
+def _with_snippets(state: CaseState):
+    return {**state, "retrieved": resolve_chunks(state.get("retrieved"))}
 
 def draft_node(state: CaseState):
-    return {"draft": draft_reply(state)}
+    return {"draft": draft_reply(_with_snippets(state), on_token=_draft_writer(state))}
+
+async def adraft_node(state: CaseState):
+    return {"draft": await adraft_reply(_with_snippets(state), on_token=_draft_writer(state))}
 
 def verify_node(state: CaseState):
     return verify_grounding(state)
 
 def plan_node(state: CaseState):
     plan, missing = plan_actions(state)
-    out = {"actions": plan}
-    if missing:
-        out["missing_requirements"] = missing
-    return out
+    return {"actions": plan, "missing_requirements": missing}
+
+def route_after_plan(state: CaseState):
+    # No plan and nothing missing means plan_actions saw no billing intent: skip drafting.
+    if state.get("actions") is None and not state.get("missing_requirements"):
+        return "close"
+    return "approval"
 
 def approval_node(state: CaseState):
     return interrupt_approval(state)
 
-def execute_node(state: CaseState):
+def _should_execute(state: CaseState) -> bool:
     plan = state.get("actions")
     if not plan:
-        return {}
+        return False
 
     has_escalation = any(s.tool == "notify" for s in plan.steps)
     approved = state.get("approvals", {}).get("actions") is True
 
-    if not approved and not has_escalation:
-        return {}  # needs approval for refund, and there is no escalation to run
+    # needs approval for refund, unless there is an escalation to run
+    return approved or has_escalation
+
+def execute_node(state: CaseState):
+    if not _should_execute(state):
+        return {}
+    results = execute_plan(state["actions"])
+    return {"executed": results}
 
-    results = execute_plan(plan)
+async def aexecute_node(state: CaseState):
+    if not _should_execute(state):
+        return {}
+    results = await aexecute_plan(state["actions"])
     return {"executed": results}
 
 def export_node(state: CaseState):
@@ -73,30 +158,52 @@ def export_node(state: CaseState):
         return {}
     return {"artifacts": {"report_json": "file://tmp/report.json"}}
 
-# nodes
-workflow.add_node("ingest_ticket", ingest_ticket)
-workflow.add_node("classify_intent", classify_intent)
-workflow.add_node("retrieve_context", retrieve_context)
-workflow.add_node("verify", verify_node)
-workflow.add_node("plan", plan_node)
-workflow.add_node("approval", approval_node)
-workflow.add_node("draft", draft_node)      # <-- draft AFTER approval
-workflow.add_node("execute", execute_node)
-workflow.add_node("export", export_node)
-workflow.add_node("close", lambda s: {})
-
-# edges
+def close_node(state: CaseState, config: RunnableConfig):
+    # Lets a retention-aware checkpointer expire this thread after its TTL.
+    mark_closed = getattr(checkpointer, "mark_closed", None)
+    if mark_closed is not None:
+        mark_closed(config["configurable"]["thread_id"])
+    return {}
+
+def _add_node(name, func, afunc=None):
+    """
+    Add a traced node; with `afunc`, a sync body for graph.invoke and an async
+    one for graph.ainvoke/astream. Tracing off leaves the functions untouched.
+    """
+    if afunc is None:
+        workflow.add_node(name, traced_node(func, name))
+    else:
+        workflow.add_node(name, RunnableLambda(traced_node(func, name), afunc=traced_node(afunc, name), name=func.__name__))
+
+# nodes (I/O-bound ones have async twins so one event loop can run many tickets)
+_add_node("ingest_ticket", ingest_ticket)
+_add_node("classify_intent", classify_intent, aclassify_intent)
+_add_node("retrieve_context", retrieve_context, aretrieve_context)
+_add_node("verify", verify_node)
+_add_node("plan", plan_node)
+_add_node("approval", approval_node)
+_add_node("draft", draft_node, adraft_node)      # <-- draft AFTER approval
+_add_node("execute", execute_node, aexecute_node)
+_add_node("export", export_node)
+_add_node("close", close_node)
+
+# edges — classification and retrieval both only need the ticket, so they fan out and join at verify
 workflow.add_edge(START, "ingest_ticket")
 workflow.add_edge("ingest_ticket", "classify_intent")
-workflow.add_edge("classify_intent", "retrieve_context")
-workflow.add_edge("retrieve_context", "verify")
+workflow.add_edge("ingest_ticket", "retrieve_context")
+workflow.add_edge(["classify_intent", "retrieve_context"], "verify")
 workflow.add_edge("verify", "plan")
-workflow.add_edge("plan", "approval")
+workflow.add_conditional_edges("plan", route_after_plan, ["approval", "close"])
 workflow.add_edge("approval", "draft")      # <-- draft after decision
 workflow.add_edge("draft", "execute")
 workflow.add_edge("execute", "export")
 workflow.add_edge("export", "close")
 workflow.add_edge("close", END)
 
-checkpointer = InMemorySaver()
-graph = workflow.compile(checkpointer=checkpointer)
\ No newline at end of file
+checkpointer = make_checkpointer(CHECKPOINT_BACKEND, CHECKPOINT_DB_PATH)
+graph = workflow.compile(checkpointer=checkpointer)
+
+if RETRIEVER_WARMUP == "eager":
+    warmup()
+elif RETRIEVER_WARMUP == "background":
+    warmup(background=True)
\ No newline at end of file
@@ -0,0 +1,203 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""
+Idempotency keys for tool calls.
+
+Each ActionStep gets a key from (ticket id, tool, canonical validated args).
+The store records the key as `pending` before the tool runs and the
+ToolResult after, so a retried node, a resumed thread or a redelivered
+ticket gets the recorded result back instead of a second side effect.
+
+A `pending` claim is a lease. While it is live (a concurrent duplicate, or a
+call that crashed less than `lease` seconds ago) the outcome is unknown and
+begin() reports an in-doubt error instead of running the tool. Once the lease
+expires, the next attempt takes the key over and retries; tools get the key
+(execute_plan passes it) and forward it to the provider, so a duplicate of a
+call that did land is dropped there. A call that raised is treated like a
+crash: mark_in_doubt() keeps the claim and restarts the lease. Only calls
+known to have failed before any side effect (tools.ToolRejected) are recorded
+as failed and may be retried at once. In-doubt keys can also be settled by
+hand: in_doubt() lists them, resolve() records the real outcome and release()
+forgets the key (`python run.py idempotency`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import IDEMPOTENCY_DB_PATH, IDEMPOTENCY_LEASE_S, IDEMPOTENCY_TTL_S
+from .state import ToolResult
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tool_calls (
+    key TEXT PRIMARY KEY, ticket_id TEXT NOT NULL, tool TEXT NOT NULL,
+    status TEXT NOT NULL,               -- pending | done | failed
+    result TEXT,                        -- ToolResult JSON once finished (last error while pending)
+    created_at REAL NOT NULL, updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tool_calls_updated ON tool_calls (updated_at);
+"""
+
+def idempotency_key(ticket_id: str, tool: str, args: Dict[str, Any]) -> str:
+    """sha256 of ticket id, tool and args with sorted keys (pass validated args so "1500" == 1500)."""
+    canonical = json.dumps(
+        {"ticket_id": ticket_id, "tool": tool, "args": args},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    SQLite (WAL) table of tool calls keyed by idempotency key. Safe to share
+    between threads and processes: claiming a key is one INSERT OR IGNORE,
+    taking over a failed or expired one is one conditional UPDATE.
+    Pending claims expire after `lease` seconds (0 = never; settle them by hand).
+    Finished rows older than `ttl` seconds are swept (0 = keep forever).
+    """
+
+    def __init__(self, path: str, *, ttl: float = 0.0, lease: float = 0.0):
+        self.path = path
+        self.ttl = ttl
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._last_prune = 0.0
+
+    def begin(self, key: str, *, ticket_id: str, tool: str) -> Optional[ToolResult]:
+        """
+        Claim `key` before calling the tool. Returns None if the caller should
+        run it, else the ToolResult to use instead (recorded, or in-doubt error).
+        """
+        now = time.time()
+        with self._lock:
+            self._maybe_prune_locked()
+            with self._conn:
+                claimed = self._conn.execute(
+                    "INSERT OR IGNORE INTO tool_calls (key, ticket_id, tool, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, 'pending', ?, ?)",
+                    (key, ticket_id, tool, now, now),
+                ).rowcount
+                if claimed:
+                    return None
+                # Failed calls were rejected before any side effect, and an expired lease
+                # means the claimant is gone: re-claim and retry.
+                expired = now - self.lease if self.lease > 0 else -1.0
+                if self._conn.execute(
+                    "UPDATE tool_calls SET status='pending', updated_at=? "
+                    "WHERE key=? AND (status='failed' OR (status='pending' AND updated_at<=?))",
+                    (now, key, expired),
+                ).rowcount:
+                    return None
+                status, result, updated_at = self._conn.execute(
+                    "SELECT status, result, updated_at FROM tool_calls WHERE key=?", (key,)
+                ).fetchone()
+        if status == "done":
+            return ToolResult.model_validate_json(result)
+        retry = f"retried after {updated_at + self.lease - now:.0f}s or " if self.lease > 0 else ""
+        return ToolResult(
+            tool=tool, ok=False, result={}, idempotency_key=key,
+            error=f"idempotency: an earlier attempt of this call has no recorded outcome yet; "
+                  f"it can be {retry}reconciled with `run.py idempotency`",
+        )
+
+    def complete(self, key: str, result: ToolResult) -> None:
+        """Record the outcome of a claimed call."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tool_calls SET status=?, result=?, updated_at=? WHERE key=?",
+                ("done" if result.ok else "failed", result.model_dump_json(), time.time(), key),
+            )
+
+    def mark_in_doubt(self, key: str, result: ToolResult) -> None:
+        """
+        Keep a claimed call pending after an error that may have followed its
+        side effect; the lease restarts now and `result` is kept for in_doubt().
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE tool_calls SET result=?, updated_at=? WHERE key=? AND status='pending'",
+                (result.model_dump_json(), time.time(), key),
+            )
+
+    def release(self, key: str) -> None:
+        """Forget a key (e.g. after manual reconciliation) so the call can run again."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM tool_calls WHERE key=?", (key,))
+
+    def resolve(self, key: str, *, ok: bool, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> bool:
+        """
+        Record the outcome of an in-doubt call found out-of-band (e.g. the refund
+        is in the provider's dashboard): ok=True is replayed by later attempts,
+        ok=False lets them retry. False if `key` is not pending.
+        """
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT tool FROM tool_calls WHERE key=? AND status='pending'", (key,)).fetchone()
+            if row is None:
+                return False
+            outcome = ToolResult(tool=row[0], ok=ok, result=result or {}, idempotency_key=key,
+                                 error=None if ok else (error or "idempotency: resolved as not applied"))
+            self._conn.execute(
+                "UPDATE tool_calls SET status=?, result=?, updated_at=? WHERE key=?",
+                ("done" if ok else "failed", outcome.model_dump_json(), time.time(), key),
+            )
+            return True
+
+    def in_doubt(self, *, older_than: float = 0.0) -> List[Dict[str, Any]]:
+        """Pending claims not touched for `older_than` seconds, oldest first, with lease state and last error."""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, ticket_id, tool, created_at, updated_at, result FROM tool_calls "
+                "WHERE status='pending' AND updated_at<=? ORDER BY updated_at",
+                (now - older_than,),
+            ).fetchall()
+        return [
+            {"key": key, "ticket_id": ticket_id, "tool": tool, "created_at": created_at,
+             "age_s": now - updated_at, "lease_expired": self.lease > 0 and now - updated_at >= self.lease,
+             "error": ToolResult.model_validate_json(result).error if result else None}
+            for key, ticket_id, tool, created_at, updated_at, result in rows
+        ]
+
+    def prune(self, ttl: Optional[float] = None) -> int:
+        """Delete finished rows not updated for `ttl` seconds. Pending rows are kept for reconciliation."""
+        with self._lock:
+            return self._prune_locked(self.ttl if ttl is None else ttl)
+
+    def _prune_locked(self, ttl: float) -> int:
+        with self._conn:
+            n = self._conn.execute(
+                "DELETE FROM tool_calls WHERE status!='pending' AND updated_at<=?", (time.time() - ttl,)
+            ).rowcount
+        self._last_prune = time.monotonic()
+        return n
+
+    def _maybe_prune_locked(self) -> None:
+        # Amortized: at most one sweep per minute (or per TTL, if shorter).
+        if self.ttl > 0 and time.monotonic() - self._last_prune >= min(60.0, self.ttl):
+            self._prune_locked(self.ttl)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[IdempotencyStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> Optional[IdempotencyStore]:
+    """Process-wide store at IDEMPOTENCY_DB_PATH, opened on first use; None when disabled ("")."""
+    global _store
+    if _store is None and IDEMPOTENCY_DB_PATH:
+        with _store_lock:
+            if _store is None:
+                _store = IdempotencyStore(IDEMPOTENCY_DB_PATH, ttl=IDEMPOTENCY_TTL_S, lease=IDEMPOTENCY_LEASE_S)
+    return _store
@@ -0,0 +1,201 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from .bm25 import BM25Index, NativeBM25Retriever
+
+# Bump when the on-disk layout changes; old directories are simply ignored.
+INDEX_FORMAT_VERSION = 2
+
+_MANIFEST = "manifest.json"
+_FAISS_FILE = "index.faiss"
+_DOCSTORE_FILE = "docstore.jsonl"
+_BM25_VOCAB_FILE = "bm25_vocab.json"
+# BM25Index array attributes, each saved as bm25_<name>.npy and memory-mapped on load.
+_BM25_ARRAYS = ("indptr", "post_doc", "post_tf", "post_w", "doc_len")
+
+
+# ----------------------------- Fingerprint -----------------------------
+
+def kb_fingerprint(chunks: List[Dict[str, Any]], *, embedder: str) -> str:
+    """
+    Content hash of the chunk set (text + meta) and the embeddings that index
+    it (`CachedEmbeddings.signature`: provider, model, dimension).
+    Order-independent, so a KB edited in place hashes the same as a fresh load
+    of the same content. Any edit or embeddings change yields a new key.
+    """
+    digests = sorted(
+        hashlib.sha256(
+            c["text"].encode() + b"\0" + json.dumps(c.get("meta", {}), sort_keys=True, default=str).encode()
+        ).digest()
+        for c in chunks
+    )
+    h = hashlib.sha256()
+    h.update(f"v{INDEX_FORMAT_VERSION}\0{embedder}\0".encode())
+    for d in digests:
+        h.update(d)
+    return h.hexdigest()[:32]
+
+
+# ------------------------------- Save ----------------------------------
+
+def save_index(root: str, fingerprint: str, *, faiss_store: FAISS, bm25: NativeBM25Retriever) -> Path:
+    """
+    Write <root>/<fingerprint>/ atomically: build in a temp dir, then rename.
+    If another worker published the same fingerprint first, keep theirs.
+    """
+    import faiss
+
+    root_path = Path(root)
+    root_path.mkdir(parents=True, exist_ok=True)
+    final = root_path / fingerprint
+    if (final / _MANIFEST).exists():
+        # Reused (e.g. an edit reverted): mark it newest so retention keeps it.
+        os.utime(final / _MANIFEST)
+        return final
+
+    tmp = Path(tempfile.mkdtemp(prefix=f".{fingerprint}.", dir=root_path))
+    try:
+        os.chmod(tmp, 0o755)  # mkdtemp is owner-only; workers may run as other users
+        faiss.write_index(faiss_store.index, str(tmp / _FAISS_FILE))
+
+        # Docstore in FAISS row order, so row i <-> line i.
+        with open(tmp / _DOCSTORE_FILE, "w", encoding="utf-8") as f:
+            for i in range(faiss_store.index.ntotal):
+                doc_id = faiss_store.index_to_docstore_id[i]
+                doc = faiss_store.docstore.search(doc_id)
+                f.write(json.dumps({"id": doc_id, "text": doc.page_content, "meta": doc.metadata}) + "\n")
+
+        # BM25 postings and precomputed weights; docs come from the docstore by id.
+        index: BM25Index = bm25.index
+        for name in _BM25_ARRAYS:
+            np.save(tmp / f"bm25_{name}.npy", np.ascontiguousarray(getattr(index, name)))
+        with open(tmp / _BM25_VOCAB_FILE, "w", encoding="utf-8") as f:
+            json.dump({"terms": sorted(index.vocab, key=index.vocab.__getitem__), "ids": bm25.ids,
+                       "k1": index.k1, "b": index.b}, f)
+
+        # Manifest last: its presence marks the directory complete.
+        with open(tmp / _MANIFEST, "w", encoding="utf-8") as f:
+            json.dump({
+                "format": INDEX_FORMAT_VERSION,
+                "fingerprint": fingerprint,
+                "count": int(faiss_store.index.ntotal),
+                "dim": int(faiss_store.index.d),
+            }, f)
+
+        try:
+            os.rename(tmp, final)
+        except OSError:
+            # Lost the race to a concurrent writer; theirs is equivalent.
+            shutil.rmtree(tmp, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return final
+
+
+# ----------------------------- Retention -------------------------------
+
+def prune_indexes(root: str, *, keep: int, current: Optional[str] = None, stale_tmp_s: float = 3600.0) -> int:
+    """
+    Delete all but the `keep` most recently published index directories under
+    `root` (by manifest mtime; `current` is always kept), plus temp dirs left
+    by writers that died more than `stale_tmp_s` ago. keep <= 0 keeps everything.
+    Processes still serving a deleted index keep their open mmaps; a process
+    that tries to load one afterwards falls back to rebuilding. Returns the count removed.
+    """
+    root_path = Path(root)
+    if keep <= 0 or not root_path.is_dir():
+        return 0
+    published: List[Tuple[float, Path]] = []
+    doomed: List[Path] = []
+    now = time.time()
+    for d in root_path.iterdir():
+        if not d.is_dir():
+            continue
+        try:
+            if d.name.startswith("."):
+                if now - d.stat().st_mtime > stale_tmp_s:
+                    doomed.append(d)
+            elif d.name != current:
+                published.append(((d / _MANIFEST).stat().st_mtime, d))
+        except OSError:
+            continue  # incomplete or concurrently removed
+    published.sort(reverse=True)
+    doomed += [d for _, d in published[max(0, keep - (1 if current else 0)):]]
+    for d in doomed:
+        shutil.rmtree(d, ignore_errors=True)
+    return len(doomed)
+
+
+# ------------------------------- Load ----------------------------------
+
+def load_index(
+    root: str,
+    fingerprint: str,
+    *,
+    embeddings: Embeddings,
+) -> Optional[Tuple[NativeBM25Retriever, FAISS]]:
+    """
+    Load a previously saved index, or None if absent/incomplete/incompatible.
+    The FAISS file and BM25 arrays are memory-mapped read-only so workers on
+    one host share pages.
+    """
+    import faiss
+
+    path = Path(root) / fingerprint
+    try:
+        with open(path / _MANIFEST, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != INDEX_FORMAT_VERSION or manifest.get("fingerprint") != fingerprint:
+        return None
+
+    try:
+        # MMAP_IFC maps flat vector storage too (plain IO_FLAG_MMAP only covers IVF lists).
+        index = faiss.read_index(str(path / _FAISS_FILE), faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+
+        docs: List[Document] = []
+        index_to_docstore_id: Dict[int, str] = {}
+        with open(path / _DOCSTORE_FILE, encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                row = json.loads(line)
+                index_to_docstore_id[i] = row["id"]
+                docs.append(Document(page_content=row["text"], metadata=row["meta"], id=row["id"]))
+
+        with open(path / _BM25_VOCAB_FILE, encoding="utf-8") as f:
+            sparse = json.load(f)
+        arrays = {name: np.load(path / f"bm25_{name}.npy", mmap_mode="r") for name in _BM25_ARRAYS}
+    except (OSError, ValueError, RuntimeError, KeyError):
+        return None
+
+    if index.ntotal != len(docs) or index.ntotal != manifest.get("count"):
+        return None
+
+    docstore = InMemoryDocstore({d.id: d for d in docs})
+    faiss_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+    bm25_index = BM25Index(
+        {t: i for i, t in enumerate(sparse["terms"])},
+        arrays["indptr"], arrays["post_doc"], arrays["post_tf"], arrays["doc_len"],
+        k1=sparse["k1"], b=sparse["b"], post_w=arrays["post_w"],
+    )
+    by_id = {d.id: d for d in docs}
+    bm25 = NativeBM25Retriever(index=bm25_index, docs=[by_id[i] for i in sparse["ids"]], ids=sparse["ids"])
+    return bm25, faiss_store
@@ -0,0 +1,148 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_core.documents import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+from .cache import LRUCache
+from .config import KB_INDEX_DIR, KB_INDEX_KEEP, RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL_S
+from .index_store import kb_fingerprint, prune_indexes, save_index
+from .retriever import RetrieverProvider, SimpleHybridRetriever, build_hybrid_retriever, chunk_id
+from .telemetry import span
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+def normalize_query(text: str) -> str:
+    """Case-, width- and punctuation-insensitive form of a ticket text, for cache keys."""
+    return _NON_WORD.sub(" ", unicodedata.normalize("NFKC", text or "").casefold()).strip()
+
+
+class KBIndexManager:
+    """
+    Owns the live hybrid retriever for a KB and applies chunk edits by doc_id.
+
+    The first `retriever()` call (or `warmup()`) builds/loads the full index.
+    `upsert()` / `delete()` then embed only the changed chunks, apply them to
+    copies of the FAISS and BM25 indexes, and swap the new retriever in
+    atomically; readers never see a half-applied edit. `version` increments on every swap.
+    """
+
+    def __init__(self, chunks: List[Dict[str, Any]], *, index_dir: Optional[str] = KB_INDEX_DIR):
+        self._chunks: Dict[str, Dict[str, Any]] = {}
+        for c in chunks:
+            self._chunks[chunk_id(c)] = c
+        self._index_dir = index_dir
+        self._write_lock = threading.Lock()
+        self._provider = RetrieverProvider(self._build)
+        self.version = 0
+        self._results = LRUCache(RETRIEVAL_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL_S)
+
+    # ---- read side ----
+
+    def retriever(self) -> SimpleHybridRetriever:
+        return self._provider.get()
+
+    def warmup(self, *, background: bool = False):
+        return self._provider.warmup(background=background)
+
+    @property
+    def ready(self) -> bool:
+        return self._provider.ready
+
+    def search(self, query: str) -> List[Document]:
+        """Hybrid retrieval through the result cache. Treat returned docs as read-only."""
+        key = (self.version, normalize_query(query))
+        with span("retrieval", "kb.search") as s:
+            hits = self._results.get(key)
+            if hits is None:
+                hits = self.retriever().invoke(query)
+                self._results.put(key, hits)
+            elif s is not None:
+                s.fields["cache_hits"] = 1
+        return hits
+
+    async def asearch(self, query: str) -> List[Document]:
+        key = (self.version, normalize_query(query))
+        with span("retrieval", "kb.search") as s:
+            hits = self._results.get(key)
+            if hits is None:
+                hits = await self.retriever().ainvoke(query)
+                self._results.put(key, hits)
+            elif s is not None:
+                s.fields["cache_hits"] = 1
+        return hits
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._results.stats()
+
+    def get_chunk(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self._chunks.get(doc_id)
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    # ---- write side ----
+
+    def upsert(self, chunks: Iterable[Dict[str, Any]]) -> int:
+        """Add new chunks or replace existing ones with the same doc_id. Returns the new version."""
+        return self._apply(upserts={chunk_id(c): c for c in chunks}, deletes=set())
+
+    def delete(self, doc_ids: Iterable[str]) -> int:
+        """Retire chunks by doc_id (unknown ids are ignored). Returns the new version."""
+        return self._apply(upserts={}, deletes=set(doc_ids))
+
+    def _build(self) -> SimpleHybridRetriever:
+        return build_hybrid_retriever(list(self._chunks.values()), index_dir=self._index_dir)
+
+    def _apply(self, *, upserts: Dict[str, Dict[str, Any]], deletes: set) -> int:
+        import faiss
+
+        with self._write_lock:
+            live = self.retriever()
+            old = live.dense.vectorstore
+
+            # Copy-on-write: the live index may be a read-only mmap and is being searched.
+            store = FAISS(
+                old.embedding_function,
+                # serialize/deserialize: clone_index of a mapped flat index still views the file.
+                faiss.deserialize_index(faiss.serialize_index(old.index)),
+                InMemoryDocstore({i: old.docstore.search(i) for i in old.index_to_docstore_id.values()}),
+                dict(old.index_to_docstore_id),
+            )
+
+            present = set(store.index_to_docstore_id.values())
+            stale = [i for i in (deletes | set(upserts)) if i in present]
+            if stale:
+                store.delete(stale)
+            added = [(i, Document(page_content=c["text"], metadata=c.get("meta", {}), id=i)) for i, c in upserts.items()]
+            if added:
+                store.add_documents([d for _, d in added], ids=[i for i, _ in added])
+
+            chunks = {k: v for k, v in self._chunks.items() if k not in deletes}
+            chunks.update(upserts)
+
+            bm25 = live.sparse.updated(remove_ids=stale, add=added)
+            fresh = live.model_copy(update={
+                "sparse": bm25,
+                "dense": store.as_retriever(search_kwargs=dict(live.dense.search_kwargs)),
+            })
+
+            self._chunks = chunks
+            self._provider.swap(fresh)
+            self.version += 1
+            # Old-version keys can no longer hit; drop them rather than wait for LRU/TTL.
+            self._results.clear()
+
+            if self._index_dir:
+                fingerprint = kb_fingerprint(list(chunks.values()), embedder=store.embedding_function.signature)
+                save_index(self._index_dir, fingerprint, faiss_store=store, bm25=bm25)
+                # Each edit publishes a full index under a new fingerprint; drop superseded ones.
+                prune_indexes(self._index_dir, keep=KB_INDEX_KEEP, current=fingerprint)
+            return self.version
@@ -0,0 +1,89 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""
+Precompiled multi-keyword matching for keyword-based routing.
+
+All keywords compile into one regex whose alternation is factored as a
+character trie. That keeps a scan linear in text length: each position is
+tried against the trie once, however many keywords there are. Matching is
+case-insensitive on whole words, and any run of spaces or hyphens matches
+any other ("double-charged" == "double  charged").
+
+The text is lowercased once and the pattern starts with the trie itself (no
+IGNORECASE, no leading lookbehind), so `re` can skip ahead to positions whose
+character starts some keyword; the left word boundary is checked per hit.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+_SEP = "\0"                      # trie token for a space / hyphen run
+_SPLIT = re.compile(r"[\s\-]+")
+
+def normalize(keyword: str) -> str:
+    return " ".join(_SPLIT.split(keyword.strip().lower()))
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    trie: Dict[str, dict] = {}
+    for w in words:
+        node = trie
+        for ch in w.replace(" ", _SEP):
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end of keyword
+
+    def render(node: Dict[str, dict]) -> str:
+        optional = "" in node
+        alts = [(r"[\s\-]+" if ch == _SEP else re.escape(ch)) + render(child)
+                for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if optional:
+            return f"(?:{body})?" if len(alts) == 1 else body + "?"
+        return body
+
+    return render(trie)
+
+
+class KeywordMatcher:
+    """
+    One-pass matcher over a keyword list. `suffixes` are optional endings
+    accepted after any keyword (e.g. "s", "ed"); matches report the base keyword.
+    """
+
+    def __init__(self, keywords: Iterable[str], *, suffixes: Sequence[str] = ()):
+        self._canonical: Dict[str, str] = {}
+        for kw in keywords:
+            self._canonical.setdefault(normalize(kw), kw)
+        if not self._canonical:
+            raise ValueError("KeywordMatcher needs at least one keyword")
+        suffix = "(?:" + "|".join(re.escape(s) for s in sorted(suffixes, key=len, reverse=True)) + ")?" if suffixes else ""
+        self.pattern = re.compile(rf"(?P<kw>{_trie_pattern(self._canonical)}){suffix}(?!\w)")
+
+    @property
+    def keywords(self) -> List[str]:
+        return list(self._canonical.values())
+
+    def _hits(self, text: str) -> Iterator["re.Match[str]"]:
+        t = (text or "").lower()
+        search, pos = self.pattern.search, 0
+        while (m := search(t, pos)) is not None:
+            start = m.start()
+            if start and (t[start - 1].isalnum() or t[start - 1] == "_"):
+                pos = start + 1  # starts mid-word; retry one character later
+                continue
+            yield m
+            pos = m.end()
+
+    def search(self, text: str) -> bool:
+        """True if any keyword occurs (stops at the first hit)."""
+        return next(self._hits(text), None) is not None
+
+    def matches(self, text: str) -> List[str]:
+        """Distinct keywords found, in order of first occurrence (non-overlapping, longest first)."""
+        found: Dict[str, None] = {}
+        for m in self._hits(text):
+            found.setdefault(self._canonical[normalize(m.group("kw"))], None)
+        return list(found)
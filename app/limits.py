@@ -0,0 +1,42 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+
+from .config import EMBED_MAX_CONCURRENCY, LLM_MAX_CONCURRENCY, TOOL_MAX_CONCURRENCY
+
+
+class AsyncLimiter:
+    """
+    Bounded concurrency for one external dependency: `async with LIMIT: ...`.
+    asyncio semaphores belong to a single event loop, so one is kept per loop.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._sems: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _sem(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._sems.get(loop)
+        if sem is None:
+            with self._lock:
+                sem = self._sems.setdefault(loop, asyncio.Semaphore(self.limit))
+        return sem
+
+    async def __aenter__(self) -> "AsyncLimiter":
+        await self._sem().acquire()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._sem().release()
+
+
+LLM_LIMIT = AsyncLimiter("llm", LLM_MAX_CONCURRENCY)
+EMBED_LIMIT = AsyncLimiter("embeddings", EMBED_MAX_CONCURRENCY)
+TOOL_LIMIT = AsyncLimiter("tools", TOOL_MAX_CONCURRENCY)
@@ -0,0 +1,123 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from .config import (
+    LLM_KEEPALIVE_EXPIRY_S,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE,
+    LLM_MAX_RETRIES,
+    LLM_TIMEOUT_S,
+    OPENAI_CHAT_MODEL,
+)
+from .telemetry import llm_callbacks
+
+# One registry per event loop (httpx async pools can't cross loops), plus one
+# for plain sync callers. Each maps a client config key to a built object; a
+# loop's registry also holds its async HTTP pool, closed by aclose_models().
+_sync_registry: Dict[Hashable, Any] = {}
+_loop_registries: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, Any]]" = weakref.WeakKeyDictionary()
+_lock = threading.RLock()  # builders re-enter (chat model -> shared http client)
+_http_client: Optional[httpx.Client] = None
+# Optional stand-in for ChatOpenAI (e.g. app.fakes for offline benchmarks): f(model=, temperature=) -> chat model.
+_chat_factory: Optional[Callable[..., Any]] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_S,
+    )
+
+def shared_http_client() -> httpx.Client:
+    """Process-wide keep-alive pool for sync OpenAI calls (thread-safe)."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                _http_client = httpx.Client(limits=_limits(), timeout=LLM_TIMEOUT_S)
+    return _http_client
+
+def _registry() -> Tuple[Dict[Hashable, Any], Optional[asyncio.AbstractEventLoop]]:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _sync_registry, None
+    with _lock:
+        return _loop_registries.setdefault(loop, {}), loop
+
+def _get_or_create(key: Hashable, build) -> Any:
+    registry, loop = _registry()
+    obj = registry.get(key)
+    if obj is None:
+        with _lock:
+            obj = registry.get(key)
+            if obj is None:
+                obj = registry[key] = build(loop)
+    return obj
+
+
+def set_chat_model_factory(factory: Optional[Callable[..., Any]]) -> None:
+    """Build chat models with `factory` instead of ChatOpenAI (None restores it). Drops cached clients."""
+    global _chat_factory
+    with _lock:
+        _chat_factory = factory
+        _sync_registry.clear()
+        _loop_registries.clear()
+
+async def aclose_models() -> None:
+    """
+    Drop the running loop's clients and close its HTTP pool. Call before the
+    loop ends (e.g. at the end of an asyncio.run entry point); later calls on
+    the same loop build fresh clients.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        registry = _loop_registries.pop(loop, {})
+    client = registry.get(("http_async",))
+    if client is not None:
+        await client.aclose()
+
+def get_chat_model(*, api_key: str, model: Optional[str] = None, temperature: Optional[float] = None) -> ChatOpenAI:
+    """
+    Shared ChatOpenAI per (model, temperature, key), created once per process
+    (and once per event loop for async use) so HTTP connections stay warm.
+    """
+    model = model or OPENAI_CHAT_MODEL
+
+    def build(loop: Optional[asyncio.AbstractEventLoop]) -> ChatOpenAI:
+        if _chat_factory is not None:
+            return _chat_factory(model=model, temperature=temperature, callbacks=llm_callbacks() or None)
+        kwargs: Dict[str, Any] = {
+            "model": model,
+            "api_key": api_key,
+            "timeout": LLM_TIMEOUT_S,
+            "max_retries": LLM_MAX_RETRIES,
+            "http_client": shared_http_client(),
+        }
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        callbacks = llm_callbacks()
+        if callbacks:
+            kwargs["callbacks"] = callbacks
+            kwargs["stream_usage"] = True  # token counts for streamed drafts too
+        if loop is not None:
+            kwargs["http_async_client"] = _get_or_create(
+                ("http_async",), lambda _loop: httpx.AsyncClient(limits=_limits(), timeout=LLM_TIMEOUT_S))
+        return ChatOpenAI(**kwargs)
+
+    return _get_or_create(("chat", model, temperature, api_key), build)
+
+def get_structured_model(schema: type, *, api_key: str, model: Optional[str] = None, temperature: Optional[float] = None):
+    """Cached `with_structured_output(schema)` runnable over the shared client."""
+    llm = get_chat_model(api_key=api_key, model=model, temperature=temperature)
+    return _get_or_create(("structured", id(llm), schema), lambda _loop: llm.with_structured_output(schema))
@@ -7,18 +7,22 @@ from .config import (
     MEDIUM_THRESHOLD_CENTS,
 )
 from .policy import required_evidence_for, which_missing, policy_blocks_auto
+from .keywords import KeywordMatcher
 
+# Spaces and hyphens are interchangeable ("double-charged" == "double charged").
+# The suffixes below only append, so stems ending in "e" list their "-ing" form
+# ("charging", not "chargeing") explicitly.
 REFUND_KEYWORDS = [
-    "refund", "refunded",
-    "double charge", "double-charged", "double charged",
+    "refund", "refundable", "nonrefundable",
+    "double charge", "double charging",
     "charged twice",
-    "overcharge", "over-charged", "over charged",
+    "overcharge", "over charge", "overcharging", "over charging",
     "chargeback",
 ]
+BILLING_MATCHER = KeywordMatcher(REFUND_KEYWORDS, suffixes=("s", "es", "d", "ed", "ing"))
 
 def _looks_like_billing(text: str) -> bool:
-    t = (text or "").lower()
-    return any(kw in t for kw in REFUND_KEYWORDS)
+    return BILLING_MATCHER.search(text)
 
 def plan_actions(state: CaseState):
     """
@@ -36,7 +40,7 @@ def plan_actions(state: CaseState):
     
     cents = max(1, meta.get("amount_cents", 0)) 
     # Global policy blocks (disqualify auto-refund regardless of amount)
-    blocked, reason = policy_blocks_auto(meta)
+    blocked, reason = policy_blocks_auto(meta, cents=cents)
     if blocked:
         # deny & escalate via notify; no approval path for auto
         esc = ActionStep(
@@ -1,65 +1,30 @@
 # Copyright Lukas Licon 2025. All Rights Reserved.
 
 from __future__ import annotations
-from typing import List, Dict, Any, Tuple
-from .config import EXPLANATION_MIN_CHARS
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import numpy as np
+from .config import EXPLANATION_MIN_CHARS, POLICY_PACK_PATH
+from .policy_engine import Columns, PolicyPack, in_column, truthy_column, load_policy_pack
 
-def required_evidence_for(*, cents: int, metadata: Dict[str, Any], text: str) -> List[str]:
-    needs: List[str] = []
-    needs.append("order_id")
-
-    # Default rule: explanation for >= $10
-    explanation_required = cents >= 1000
+# Rules live in a policy pack (POLICY_PACK_PATH, default app/policies/default.json), compiled once.
+_pack: PolicyPack = load_policy_pack(POLICY_PACK_PATH)
 
-    # If it's a physical item AND we already have a photo + return started,
-    # relax the explanation requirement.
-    if metadata.get("physical_item") and metadata.get("return_status") in {"initiated","received"}:
-        has_photo = bool(metadata.get("images")) and len(metadata.get("images") or []) > 0
-        if has_photo:
-            explanation_required = False
+def get_policy_pack() -> PolicyPack:
+    return _pack
 
-    if explanation_required:
-        needs.append("explanation")
+def set_policy_pack(pack: PolicyPack) -> None:
+    """Swap the active pack (e.g. after editing the JSON) without restarting."""
+    global _pack
+    _pack = pack
 
-    if metadata.get("physical_item") or metadata.get("requires_return"):
-        needs.append("return_initiated")
-
-    evidence_flag = metadata.get("evidence_required", False)
-    if cents >= metadata.get("photo_threshold_cents", 2000) and (evidence_flag or metadata.get("physical_item")):
-        needs.append("photo")
+def required_evidence_for(*, cents: int, metadata: Dict[str, Any], text: str) -> List[str]:
+    return _pack.required_evidence(cents=cents, metadata=metadata)
 
-    # de-dupe
-    seen, uniq = set(), []
-    for k in needs:
-        if k not in seen:
-            seen.add(k); uniq.append(k)
-    return uniq
 
+def policy_blocks_auto(meta: Dict[str, Any], *, cents: int) -> Tuple[bool, str]:
+    return _pack.block_reason(meta, cents=cents)
 
-def policy_blocks_auto(meta: Dict[str, Any]) -> Tuple[bool, str]:
-    # timing
-    if meta.get("outside_window"):
-        return True, "outside_window"
-    # product type
-    if meta.get("nonrefundable") or meta.get("gift_card"):
-        return True, "nonrefundable"
-    if meta.get("digital_item_delivered") and not meta.get("evidence_of_non_delivery"):
-        return True, "digital_delivered"
-    # disputes / risk
-    if meta.get("chargeback_open"):
-        return True, "chargeback_open"
-    if meta.get("fraud_score", 0) >= int(meta.get("fraud_threshold", 80)):
-        return True, "high_risk"
-    # payment method
-    if meta.get("payment_method") in {"wire", "crypto"}:
-        return True, "payment_method"
-    # cumulative behavior
-    if meta.get("recent_refund_count", 0) >= int(meta.get("refund_rate_limit", 3)):
-        return True, "refund_rate_limited"
-    # manual review
-    if meta.get("manual_review_hold"):
-        return True, "manual_hold"
-    return False, ""
+_RETURNED = frozenset({"initiated", "received"})
 
 def which_missing(
     *, required: List[str], metadata: Dict[str, Any], text: str
@@ -70,9 +35,29 @@ def which_missing(
         "order_id": bool(metadata.get("order_id")),
         "explanation": bool(metadata.get("explanation") or (text and len(text.strip()) >= EXPLANATION_MIN_CHARS)),
         "photo": bool(metadata.get("images")) and len(metadata.get("images") or []) > 0,
-        "return_initiated": metadata.get("return_status") in {"initiated", "received"},
+        "return_initiated": metadata.get("return_status") in _RETURNED,
     }
     for k in required:
         if not has.get(k, False):
             missing.append(k)
     return missing
+
+def which_missing_columns(
+    *, required: Dict[str, np.ndarray], columns: Columns, text: Optional[Sequence[Any]] = None
+) -> Dict[str, np.ndarray]:
+    """which_missing() for a column-oriented batch: per required item, bool[n] of rows missing it."""
+    if not required:
+        return {}
+    n = len(next(iter(required.values())))
+    explanation = truthy_column(columns.get("explanation"), n)
+    if text is not None:
+        explanation = explanation | np.fromiter(
+            (bool(t and len(t.strip()) >= EXPLANATION_MIN_CHARS) for t in text), dtype=bool, count=n
+        )
+    has = {
+        "order_id": truthy_column(columns.get("order_id"), n),
+        "explanation": explanation,
+        "photo": truthy_column(columns.get("images"), n),
+        "return_initiated": in_column(columns.get("return_status"), _RETURNED, n),
+    }
+    return {k: req & ~has[k] if k in has else req.copy() for k, req in required.items()}
@@ -0,0 +1,246 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""
+Policy packs: refund blocks and evidence requirements as data.
+
+A pack (JSON, or YAML when PyYAML is installed) is compiled once into ordered
+rule tables: a generated if-chain for one ticket's metadata and numpy
+evaluators for a column-oriented batch, so the same pack serves the graph
+(one ticket) and bulk re-evaluation (a whole backlog).
+
+Predicates:
+    true / false                         constant
+    {"truthy": key}                      bool(meta.get(key))
+    {"in": [key, [v, ...]]}              meta.get(key) in {v, ...}
+    {"gte" | "gt" | "lte" | "lt" | "eq": [a, b]}
+        operands: a number, "$cents" (requested amount, in blocks and evidence), a key, or
+        {"field": key, "default": d, "cast": "int"}
+    {"all": [...]}, {"any": [...]}, {"not": p}
+
+Blocks are first-match ({"reason", "when"}); evidence items are collected in
+order ({"item", "when"}), de-duplicated.
+"""
+
+from __future__ import annotations
+
+import json
+import operator
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_PACK_PATH = Path(__file__).with_name("policies") / "default.json"
+
+Columns = Mapping[str, Sequence[Any]]
+_Vector = Callable[[Columns, Mapping[str, np.ndarray], int], np.ndarray]
+
+# Per-call values a predicate may reference as "$name"; every evaluator receives them.
+_VARIABLES = ("cents",)
+
+_COMPARE = {"gte": operator.ge, "gt": operator.gt, "lte": operator.le, "lt": operator.lt, "eq": operator.eq}
+
+
+# ------------------------------ Columns --------------------------------
+# Column readers shared by the pack's vector evaluators, policy.which_missing_columns
+# and the simulator. A column is a numpy array or any sequence; None = column absent.
+
+def truthy_column(col: Optional[Sequence[Any]], n: int) -> np.ndarray:
+    """bool(cell) per row; an absent column is all False."""
+    if col is None:
+        return np.zeros(n, dtype=bool)
+    if isinstance(col, np.ndarray) and col.dtype.kind in "biuf":
+        return (col != 0) & ~np.isnan(col) if col.dtype.kind == "f" else col != 0
+    return np.fromiter((bool(v) for v in col), dtype=bool, count=n)
+
+def in_column(col: Optional[Sequence[Any]], allowed: frozenset, n: int) -> np.ndarray:
+    """cell in `allowed` per row; an absent column reads as None."""
+    if col is None:
+        return np.full(n, None in allowed)
+    if isinstance(col, np.ndarray) and col.dtype.kind in "USbiuf":
+        return np.isin(col, list(allowed))
+    return np.fromiter((v in allowed for v in col), dtype=bool, count=n)
+
+def numeric_column(col: Optional[Sequence[Any]], default: Any, n: int) -> np.ndarray:
+    """Floats; absent cells (None / NaN / missing column) take `default`, or NaN (never matches)."""
+    fill = np.nan if default is None else float(default)
+    if col is None:
+        return np.full(n, fill)
+    if isinstance(col, np.ndarray) and col.dtype.kind in "biuf":
+        arr = col.astype(float)
+    else:
+        arr = np.fromiter((np.nan if v is None else float(v) for v in col), dtype=float, count=n)
+    return np.where(np.isnan(arr), fill, arr)
+
+
+# ----------------------------- Compilation -----------------------------
+# Scalar side: each rule table becomes one generated function (a plain if-chain,
+# constants bound by name), so a single ticket costs about what hand-written code
+# does. Vector side: each predicate becomes a closure over numpy columns.
+# Predicate expressions are only used in boolean context (if / and / or / not).
+
+class _Consts:
+    def __init__(self):
+        self.ns: Dict[str, Any] = {}
+
+    def __call__(self, value: Any) -> str:
+        name = f"_k{len(self.ns)}"
+        self.ns[name] = value
+        return name
+
+def _operand(spec: Any, consts: _Consts) -> Tuple[str, Callable[[Columns, Mapping[str, np.ndarray], int], Any]]:
+    if isinstance(spec, bool) or not isinstance(spec, (int, float, str, dict)):
+        raise ValueError(f"bad policy operand {spec!r}")
+    if isinstance(spec, (int, float)):
+        return consts(spec), (lambda cols, ctx, n: float(spec))
+    if isinstance(spec, str) and spec.startswith("$"):
+        var = spec[1:]
+        if var not in _VARIABLES:
+            raise ValueError(f"unknown policy variable {spec!r} (expected one of: ${', $'.join(_VARIABLES)})")
+        return f"ctx[{consts(var)}]", (lambda cols, ctx, n: np.asarray(ctx[var], dtype=float))
+    if isinstance(spec, str):
+        spec = {"field": spec}
+    key, default, cast = spec["field"], spec.get("default"), spec.get("cast")
+    if cast not in (None, "int"):
+        raise ValueError(f"unsupported cast {cast!r} for field {key!r}")
+    expr = f"m.get({consts(key)}, {consts(default)})"
+    if cast == "int":
+        return f"int({expr})", (lambda cols, ctx, n: np.trunc(numeric_column(cols.get(key), default, n)))
+    return expr, (lambda cols, ctx, n: numeric_column(cols.get(key), default, n))
+
+def _compile(spec: Any, consts: _Consts) -> Tuple[str, _Vector]:
+    """Predicate -> (Python expression over `m` / `ctx`, vectorized evaluator)."""
+    if isinstance(spec, bool):
+        return repr(spec), (lambda cols, ctx, n: np.full(n, spec))
+    if not isinstance(spec, dict) or len(spec) != 1:
+        raise ValueError(f"bad policy predicate {spec!r}")
+    (op, arg), = spec.items()
+
+    if op == "truthy":
+        return f"m.get({consts(arg)})", (lambda cols, ctx, n: truthy_column(cols.get(arg), n))
+
+    if op == "in":
+        key, values = arg
+        allowed = frozenset(values)
+        return f"(m.get({consts(key)}) in {consts(allowed)})", (lambda cols, ctx, n: in_column(cols.get(key), allowed, n))
+
+    if op in _COMPARE:
+        cmp = _COMPARE[op]
+        (le, lv), (re_, rv) = _operand(arg[0], consts), _operand(arg[1], consts)
+        def vector(cols, ctx, n):
+            with np.errstate(invalid="ignore"):
+                return np.broadcast_to(cmp(lv(cols, ctx, n), rv(cols, ctx, n)), (n,))
+        return f"({le} {_SYMBOL[op]} {re_})", vector
+
+    if op in ("all", "any"):
+        parts = [_compile(p, consts) for p in arg]
+        if not parts:
+            return repr(op == "all"), (lambda cols, ctx, n: np.full(n, op == "all"))
+        reduce = np.logical_and.reduce if op == "all" else np.logical_or.reduce
+        joiner = " and " if op == "all" else " or "
+        return "(" + joiner.join(e for e, _ in parts) + ")", (lambda cols, ctx, n: reduce([v(cols, ctx, n) for _, v in parts]))
+
+    if op == "not":
+        e, v = _compile(arg, consts)
+        return f"(not {e})", (lambda cols, ctx, n: ~v(cols, ctx, n))
+
+    raise ValueError(f"unknown policy operator {op!r}")
+
+_SYMBOL = {"gte": ">=", "gt": ">", "lte": "<=", "lt": "<", "eq": "=="}
+
+def _build(name: str, lines: List[str], consts: _Consts) -> Callable:
+    ns = dict(consts.ns)
+    exec(compile("\n".join(lines), f"<policy:{name}>", "exec"), ns)
+    return ns[name]
+
+
+# -------------------------------- Pack ---------------------------------
+
+class PolicyPack:
+    """Compiled policy pack. Build with `load_policy_pack(path)` or `PolicyPack(dict)`."""
+
+    def __init__(self, spec: Mapping[str, Any]):
+        self.name = str(spec.get("name", "custom"))
+        self.version = spec.get("version")
+        blocks, evidence = list(spec.get("blocks", [])), list(spec.get("evidence", []))
+        self.block_reasons: List[str] = [r["reason"] for r in blocks]
+        self.evidence_items: List[str] = list(dict.fromkeys(r["item"] for r in evidence))
+
+        consts = _Consts()
+        src = ["def _blocks(m, ctx):"]
+        self._block_vectors: List[_Vector] = []
+        for i, rule in enumerate(blocks):
+            expr, vector = _compile(rule["when"], consts)
+            src.append(f"    if {expr}: return {i}")
+            self._block_vectors.append(vector)
+        src.append("    return -1")
+        self._block_index = _build("_blocks", src, consts)
+
+        src = ["def _evidence(m, ctx):", "    out = []"]
+        self._evidence_vectors: List[Tuple[str, _Vector]] = []
+        for rule in evidence:
+            expr, vector = _compile(rule["when"], consts)
+            src.append(f"    if {expr} and {consts(rule['item'])} not in out: out.append({consts(rule['item'])})")
+            self._evidence_vectors.append((rule["item"], vector))
+        src.append("    return out")
+        self._evidence_list = _build("_evidence", src, consts)
+
+    # ---- one ticket ----
+
+    def block_reason(self, meta: Mapping[str, Any], *, cents: int) -> Tuple[bool, str]:
+        """First matching block rule for a request of `cents`: (True, reason), else (False, "")."""
+        i = self._block_index(meta, {"cents": cents})
+        return (True, self.block_reasons[i]) if i >= 0 else (False, "")
+
+    def required_evidence(self, *, cents: int, metadata: Mapping[str, Any]) -> List[str]:
+        return self._evidence_list(metadata, {"cents": cents})
+
+    # ---- column-oriented batches ----
+
+    def evaluate_blocks(self, columns: Columns, cents: Sequence[int], n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Block check for a whole batch: `columns` maps metadata keys to equal-length
+        sequences (absent cells as None / NaN), `cents` is each row's requested
+        amount. Returns (blocked bool[n], reason str[n] with "" where not blocked),
+        first match per row as in block_reason().
+        """
+        n = _rows(columns, n if n is not None else len(cents))
+        ctx = {"cents": np.asarray(cents, dtype=float)}
+        rule = np.full(n, -1, dtype=np.int32)
+        for i, vector in enumerate(self._block_vectors):
+            open_rows = rule < 0
+            if not open_rows.any():
+                break
+            rule[open_rows & vector(columns, ctx, n)] = i
+        reasons = np.array(self.block_reasons + [""], dtype=object)[rule]
+        return rule >= 0, reasons
+
+    def evaluate_evidence(self, columns: Columns, cents: Sequence[int], n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Per evidence item, bool[n]: whether each row requires it at its amount in `cents`."""
+        n = _rows(columns, n if n is not None else len(cents))
+        ctx = {"cents": np.asarray(cents, dtype=float)}
+        out = {item: np.zeros(n, dtype=bool) for item in self.evidence_items}
+        for item, vector in self._evidence_vectors:
+            out[item] |= vector(columns, ctx, n)
+        return out
+
+def _rows(columns: Columns, n: Optional[int]) -> int:
+    if n is not None:
+        return n
+    for col in columns.values():
+        return len(col)
+    raise ValueError("cannot infer batch size from empty columns; pass n")
+
+def load_policy_pack(path: Optional[str] = None) -> PolicyPack:
+    """Load and compile a pack from JSON/YAML; None or "" loads the bundled default."""
+    p = Path(path) if path else DEFAULT_PACK_PATH
+    with open(p, encoding="utf-8") as f:
+        if p.suffix in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise RuntimeError(f"PyYAML is required to load {p}; install it or use JSON") from e
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.load(f)
+    return PolicyPack(spec)
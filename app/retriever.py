@@ -2,51 +2,181 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List, Tuple
-from collections import defaultdict
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
-from langchain_community.retrievers import BM25Retriever
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 
+from .bm25 import NativeBM25Retriever
+from .config import (
+    KB_INDEX_DIR,
+    KB_INDEX_KEEP,
+    RETRIEVER_DENSE_TIMEOUT_S,
+    RETRIEVER_FINAL_K,
+    RETRIEVER_LEG_WORKERS,
+    RETRIEVER_SPARSE_TIMEOUT_S,
+)
+from .embeddings import get_embeddings
+from .index_store import kb_fingerprint, load_index, prune_indexes, save_index
+from .telemetry import count
+
+log = logging.getLogger(__name__)
+
+# Legs dropped from fusion, per leg and reason (process-wide; see retrieval_leg_stats).
+_leg_errors: Dict[str, int] = {}
+_leg_errors_lock = threading.Lock()
+
+def _leg_failed(name: str, reason: str) -> None:
+    with _leg_errors_lock:
+        key = f"{name}.{reason}"
+        _leg_errors[key] = _leg_errors.get(key, 0) + 1
+    count("retrieval", f"{name}_leg", errors=1, error=reason)
+
+def retrieval_leg_stats() -> Dict[str, int]:
+    """How often each leg was dropped from fusion, by leg and reason, e.g. {"dense.timeout": 3, "dense.error": 1}."""
+    with _leg_errors_lock:
+        return dict(_leg_errors)
+
+
+class _LegPool:
+    """
+    Runs retrieval legs off the caller thread with backpressure: at most `workers`
+    calls in flight, so a submitted call starts at once and its timeout measures
+    the call itself, never time spent queued behind other queries. A caller
+    that cannot get a slot within its timeout skips the leg. A timed-out call
+    keeps its slot until it returns, so a stalled backend is not handed more work.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="retrieval-leg")
+
+    def submit(self, name: str, fn: Callable[[str], List[Document]], query: str,
+               timeout: Optional[float]) -> "_Leg":
+        """Start the call now if a slot is free; otherwise `result()` waits for one."""
+        leg = _Leg(self, name, fn, query, timeout)
+        leg.start(wait=False)
+        return leg
+
+class _Leg:
+    def __init__(self, pool: _LegPool, name: str, fn: Callable[[str], List[Document]], query: str,
+                 timeout: Optional[float]):
+        self.pool, self.name, self.fn, self.query, self.timeout = pool, name, fn, query, timeout
+        self.future: Optional[Future] = None
+        self._started = threading.Event()
+
+    def start(self, *, wait: bool) -> bool:
+        if self.future is not None:
+            return True
+        slots = self.pool._slots
+        if not (slots.acquire(timeout=self.timeout) if wait else slots.acquire(blocking=False)):
+            return False
+
+        def call() -> List[Document]:
+            self._started.set()
+            return self.fn(self.query)
+
+        try:
+            # copy_context() keeps contextvars (run config, tracing) visible inside the pool.
+            self.future = self.pool._pool.submit(contextvars.copy_context().run, call)
+        except BaseException:
+            slots.release()
+            raise
+        self.future.add_done_callback(lambda _: slots.release())
+        return True
+
+    def result(self) -> Optional[List[Document]]:
+        """Leg documents, or None if it was skipped, failed or timed out (each logged)."""
+        if not self.start(wait=True):
+            log.warning("%s retrieval skipped: all %d leg workers busy", self.name, self.pool.workers)
+            _leg_failed(self.name, "busy")
+            return None
+        self._started.wait(self.timeout)  # immediate in practice: the call owns a slot, hence a worker
+        try:
+            return self.future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self.future.cancel()
+            log.warning("%s retrieval timed out after %.2fs; continuing without it", self.name, self.timeout)
+            _leg_failed(self.name, "timeout")
+        except Exception:
+            log.warning("%s retrieval failed; continuing without it", self.name, exc_info=True)
+            _leg_failed(self.name, "error")
+        return None
+
+# Shared by every hybrid retriever in the process, one pool per leg so a stalled
+# embedding backend can only exhaust the dense slots, never BM25's.
+_LEG_POOL = _LegPool(RETRIEVER_LEG_WORKERS)
+_SPARSE_POOL = _LegPool(RETRIEVER_LEG_WORKERS)
 
 # ------------------------------ RRF utils ------------------------------
 
-def _doc_key(doc: Document) -> Tuple[str, str]:
+def chunk_id(chunk: Dict[str, Any]) -> str:
+    """KB chunk identity: meta 'doc_id' if present, else a hash of the text."""
+    meta = chunk.get("meta") or {}
+    return str(meta.get("doc_id") or "h_" + hashlib.sha1(chunk["text"].encode("utf-8")).hexdigest()[:16])
+
+def _doc_key(doc: Document) -> str:
     """
-    Stable key for a Document to dedupe across retrievers.
-    Prefer metadata 'doc_id' or 'url'; fallback to content.
+    Compact key for a Document to dedupe across retrievers.
+    Prefer metadata 'doc_id' or 'url' (or the store id); hash content only as a last resort.
     """
     meta = doc.metadata or {}
-    return (str(meta.get("doc_id") or meta.get("url") or ""), doc.page_content)
+    key = meta.get("doc_id") or meta.get("url") or doc.id
+    if key:
+        return str(key)
+    return "h_" + hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:16]
 
 def rrf_merge(
-    s_docs: Iterable[Document],
-    d_docs: Iterable[Document],
-    *,
+    *ranked: Iterable[Document],
     k: int = 8,
     k_rrf: int = 60,
-    weights: Tuple[float, float] = (0.4, 0.6),
+    weights: Optional[Sequence[float]] = None,
+    top_n: Optional[int] = None,
 ) -> List[Document]:
-    """Reciprocal Rank Fusion of two ranked lists."""
-    w_s, w_d = weights
-    scores: Dict[Tuple[str, str], float] = defaultdict(float)
-    keep: Dict[Tuple[str, str], Document] = {}
+    """
+    Weighted Reciprocal Rank Fusion of any number of ranked lists.
+    Only the first `k` docs of each list are read. Returned docs are copies
+    carrying the fused score in metadata["score"], best first, truncated to
+    `top_n` (None = all candidates). Weights default to equal.
+    """
+    if weights is None:
+        weights = [1.0] * len(ranked)
+    if len(weights) != len(ranked):
+        raise ValueError(f"rrf_merge got {len(ranked)} ranked lists but {len(weights)} weights")
 
-    for r, doc in enumerate(list(s_docs)[:k], start=1):
-        key = _doc_key(doc)
-        keep[key] = doc
-        scores[key] += w_s * (1.0 / (k_rrf + r))
+    scores: Dict[str, float] = {}
+    keep: Dict[str, Document] = {}
+    for docs, w in zip(ranked, weights):
+        for r, doc in enumerate(itertools.islice(docs, k), start=1):
+            key = _doc_key(doc)
+            keep.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + w / (k_rrf + r)
 
-    for r, doc in enumerate(list(d_docs)[:k], start=1):
-        key = _doc_key(doc)
-        keep.setdefault(key, doc)
-        scores[key] += w_d * (1.0 / (k_rrf + r))
+    # Ties go to the shorter chunk.
+    order = lambda key: (-scores[key], len(keep[key].page_content))
+    if top_n is not None and top_n < len(scores):
+        ranked_keys = heapq.nsmallest(top_n, scores, key=order)
+    else:
+        ranked_keys = sorted(scores, key=order)
 
-    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], len(kv[0][1])))
-    return [keep[key] for key, _ in ranked]
+    return [
+        Document(
+            page_content=keep[key].page_content,
+            metadata={**(keep[key].metadata or {}), "score": scores[key]},
+            id=keep[key].id,
+        )
+        for key in ranked_keys
+    ]
 
 
 # --------------------------- Hybrid Retriever ---------------------------
@@ -55,37 +185,166 @@ class SimpleHybridRetriever(BaseRetriever):
     """
     Fuses BM25 (sparse) and FAISS (dense) using RRF.
     Both child retrievers must support `.invoke(query: str) -> List[Document]`.
+
+    Both legs run concurrently, each with its own timeout (None = no limit):
+    sync callers use one leg pool per leg, so slow embedding calls never hold
+    up BM25; async callers run BM25 in a worker thread next to the dense
+    coroutine. A leg that times out, fails or finds its pool saturated
+    contributes nothing, so a slow leg degrades to single-leg results instead
+    of stalling the ticket.
     """
 
     k: int = 8
     k_rrf: int = 60
     weights: Tuple[float, float] = (0.4, 0.6)
+    final_k: Optional[int] = RETRIEVER_FINAL_K
     sparse: Any
     dense: Any
+    sparse_timeout: Optional[float] = RETRIEVER_SPARSE_TIMEOUT_S
+    dense_timeout: Optional[float] = RETRIEVER_DENSE_TIMEOUT_S
 
     class Config:
         arbitrary_types_allowed = True
 
     def _get_relevant_documents(self, query: str, *, run_manager: Any = None) -> List[Document]:
-        s_docs: List[Document] = list(self.sparse.invoke(query))[: self.k]
-        d_docs: List[Document] = list(self.dense.invoke(query))[: self.k]
-        return rrf_merge(s_docs, d_docs, k=self.k, k_rrf=self.k_rrf, weights=self.weights)
+        dense = _LEG_POOL.submit("dense", self.dense.invoke, query, self.dense_timeout)
+        sparse = _SPARSE_POOL.submit("sparse", self.sparse.invoke, query, self.sparse_timeout)
+        return self._fuse(sparse.result(), dense.result())
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: Any = None) -> List[Document]:
+        # BM25 is CPU-bound: off the loop, so the dense coroutine runs alongside it.
+        s_docs, d_docs = await asyncio.gather(
+            self._aleg_result("sparse", asyncio.to_thread(self.sparse.invoke, query), self.sparse_timeout),
+            self._aleg_result("dense", self.dense.ainvoke(query), self.dense_timeout),
+        )
+        return self._fuse(s_docs, d_docs)
+
+    def _fuse(self, s_docs: Optional[List[Document]], d_docs: Optional[List[Document]]) -> List[Document]:
+        legs = [(docs, w) for docs, w in zip((s_docs, d_docs), self.weights) if docs is not None]
+        if not legs:
+            raise RuntimeError("hybrid retrieval failed: both sparse and dense legs failed or timed out")
+        return rrf_merge(
+            *(docs for docs, _ in legs),
+            k=self.k,
+            k_rrf=self.k_rrf,
+            weights=[w for _, w in legs],
+            top_n=self.final_k,
+        )
+
+    @staticmethod
+    async def _aleg_result(name: str, leg: Any, timeout: Optional[float]) -> Optional[List[Document]]:
+        try:
+            return await asyncio.wait_for(leg, timeout)
+        except asyncio.TimeoutError:
+            log.warning("%s retrieval timed out after %.2fs; continuing without it", name, timeout)
+            _leg_failed(name, "timeout")
+        except Exception:
+            log.warning("%s retrieval failed; continuing without it", name, exc_info=True)
+            _leg_failed(name, "error")
+        return None
 
 
 # ------------------------------ Builder --------------------------------
 
-def build_hybrid_retriever(chunks: List[Dict[str, Any]]) -> SimpleHybridRetriever:
+def build_hybrid_retriever(
+    chunks: List[Dict[str, Any]],
+    *,
+    index_dir: Optional[str] = KB_INDEX_DIR,
+) -> SimpleHybridRetriever:
     """
     Create a BM25 retriever and a FAISS retriever over the given chunks.
     Each chunk: {"text": "...", "meta": {...}}  (meta optional)
+
+    With `index_dir` set, the built index is persisted under a content hash of
+    the chunks and the active embeddings (model and dimension) and reloaded
+    (memory-mapped) on later starts; it is only rebuilt when either changes.
+    Only the newest KB_INDEX_KEEP versions are kept on disk. Pass index_dir=None to skip.
     """
-    docs = [Document(page_content=c["text"], metadata=c.get("meta", {})) for c in chunks]
+    # Shared, content-addressed cache: re-indexing and repeat queries skip the API.
+    embeddings = get_embeddings()
 
-    # Sparse
-    bm25 = BM25Retriever.from_documents(docs)
+    fingerprint = kb_fingerprint(chunks, embedder=embeddings.signature) if index_dir else ""
+    loaded = load_index(index_dir, fingerprint, embeddings=embeddings) if index_dir else None
 
-    # Dense
-    embeddings = OpenAIEmbeddings()
-    faiss = FAISS.from_documents(docs, embeddings).as_retriever(search_kwargs={"k": 8})
+    if loaded is not None:
+        bm25, store = loaded
+    else:
+        # Ids are chunk ids so the KB can later be edited in place by doc_id.
+        ids = [chunk_id(c) for c in chunks]
+        if len(set(ids)) != len(ids):
+            raise ValueError("KB chunks must have unique doc_ids")
+        docs = [Document(page_content=c["text"], metadata=c.get("meta", {}), id=i) for c, i in zip(chunks, ids)]
 
+        # Sparse
+        bm25 = NativeBM25Retriever.from_documents(docs, ids)
+
+        # Dense
+        store = FAISS.from_documents(docs, embeddings, ids=ids)
+
+        if index_dir:
+            save_index(index_dir, fingerprint, faiss_store=store, bm25=bm25)
+            prune_indexes(index_dir, keep=KB_INDEX_KEEP, current=fingerprint)
+
+    faiss = store.as_retriever(search_kwargs={"k": 8})
     return SimpleHybridRetriever(sparse=bm25, dense=faiss, k=8, k_rrf=60, weights=(0.4, 0.6))
+
+
+# ------------------------------ Provider -------------------------------
+
+class RetrieverProvider:
+    """
+    Process-wide, lazily constructed retriever.
+    The factory runs once, on the first `get()` or an explicit `warmup()`;
+    concurrent callers block on the same build instead of racing it.
+    """
+
+    def __init__(self, factory: Callable[[], BaseRetriever]):
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._retriever: Optional[BaseRetriever] = None
+        self._warmer: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._retriever is not None
+
+    def get(self) -> BaseRetriever:
+        retriever = self._retriever
+        if retriever is None:
+            with self._lock:
+                if self._retriever is None:
+                    self._retriever = self._factory()
+                retriever = self._retriever
+        return retriever
+
+    def warmup(self, *, background: bool = False) -> Optional[threading.Thread]:
+        """
+        Build now. Pre-fork servers should call this in the parent so workers
+        inherit the built index. With background=True the build runs on a
+        daemon thread (returned) and `get()` waits for it if it's still going.
+        """
+        if not background:
+            self.get()
+            return None
+        with self._lock:
+            if self._retriever is None and (self._warmer is None or not self._warmer.is_alive()):
+                self._warmer = threading.Thread(target=self._warm_quietly, name="retriever-warmup", daemon=True)
+                self._warmer.start()
+            return self._warmer
+
+    def swap(self, retriever: BaseRetriever) -> None:
+        """Atomically replace the live retriever; in-flight queries finish on the old one."""
+        with self._lock:
+            self._retriever = retriever
+
+    def reset(self) -> None:
+        """Drop the built retriever; the next `get()` rebuilds it."""
+        with self._lock:
+            self._retriever = None
+
+    def _warm_quietly(self) -> None:
+        try:
+            self.get()
+        except Exception:
+            # Leave it unbuilt; the first real `get()` retries and raises.
+            pass
@@ -0,0 +1,188 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""
+What-if simulation of refund policy over historical tickets.
+
+Runs only the deterministic part of planning (policy blocks, evidence
+requirements, missing evidence, amount tiers) over column-oriented chunks of
+ticket metadata, once per threshold setting, without the graph or any LLM.
+Rows with ticket text go through the same billing keyword gate as
+plan_actions (NOT_BILLING otherwise); rows without text count as refund requests.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import LOW_THRESHOLD_CENTS, MEDIUM_THRESHOLD_CENTS, REFUND_CAP_CENTS
+from .plan import BILLING_MATCHER
+from .policy import get_policy_pack, which_missing_columns
+from .policy_engine import Columns, PolicyPack, numeric_column
+
+# Outcome per ticket, in plan_actions precedence (highest first).
+TIERS = ("NOT_BILLING", "BLOCKED", "OVER_CAP", "MISSING", "AUTO", "HIL", "HIGH")
+_NOT_BILLING, _BLOCKED, _OVER_CAP, _MISSING, _AUTO, _HIL, _HIGH = range(len(TIERS))
+
+
+@dataclass(frozen=True)
+class Thresholds:
+    low: int = LOW_THRESHOLD_CENTS
+    medium: int = MEDIUM_THRESHOLD_CENTS
+    cap: int = REFUND_CAP_CENTS
+
+    def label(self) -> str:
+        return f"low={self.low} medium={self.medium} cap={self.cap}"
+
+
+# ------------------------------- Readers -------------------------------
+
+def _as_column(values: List[Any]) -> Any:
+    """Typed numpy column when the values allow it (absent numbers -> NaN); otherwise the list."""
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, bool) for v in present):
+        return np.array([bool(v) for v in values], dtype=bool)
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return np.array([np.nan if v is None else v for v in values], dtype=float)
+    if present and len(present) == len(values) and all(isinstance(v, str) for v in present):
+        return np.array(values, dtype=str)
+    return values
+
+def _to_columns(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    keys = dict.fromkeys(k for r in rows for k in r)
+    return {k: _as_column([r.get(k) for r in rows]) for k in keys}
+
+def iter_jsonl_chunks(path: str, *, chunk_rows: int) -> Iterator[Tuple[Columns, Optional[Sequence[Any]], int]]:
+    """
+    (metadata columns, text column or None, rows) per chunk. Each line is a
+    Ticket dict (`metadata`, optional `text`) or a flat metadata dict.
+    """
+    rows: List[Dict[str, Any]] = []
+    texts: List[Any] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            if isinstance(row.get("metadata"), dict):
+                texts.append(row.get("text"))
+                row = row["metadata"]
+            else:
+                texts.append(row.pop("text", None))
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                yield _to_columns(rows), texts, len(rows)
+                rows, texts = [], []
+    if rows:
+        yield _to_columns(rows), texts, len(rows)
+
+def iter_parquet_chunks(path: str, *, chunk_rows: int) -> Iterator[Tuple[Columns, Optional[Sequence[Any]], int]]:
+    """Same as iter_jsonl_chunks for a Parquet file whose columns are metadata fields (plus optional `text`)."""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("pyarrow is required to read Parquet; install it or convert to JSONL") from e
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        cols: Dict[str, Any] = {}
+        for name, arr in zip(batch.schema.names, batch.columns):
+            values = arr.to_numpy(zero_copy_only=False)
+            if values.dtype.kind == "O":  # nullable bools / strings, lists
+                values = _as_column(arr.to_pylist())
+            cols[name] = values
+        text = cols.pop("text", None)
+        yield cols, text, batch.num_rows
+
+def iter_chunks(path: str, *, chunk_rows: int = 200_000) -> Iterator[Tuple[Columns, Optional[Sequence[Any]], int]]:
+    reader = iter_parquet_chunks if path.endswith(".parquet") else iter_jsonl_chunks
+    return reader(path, chunk_rows=chunk_rows)
+
+
+# ------------------------------ Simulation -----------------------------
+
+class Simulation:
+    """
+    Accumulates per-setting tier counts and refund amounts over chunks.
+    Blocks and missing evidence do not depend on thresholds, so they are
+    evaluated once per chunk; only the tiering runs per setting.
+    """
+
+    def __init__(self, settings: Iterable[Thresholds], *, pack: Optional[PolicyPack] = None):
+        self.settings = list(settings)
+        self.pack = pack or get_policy_pack()
+        self.rows = 0
+        self._tiers = np.zeros((len(self.settings), len(TIERS)), dtype=np.int64)
+        self._cents = np.zeros((len(self.settings), len(TIERS)), dtype=np.int64)
+        self._reasons: Dict[str, int] = {}
+        self._missing: Dict[str, int] = {}
+
+    def add(self, columns: Columns, n: int, text: Optional[Sequence[Any]] = None) -> None:
+        amount = numeric_column(columns.get("amount_cents"), 0, n)
+        cents = np.maximum(1, amount).astype(np.int64)  # plan_actions: max(1, amount_cents)
+
+        blocked, reasons = self.pack.evaluate_blocks(columns, cents, n)
+        missing = which_missing_columns(
+            required=self.pack.evaluate_evidence(columns, cents, n), columns=columns, text=text
+        )
+        any_missing = np.logical_or.reduce(list(missing.values())) if missing else np.zeros(n, dtype=bool)
+
+        billing = np.ones(n, dtype=bool) if text is None else np.fromiter(
+            (t is None or BILLING_MATCHER.search(t) for t in text), dtype=bool, count=n
+        )
+
+        for r in self.pack.block_reasons:
+            self._reasons[r] = self._reasons.get(r, 0) + int((billing & (reasons == r)).sum())
+        for k, m in missing.items():
+            self._missing[k] = self._missing.get(k, 0) + int((billing & m & ~blocked).sum())
+
+        for i, s in enumerate(self.settings):
+            tier = np.full(n, _HIGH, dtype=np.int8)
+            tier[cents <= s.medium] = _HIL
+            tier[cents <= s.low] = _AUTO
+            tier[any_missing] = _MISSING
+            tier[cents > s.cap] = _OVER_CAP
+            tier[blocked] = _BLOCKED
+            tier[~billing] = _NOT_BILLING
+            self._tiers[i] += np.bincount(tier, minlength=len(TIERS))
+            self._cents[i] += np.bincount(tier, weights=cents, minlength=len(TIERS)).astype(np.int64)
+        self.rows += n
+
+    def report(self) -> Dict[str, Any]:
+        """Per setting: ticket count and refund cents per tier (AUTO = refunded, HIL = awaiting approval)."""
+        return {
+            "tickets": self.rows,
+            "block_reasons": dict(self._reasons),
+            "missing_evidence": dict(self._missing),
+            "settings": [
+                {
+                    "thresholds": {"low": s.low, "medium": s.medium, "cap": s.cap},
+                    "tiers": {t: int(self._tiers[i, j]) for j, t in enumerate(TIERS)},
+                    "cents": {t: int(self._cents[i, j]) for j, t in enumerate(TIERS)},
+                }
+                for i, s in enumerate(self.settings)
+            ],
+        }
+
+def simulate(path: str, settings: Iterable[Thresholds], *, chunk_rows: int = 200_000,
+             pack: Optional[PolicyPack] = None) -> Dict[str, Any]:
+    sim = Simulation(settings, pack=pack)
+    for columns, text, n in iter_chunks(path, chunk_rows=chunk_rows):
+        sim.add(columns, n, text)
+    return sim.report()
+
+def format_report(report: Dict[str, Any]) -> str:
+    rows = report["tickets"] or 1
+    out = [f"{report['tickets']} tickets"]
+    blocks = ", ".join(f"{r} {c}" for r, c in report["block_reasons"].items() if c)
+    out.append(f"policy blocks: {blocks or 'none'}")
+    missing = ", ".join(f"{k} {c}" for k, c in report["missing_evidence"].items() if c)
+    out.append(f"missing evidence (unblocked): {missing or 'none'}\n")
+    out.append(f"{'setting':<34}" + "".join(f"{t:>16}" for t in TIERS) + f"{'auto $':>14}{'HIL $':>14}")
+    for s in report["settings"]:
+        th = Thresholds(**s["thresholds"])
+        cells = "".join(f"{s['tiers'][t]:>9} {s['tiers'][t] / rows:>5.1%}" for t in TIERS)
+        out.append(f"{th.label():<34}{cells}{s['cents']['AUTO'] / 100:>14,.2f}{s['cents']['HIL'] / 100:>14,.2f}")
+    return "\n".join(out)
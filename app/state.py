@@ -6,6 +6,26 @@ from pydantic import BaseModel
 from operator import add
 from datetime import datetime
 
+# ---- reducers ----
+# Set-like merges, so re-running a node (or a whole thread) doesn't pile up duplicates.
+
+def merge_unique(left: Optional[List[str]], right: Optional[List[str]]) -> List[str]:
+    """Ordered union."""
+    out = list(left or [])
+    seen = set(out)
+    for x in right or []:
+        if x not in seen:
+            seen.add(x)
+            out.append(x)
+    return out
+
+def merge_refs(left: Optional[List[Dict]], right: Optional[List[Dict]]) -> List[Dict]:
+    """Union of chunk refs by doc_id; a newer ref replaces the older one's score in place."""
+    out = {r["doc_id"]: r for r in left or []}
+    for r in right or []:
+        out[r["doc_id"]] = r
+    return list(out.values())
+
 class Ticket(BaseModel):
     id: str
     channel: Literal["email","chat","slack","form"]
@@ -47,12 +67,14 @@ class ToolResult(BaseModel):
 
 class CaseState(TypedDict):
     ticket: Ticket
-    intents: Annotated[List[str], add]
+    intents: Annotated[List[str], merge_unique]
     severity: Literal["low","normal","high"]
-    retrieved: Annotated[List[RetrievalChunk], add]
+    retrieved: Annotated[List[Dict], merge_refs]   # {"doc_id", "score"} refs; text lives in the KB
     draft: Optional[DraftReply]
     actions: Optional[ActionPlan]
     approvals: Dict[str, bool]           # {"actions": True/False}
     executed: Annotated[List[ToolResult], add]
     artifacts: Dict[str, str]
-    policy_flags: Annotated[List[str], add]
\ No newline at end of file
+    policy_flags: Annotated[List[str], merge_unique]
+    missing_requirements: List[str]     # evidence the planner still needs from the customer
+    preclassified: Optional[Dict]       # input only: {"intents", "severity"} from bulk classification
\ No newline at end of file
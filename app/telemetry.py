@@ -0,0 +1,235 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.errors import GraphInterrupt
+
+from .config import TRACE_ENABLED, TRACE_MAX_SAMPLES, TRACE_PATH
+
+# USD per 1M tokens (input, output, cached input). Cached input is what the provider
+# bills for prompt-cache hits (None = no discount); unknown models are costed at 0.
+PRICES_PER_1M: Dict[str, tuple] = {
+    "gpt-4o-mini": (0.15, 0.60, 0.075),
+    "gpt-4o": (2.50, 10.00, 1.25),
+    "gpt-4.1-mini": (0.40, 1.60, 0.10),
+    "gpt-4.1": (2.00, 8.00, 0.50),
+    "text-embedding-3-small": (0.02, 0.0, None),
+    "text-embedding-3-large": (0.13, 0.0, None),
+}
+
+def estimate_cost(model: str, tokens_in: int, tokens_out: int = 0, *, cached_in: int = 0) -> float:
+    """`tokens_in` includes the `cached_in` tokens served from the provider's prompt cache."""
+    price_in, price_out, price_cached = PRICES_PER_1M.get(model or "", (0.0, 0.0, None))
+    if price_cached is None:
+        price_cached = price_in
+    return ((tokens_in - cached_in) * price_in + cached_in * price_cached + tokens_out * price_out) / 1_000_000
+
+# Which run / node the current span belongs to (propagates into async tasks and copied contexts).
+_scope: ContextVar[Optional[Dict[str, str]]] = ContextVar("trace_scope", default=None)
+
+def _pct(sorted_ms: List[float], q: float) -> float:
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))] if sorted_ms else 0.0
+
+
+class Telemetry:
+    """
+    Collects spans (node / llm / embed / tool / cache) for every run.
+    Each span is appended to a JSONL trace (if `path`) and folded into
+    per-name latency samples and token / cost / cache-hit totals.
+    """
+
+    def __init__(self, path: str = "", *, max_samples: int = 100_000):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = defaultdict(list)
+        self._totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._file = open(path, "a", encoding="utf-8") if path else None
+        if self._file is not None:
+            atexit.register(self.close)
+
+    def record(self, kind: str, name: str, ms: float, **fields: Any) -> None:
+        scope = _scope.get() or {}
+        row = {"ts": time.time(), "kind": kind, "name": name, "ms": round(ms, 3), **scope, **fields}
+        key = f"{kind}:{name}"
+        with self._lock:
+            samples = self._samples[key]
+            if len(samples) < self.max_samples:
+                samples.append(ms)
+            totals = self._totals[key]
+            totals["count"] += 1
+            for f in ("tokens_in", "tokens_out", "cached_tokens", "cost_usd", "cache_hits", "errors"):
+                if fields.get(f):
+                    totals[f] += fields[f]
+            if self._file is not None:
+                self._file.write(json.dumps(row, default=str) + "\n")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Per span name: count, p50/p95/p99 ms and summed tokens, cost and cache hits."""
+        with self._lock:
+            snapshot = {k: (sorted(v), dict(self._totals[k])) for k, v in self._samples.items()}
+        return {key: {**totals, "p50": _pct(ms, 0.50), "p95": _pct(ms, 0.95), "p99": _pct(ms, 0.99)}
+                for key, (ms, totals) in sorted(snapshot.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None and not self._file.closed:
+                self._file.close()
+
+
+# None when tracing is off: every hook below then reduces to one global check.
+TELEMETRY: Optional[Telemetry] = Telemetry(TRACE_PATH, max_samples=TRACE_MAX_SAMPLES) if TRACE_ENABLED else None
+
+
+class _Span:
+    __slots__ = ("kind", "name", "fields", "_t0")
+
+    def __init__(self, kind: str, name: str, fields: Dict[str, Any]):
+        self.kind, self.name, self.fields = kind, name, fields
+
+    def __enter__(self) -> "_Span":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None and issubclass(exc_type, GraphInterrupt):
+            self.fields["interrupted"] = True  # HIL pause, not a failure
+        elif exc_type is not None:
+            self.fields.setdefault("error", exc_type.__name__)
+            self.fields["errors"] = 1
+        TELEMETRY.record(self.kind, self.name, (time.perf_counter() - self._t0) * 1000, **self.fields)
+
+_NO_SPAN = contextlib.nullcontext()
+
+def span(kind: str, name: str, **fields: Any):
+    """`with span("tool", "refund"): ...`; fields (tokens, cache_hits, ...) can be set on the span."""
+    if TELEMETRY is None:
+        return _NO_SPAN
+    return _Span(kind, name, fields)
+
+def count(kind: str, name: str, **fields: Any) -> None:
+    """Zero-duration event, e.g. a cache hit that skipped the real call."""
+    if TELEMETRY is not None:
+        TELEMETRY.record(kind, name, 0.0, **fields)
+
+
+# ---- graph nodes ----
+
+def traced_node(func: Callable, name: Optional[str] = None) -> Callable:
+    """Wrap a LangGraph node (sync or async) so each call records a node span. Identity when disabled."""
+    if TELEMETRY is None or func is None:
+        return func
+    name = name or func.__name__
+    takes_config = "config" in inspect.signature(func).parameters
+
+    def _enter(state: Dict[str, Any], config: Optional[Dict[str, Any]]):
+        ticket = state.get("ticket") if isinstance(state, dict) else None
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        return _scope.set({"thread_id": thread_id, "ticket_id": getattr(ticket, "id", None), "node": name})
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def awrapper(state, config=None):
+            token = _enter(state, config)
+            try:
+                with _Span("node", name, {}):
+                    return await (func(state, config) if takes_config else func(state))
+            finally:
+                _scope.reset(token)
+        del awrapper.__wrapped__  # LangGraph must see the (state, config) signature, not func's
+        return awrapper
+
+    @functools.wraps(func)
+    def wrapper(state, config=None):
+        token = _enter(state, config)
+        try:
+            with _Span("node", name, {}):
+                return func(state, config) if takes_config else func(state)
+        finally:
+            _scope.reset(token)
+    del wrapper.__wrapped__
+    return wrapper
+
+
+# ---- LLM calls ----
+
+class LLMUsageCallback(BaseCallbackHandler):
+    """Records one llm span per chat completion: latency, tokens, prompt-cache hits and cost."""
+
+    run_inline = True  # keep the caller's context (run/node scope) in async code
+
+    def __init__(self):
+        self._starts: Dict[UUID, tuple] = {}
+
+    def _start(self, run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        params = kwargs.get("invocation_params") or {}
+        self._starts[run_id] = (time.perf_counter(), params.get("model") or params.get("model_name") or "")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs: Any) -> None:
+        t0, model = self._starts.pop(run_id, (None, ""))
+        if t0 is None or TELEMETRY is None:
+            return
+        tokens_in = tokens_out = cached = 0
+        for gens in response.generations:
+            for gen in gens:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                tokens_in += usage.get("input_tokens", 0)
+                tokens_out += usage.get("output_tokens", 0)
+                cached += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        if not tokens_in and response.llm_output:
+            usage = response.llm_output.get("token_usage") or {}
+            tokens_in, tokens_out = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        TELEMETRY.record(
+            "llm", model or "chat", (time.perf_counter() - t0) * 1000,
+            tokens_in=tokens_in, tokens_out=tokens_out, cached_tokens=cached,
+            cost_usd=estimate_cost(model, tokens_in, tokens_out, cached_in=cached),
+        )
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        t0, model = self._starts.pop(run_id, (None, ""))
+        if t0 is not None and TELEMETRY is not None:
+            TELEMETRY.record("llm", model or "chat", (time.perf_counter() - t0) * 1000,
+                             error=type(error).__name__, errors=1)
+
+def llm_callbacks() -> List[BaseCallbackHandler]:
+    """Callbacks to attach to chat models ([] when tracing is off)."""
+    return [LLMUsageCallback()] if TELEMETRY is not None else []
+
+
+# ---- offline reporting ----
+
+def summarize_trace(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Same aggregation as Telemetry.summary(), from trace JSONL rows."""
+    agg = Telemetry(max_samples=10**9)
+    for row in rows:
+        fields = {k: v for k, v in row.items() if k not in {"ts", "kind", "name", "ms"}}
+        agg.record(row["kind"], row["name"], row["ms"], **fields)
+    return agg.summary()
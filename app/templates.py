@@ -0,0 +1,99 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+import re
+from typing import Dict, List, Literal, Optional, Sequence, Tuple
+
+from .config import ESCALATION_RESPONSE_DAYS, REFUND_SETTLEMENT_DAYS
+
+Disposition = Literal["APPROVED", "DENIED", "PENDING", "ESCALATED", "MISSING"]
+
+# One reply per disposition. Slots: {subject} (order reference), {amount}, {for_amount},
+# {needs} (bulleted evidence list), {settlement} (timeline sentence) and {policy}
+# (citation line), {follow_up} (escalation timeframe, if configured). Facts in the last two come from the retrieved snippets, cited by
+# their index; without a supporting snippet they are phrased without a citation.
+_TEMPLATES: Dict[str, str] = {
+    "MISSING": (
+        "Thanks for reaching out about {subject}. Before we can review your refund request{for_amount}, "
+        "we need a few more details:\n\n"
+        "{needs}\n\n"
+        "Just reply to this message with the items above and we'll pick it up right away."
+    ),
+    "APPROVED": (
+        "Good news: we've initiated a refund of {amount} for {subject}. "
+        "{settlement}"
+        "{policy}"
+    ),
+    "DENIED": (
+        "Thanks for your patience while we reviewed your request about {subject}. "
+        "Unfortunately, we're unable to process this refund{for_amount}. "
+        "If there are details you'd like us to consider, reply to this message and we'll take another look."
+        "{policy}"
+    ),
+    "ESCALATED": (
+        "Thanks for reaching out about {subject}. Your refund request{for_amount} needs a closer look "
+        "than our automated process allows, so we've passed it to our support team. "
+        "They'll follow up with you directly{follow_up}."
+        "{policy}"
+    ),
+    "PENDING": (
+        "Thanks for reaching out about {subject}. We've received your refund request{for_amount} "
+        "and it's awaiting review. We'll confirm as soon as it's approved; "
+        "there's nothing else you need to do right now."
+        "{policy}"
+    ),
+}
+
+_SIGN_OFF = "\n\nBest regards,\nSupport Team"
+
+# "3–5 business days", "3 to 5 business days", "7 business days"
+_TIMELINE = re.compile(r"\b(\d+)(?:\s*(?:[-\u2013\u2014]|to)\s*(\d+))?\s+business\s+days?\b", re.I)
+# Refund terms: an amount limit, a refund window in days, or the policy itself.
+_POLICY = re.compile(
+    r"\b(?:refund|return)\w*\b[^.]*?(?:\$\s?\d|\bwithin\s+\d+\s+(?:calendar\s+)?days\b)|\b(?:refund|return)\s+policy\b",
+    re.I,
+)
+
+def _find(pattern: "re.Pattern[str]", snippets: Sequence[str]) -> Tuple[Optional[int], Optional["re.Match[str]"]]:
+    """1-based index and match of the first snippet matching `pattern`."""
+    for i, text in enumerate(snippets, start=1):
+        m = pattern.search(text or "")
+        if m:
+            return i, m
+    return None, None
+
+def _settlement(snippets: Sequence[str]) -> str:
+    i, m = _find(_TIMELINE, snippets)
+    if m is not None:
+        days = f"{m.group(1)}-{m.group(2)}" if m.group(2) else m.group(1)
+        return f"Refunds usually appear on your statement within {days} business days, depending on your bank [{i}]."
+    if REFUND_SETTLEMENT_DAYS:
+        return f"Refunds usually appear on your statement within {REFUND_SETTLEMENT_DAYS} business days, depending on your bank."
+    return "Refunds usually take a few business days to appear on your statement, depending on your bank."
+
+def _policy_line(snippets: Sequence[str]) -> str:
+    i, _ = _find(_POLICY, snippets)
+    return f"\n\nYou can find the details in our refund policy [{i}]." if i is not None else ""
+
+def render_reply(
+    disposition: Disposition,
+    *,
+    amount: str = "",
+    order_id: str = "",
+    needs: Sequence[str] = (),
+    snippets: Sequence[str] = (),
+) -> str:
+    """
+    Fill the disposition's template. `amount` is preformatted (e.g. "$12.00") or
+    empty; `snippets` are the cited texts in citation order ([1] is the first).
+    """
+    lines: List[str] = [f"- {x}" for x in needs]
+    body = _TEMPLATES[disposition].format(
+        subject=f"order {order_id}" if order_id else "your order",
+        amount=amount or "the requested amount",
+        for_amount=f" for {amount}" if amount else "",
+        needs="\n".join(lines),
+        settlement=_settlement(snippets) if disposition == "APPROVED" else "",
+        policy=_policy_line(snippets),
+        follow_up=f", typically within {ESCALATION_RESPONSE_DAYS} business days" if ESCALATION_RESPONSE_DAYS else "",
+    )
+    return body + _SIGN_OFF
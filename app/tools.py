@@ -4,6 +4,13 @@ from typing import Optional
 from pydantic import BaseModel, Field
 from .config import SUPPORT_ESCALATION_EMAIL
 
+class ToolRejected(Exception):
+    """
+    Raised by a tool when the call was refused before any side effect (bad
+    input, a provider validation error). Any other exception leaves the call
+    in doubt: it may have taken effect.
+    """
+
 class RefundArgs(BaseModel):
     customer_id: str = Field(..., description="Customer identifier")
     order_id: str = Field(..., description="Order ID to refund against")
@@ -16,10 +23,13 @@ class NotifyArgs(BaseModel):
     subject: str
     message: str
 
-def refund_tool(args: RefundArgs) -> dict:
+# Tools receive the call's idempotency key; a real provider call sends it along
+# (e.g. as the Idempotency-Key header) so a retried request is not applied twice.
+
+def refund_tool(args: RefundArgs, *, idempotency_key: str) -> dict:
     return {"refund_id": "rf_123", "currency": "USD", "amount": args.amount}
 
-def notify_tool(args: NotifyArgs) -> dict:
+def notify_tool(args: NotifyArgs, *, idempotency_key: str) -> dict:
     if args.channel != "email":
         # mock non-email channels if you add them later
         return {"queued": True, "channel": args.channel}
@@ -0,0 +1,377 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""
+Offline micro-benchmarks. No network or API keys needed.
+
+    python bench.py bm25 --sizes 1000,10000,100000
+    python bench.py state --k 8 --chunk-chars 800 --reruns 3
+    python bench.py trace traces.jsonl        # percentiles from a TRACE_PATH file
+    python bench.py keywords --chars 20000 --keywords 10,100,1000
+    python bench.py policy --rows 1000000      # policy pack: per-ticket loop vs vectorized batch
+    python bench.py pipeline --tickets 2000 --llm-latency-ms 300 --embed-latency-ms 50
+"""
+
+import argparse
+import itertools
+import os
+import random
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from langchain_core.documents import Document
+
+
+def _percentiles(samples_s: List[float]) -> Dict[str, float]:
+    ms = sorted(x * 1000 for x in samples_s)
+    pick = lambda q: ms[min(len(ms) - 1, int(q * len(ms)))]
+    return {"p50": statistics.median(ms), "p95": pick(0.95), "p99": pick(0.99)}
+
+def _timed(fn: Callable[[], object]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+# -------------------------------- bm25 ---------------------------------
+
+def _synthetic_corpus(n: int, *, vocab: int, words: int, seed: int) -> List[str]:
+    # Zipf-ish term distribution, like real KB text: a few very common words, a long tail.
+    rng = random.Random(seed)
+    terms = [f"term{i}" for i in range(vocab)]
+    cum = list(itertools.accumulate(1.0 / (i + 1) for i in range(vocab)))
+    return [" ".join(rng.choices(terms, cum_weights=cum, k=words)) for _ in range(n)]
+
+def bench_bm25(args: argparse.Namespace) -> None:
+    from langchain_community.retrievers import BM25Retriever
+    from app.bm25 import NativeBM25Retriever
+
+    rng = random.Random(args.seed)
+    for n in [int(x) for x in args.sizes.split(",")]:
+        texts = _synthetic_corpus(n, vocab=args.vocab, words=args.words, seed=args.seed)
+        docs = [Document(page_content=t, metadata={"doc_id": f"d{i}"}) for i, t in enumerate(texts)]
+        ids = [f"d{i}" for i in range(n)]
+        queries = [" ".join(rng.sample(texts[rng.randrange(n)].split(), 4)) for _ in range(args.queries)]
+
+        engines = {
+            "langchain": lambda: BM25Retriever.from_documents(docs, k=args.k),
+            "native": lambda: NativeBM25Retriever.from_documents(docs, ids, k=args.k),
+        }
+        print(f"\n== {n} chunks, {args.queries} queries, k={args.k} ==")
+        for name, build in engines.items():
+            t0 = time.perf_counter()
+            retriever = build()
+            build_s = time.perf_counter() - t0
+            lat = [_timed(lambda q=q: retriever.invoke(q)) for q in queries]
+            p = _percentiles(lat)
+            print(f"{name:>10}: build {build_s:7.2f}s   query p50 {p['p50']:8.2f}ms  p95 {p['p95']:8.2f}ms  "
+                  f"p99 {p['p99']:8.2f}ms   {len(queries) / sum(lat):9.1f} q/s")
+
+
+# -------------------------------- state --------------------------------
+
+def bench_state(args: argparse.Namespace) -> None:
+    from datetime import datetime, timezone
+    from operator import add
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from app.state import Ticket, merge_refs, merge_unique
+
+    serde = JsonPlusSerializer()
+    size = lambda v: len(serde.dumps_typed(v)[1])
+    rng = random.Random(args.seed)
+    texts = _synthetic_corpus(args.k, vocab=2000, words=max(1, args.chunk_chars // 6), seed=args.seed)
+    full = [{"doc_id": f"kb{i}", "source": f"kb://doc/{i}", "text": t, "score": rng.random()} for i, t in enumerate(texts)]
+    refs = [{"doc_id": c["doc_id"], "score": c["score"]} for c in full]
+    ticket = Ticket(id="t1", channel="email", created_at=datetime.now(timezone.utc), customer_id="c1",
+                    text="I was double charged for order A100, please refund the extra amount.",
+                    metadata={"amount_cents": 2500, "order_id": "A100"})
+
+    def state(retrieved, intents, flags):
+        return {"ticket": ticket, "intents": intents, "severity": "normal", "retrieved": retrieved,
+                "approvals": {}, "policy_flags": flags, "missing_requirements": []}
+
+    # The same thread run `reruns` times: the old `add` reducers append every time.
+    old_retrieved, new_retrieved, old_intents, new_intents, old_flags, new_flags = [], [], [], [], [], []
+    for _ in range(args.reruns):
+        old_retrieved, new_retrieved = add(old_retrieved, full), merge_refs(new_retrieved, refs)
+        old_intents, new_intents = add(old_intents, ["billing"]), merge_unique(new_intents, ["billing"])
+        old_flags, new_flags = add(old_flags, ["UNGROUNDED_CLAIM"]), merge_unique(new_flags, ["UNGROUNDED_CLAIM"])
+    before = state(old_retrieved, old_intents, old_flags)
+    after = state(new_retrieved, new_intents, new_flags)
+
+    print(f"k={args.k} chunks of ~{args.chunk_chars} chars, thread run {args.reruns}x")
+    print(f"{'':>10}  {'retrieved':>10}  {'state':>10}  {'x' + str(args.checkpoints) + ' ckpts':>12}")
+    for name, st in (("before", before), ("after", after)):
+        total = sum(size(v) for v in st.values())
+        print(f"{name:>10}  {size(st['retrieved']):>9}B  {total:>9}B  {total * args.checkpoints:>11}B")
+
+
+# ------------------------------- keywords ------------------------------
+
+def bench_keywords(args: argparse.Namespace) -> None:
+    from app.keywords import KeywordMatcher
+    from app.plan import REFUND_KEYWORDS
+
+    rng = random.Random(args.seed)
+    words = _synthetic_corpus(1, vocab=5000, words=args.chars // 6, seed=args.seed)[0].split()
+    filler = " ".join(w.capitalize() if rng.random() < 0.1 else w for w in words)[: args.chars]
+    bodies = {"no hit": filler, "hit at end": filler + " I was double-charged."}
+
+    def substring_scan(keywords):  # the previous _looks_like_billing
+        def f(text):
+            t = (text or "").lower()
+            return any(kw in t for kw in keywords)
+        return f
+
+    print(f"email body ~{args.chars} chars; {args.repeat} runs each, best per-call time")
+    print(f"{'keywords':>8}  {'body':>10}  {'substring':>11}  {'matcher':>11}  {'matches()':>11}")
+    for n in [int(x) for x in args.keywords.split(",")]:
+        # Real keywords first, then synthetic two-word phrases.
+        extra = [f"{rng.choice(words)}x {rng.choice(words)}" for _ in range(max(0, n - len(REFUND_KEYWORDS)))]
+        keywords = (list(REFUND_KEYWORDS) + extra)[:n]
+        old, matcher = substring_scan(keywords), KeywordMatcher(keywords, suffixes=("s", "es", "d", "ed", "ing"))
+        for label, body in bodies.items():
+            t_old = min(_timed(lambda: old(body)) for _ in range(args.repeat))
+            t_new = min(_timed(lambda: matcher.search(body)) for _ in range(args.repeat))
+            t_all = min(_timed(lambda: matcher.matches(body)) for _ in range(args.repeat))
+            print(f"{n:>8}  {label:>10}  {t_old * 1e6:>9.1f}us  {t_new * 1e6:>9.1f}us  {t_all * 1e6:>9.1f}us")
+
+
+# -------------------------------- policy -------------------------------
+
+def _synthetic_metadata_columns(n: int, *, seed: int) -> Dict[str, Any]:
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    return {
+        "amount_cents": rng.integers(100, 8000, n),
+        "outside_window": rng.random(n) < 0.03,
+        "gift_card": rng.random(n) < 0.02,
+        "chargeback_open": rng.random(n) < 0.02,
+        "fraud_score": rng.integers(0, 100, n).astype(float),
+        "payment_method": rng.choice(np.array(["card", "paypal", "wire", "crypto"]), n, p=[0.8, 0.17, 0.02, 0.01]),
+        "recent_refund_count": rng.integers(0, 4, n),
+        "physical_item": rng.random(n) < 0.3,
+        "return_status": rng.choice(np.array(["", "initiated", "received"]), n),
+        "evidence_required": rng.random(n) < 0.2,
+    }
+
+def bench_policy(args: argparse.Namespace) -> None:
+    from app.policy import get_policy_pack, policy_blocks_auto, required_evidence_for
+
+    pack = get_policy_pack()
+    cols = _synthetic_metadata_columns(args.rows, seed=args.seed)
+    cents = cols["amount_cents"]
+    rows = [{k: v[i].item() for k, v in cols.items()} for i in range(min(args.rows, args.loop_rows))]
+
+    def per_ticket():
+        for m in rows:
+            policy_blocks_auto(m, cents=m["amount_cents"])
+            required_evidence_for(cents=m["amount_cents"], metadata=m, text="")
+
+    blocked, reasons = pack.evaluate_blocks(cols, cents)
+    evidence = pack.evaluate_evidence(cols, cents)
+    for i, m in enumerate(rows):  # the two paths must agree
+        assert policy_blocks_auto(m, cents=m["amount_cents"]) == (bool(blocked[i]), reasons[i])
+        assert required_evidence_for(cents=m["amount_cents"], metadata=m, text="") == \
+            [k for k in pack.evidence_items if evidence[k][i]]
+
+    loop_s = min(_timed(per_ticket) for _ in range(args.repeat))
+    vec_s = min(_timed(lambda: (pack.evaluate_blocks(cols, cents), pack.evaluate_evidence(cols, cents))) for _ in range(args.repeat))
+    print(f"pack {pack.name!r}: {len(pack.block_reasons)} block rules, {len(pack.evidence_items)} evidence items")
+    print(f"per-ticket   {len(rows) / loop_s:>12,.0f} tickets/s   ({len(rows)} rows)")
+    print(f"vectorized   {args.rows / vec_s:>12,.0f} tickets/s   ({args.rows} rows)")
+    print(f"blocked {blocked.mean():.1%}; " + ", ".join(f"{r} {int((reasons == r).sum())}" for r in pack.block_reasons))
+
+
+# -------------------------------- trace --------------------------------
+
+def _print_summary(summary: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'span':<34}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'tok in':>10}{'tok out':>9}"
+          f"{'cost $':>10}{'cache':>7}{'err':>5}")
+    for name, s in summary.items():
+        print(f"{name:<34}{int(s['count']):>8}{s['p50']:>10.2f}{s['p95']:>10.2f}{s['p99']:>10.2f}"
+              f"{int(s.get('tokens_in', 0)):>10}{int(s.get('tokens_out', 0)):>9}{s.get('cost_usd', 0.0):>10.4f}"
+              f"{int(s.get('cache_hits', 0)):>7}{int(s.get('errors', 0)):>5}")
+
+def bench_trace(args: argparse.Namespace) -> None:
+    import json
+    from app.telemetry import summarize_trace
+
+    with open(args.path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    _print_summary(summarize_trace(rows))
+
+
+# ------------------------------- pipeline ------------------------------
+
+CATEGORIES = ("LOW", "MEDIUM", "HIGH", "MISSING", "POLICY_BLOCK")
+
+_OPENERS = ["Hi,", "Hello team,", "Hey support,", "Good morning,", ""]
+_ISSUES = ["I was double charged", "I was charged twice", "there is an overcharge on my card",
+           "my subscription was billed two times", "I got charged for an order I cancelled"]
+_ASKS = ["please refund the extra amount.", "can I get a refund?", "I'd like my money back.",
+         "please issue a refund."]
+
+def synthetic_tickets(n: int, *, seed: int) -> List[Any]:
+    """Tickets cycling through the test_harness categories, with varied wording and amounts."""
+    from datetime import datetime, timezone
+    from app.config import LOW_THRESHOLD_CENTS, MEDIUM_THRESHOLD_CENTS
+    from app.state import Ticket
+
+    rng = random.Random(seed)
+    tickets = []
+    for i in range(n):
+        cat = CATEGORIES[i % len(CATEGORIES)]
+        amount = {
+            "LOW": rng.randint(100, LOW_THRESHOLD_CENTS),
+            "MEDIUM": rng.randint(LOW_THRESHOLD_CENTS + 1, MEDIUM_THRESHOLD_CENTS),
+            "HIGH": rng.randint(MEDIUM_THRESHOLD_CENTS + 1, MEDIUM_THRESHOLD_CENTS * 4),
+            "MISSING": rng.randint(100, MEDIUM_THRESHOLD_CENTS),
+            "POLICY_BLOCK": rng.randint(100, LOW_THRESHOLD_CENTS),
+        }[cat]
+        meta: Dict[str, Any] = {"amount_cents": amount, "order_id": None if cat == "MISSING" else f"A{i}",
+                                "explanation": "charged twice"}
+        if cat == "MEDIUM":
+            meta["images"] = ["proof.png"]
+        if cat == "MISSING":
+            meta.pop("explanation")
+        if cat == "POLICY_BLOCK":
+            meta["chargeback_open"] = True
+        text = " ".join(x for x in (rng.choice(_OPENERS), rng.choice(_ISSUES), f"(${amount / 100:.2f}),",
+                                    rng.choice(_ASKS), f"Ref #{rng.randrange(10**6)}") if x)
+        tickets.append(Ticket(id=f"{cat.lower()}-{i}", channel="email", created_at=datetime.now(timezone.utc),
+                              customer_id=f"cus_{i}", text=text, metadata=meta))
+    return tickets
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource, sys
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+    except ImportError:  # Windows
+        return float("nan")
+
+def bench_pipeline(args: argparse.Namespace) -> None:
+    # Must be set before app.config is imported.
+    os.environ["TRACE_ENABLED"] = "1"
+    os.environ.setdefault("TRACE_PATH", "")
+    os.environ["KB_INDEX_DIR"] = ""          # never mix fake vectors into the on-disk index
+    os.environ["DRAFT_MODE"] = args.draft_mode
+    os.environ["CHECKPOINT_BACKEND"] = args.checkpointer
+    os.environ.setdefault("CHECKPOINT_DB_PATH", ".bench_checkpoints.sqlite")
+    os.environ.setdefault("IDEMPOTENCY_DB_PATH", ":memory:")  # repeated runs reuse ticket ids
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from langgraph.types import Command
+    from app import fakes
+    fakes.install(llm_latency_ms=args.llm_latency_ms, embed_latency_ms=args.embed_latency_ms)
+    from app.graph import graph, warmup
+    from app.llm import aclose_models
+    from app.telemetry import TELEMETRY
+
+    tickets = synthetic_tickets(args.tickets, seed=args.seed)
+    warmup()
+    TELEMETRY.reset()
+    run_id = f"bench-{int(time.time())}"
+
+    def one(ticket) -> float:
+        cfg = {"configurable": {"thread_id": f"{run_id}-{ticket.id}"}}
+        t0 = time.perf_counter()
+        state = graph.invoke({"ticket": ticket}, cfg)
+        if state.get("__interrupt__"):
+            graph.invoke(Command(resume="approve"), cfg)
+        return time.perf_counter() - t0
+
+    async def aone(ticket, sem) -> float:
+        async with sem:
+            cfg = {"configurable": {"thread_id": f"{run_id}-{ticket.id}"}}
+            t0 = time.perf_counter()
+            state = await graph.ainvoke({"ticket": ticket}, cfg)
+            if state.get("__interrupt__"):
+                await graph.ainvoke(Command(resume="approve"), cfg)
+            return time.perf_counter() - t0
+
+    async def arun() -> List[float]:
+        sem = asyncio.Semaphore(args.concurrency)
+        try:
+            return await asyncio.gather(*(aone(t, sem) for t in tickets))
+        finally:
+            await aclose_models()
+
+    t0 = time.perf_counter()
+    if args.mode == "async":
+        lat = asyncio.run(arun())
+    else:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            lat = list(pool.map(one, tickets))
+    wall = time.perf_counter() - t0
+
+    p = _percentiles(lat)
+    print(f"{len(tickets)} tickets  mode={args.mode}  concurrency={args.concurrency}  draft={args.draft_mode}  "
+          f"llm={args.llm_latency_ms}ms  embed={args.embed_latency_ms}ms  checkpointer={args.checkpointer}")
+    print(f"throughput {len(tickets) / wall:9.1f} tickets/s   wall {wall:7.2f}s   peak RSS {_peak_rss_mb():7.1f} MB")
+    print(f"per ticket p50 {p['p50']:8.2f}ms  p95 {p['p95']:8.2f}ms  p99 {p['p99']:8.2f}ms\n")
+    _print_summary(TELEMETRY.summary())
+
+
+# -------------------------------- main ---------------------------------
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="Support Copilot offline benchmarks")
+    sub = p.add_subparsers(dest="cmd", required=True)
+
+    b = sub.add_parser("bm25", help="native BM25 engine vs langchain BM25Retriever")
+    b.add_argument("--sizes", default="1000,10000,100000", help="comma-separated chunk counts")
+    b.add_argument("--queries", type=int, default=50)
+    b.add_argument("--k", type=int, default=8)
+    b.add_argument("--vocab", type=int, default=20000)
+    b.add_argument("--words", type=int, default=60, help="words per chunk")
+    b.add_argument("--seed", type=int, default=7)
+    b.set_defaults(fn=bench_bm25)
+
+    s = sub.add_parser("state", help="serialized CaseState size: full retrieved chunks vs doc_id refs")
+    s.add_argument("--k", type=int, default=8, help="retrieved chunks per ticket")
+    s.add_argument("--chunk-chars", type=int, default=800)
+    s.add_argument("--reruns", type=int, default=1, help="times the same thread is run")
+    s.add_argument("--checkpoints", type=int, default=11, help="checkpoints written per ticket run")
+    s.add_argument("--seed", type=int, default=7)
+    s.set_defaults(fn=bench_state)
+
+    t = sub.add_parser("trace", help="per-span latency percentiles, tokens and cost from a trace JSONL")
+    t.add_argument("path")
+    t.set_defaults(fn=bench_trace)
+
+    w = sub.add_parser("keywords", help="billing keyword matcher vs per-keyword substring scan on long emails")
+    w.add_argument("--chars", type=int, default=20000, help="email body length")
+    w.add_argument("--keywords", default="10,100,1000", help="comma-separated keyword counts")
+    w.add_argument("--repeat", type=int, default=20)
+    w.add_argument("--seed", type=int, default=7)
+    w.set_defaults(fn=bench_keywords)
+
+    q = sub.add_parser("policy", help="policy pack: per-ticket evaluation vs vectorized column batch")
+    q.add_argument("--rows", type=int, default=1_000_000)
+    q.add_argument("--loop-rows", type=int, default=100_000, help="rows for the per-ticket loop")
+    q.add_argument("--repeat", type=int, default=3)
+    q.add_argument("--seed", type=int, default=7)
+    q.set_defaults(fn=bench_policy)
+
+    g = sub.add_parser("pipeline", help="whole graph on synthetic tickets with fake LLM/embeddings")
+    g.add_argument("--tickets", type=int, default=2000)
+    g.add_argument("--concurrency", type=int, default=32)
+    g.add_argument("--mode", choices=["async", "thread"], default="async")
+    g.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated latency per LLM call")
+    g.add_argument("--embed-latency-ms", type=float, default=0.0, help="simulated latency per embedding call")
+    g.add_argument("--draft-mode", choices=["template", "polish", "llm"], default="template")
+    g.add_argument("--checkpointer", choices=["memory", "sqlite"], default="memory")
+    g.add_argument("--seed", type=int, default=7)
+    g.set_defaults(fn=bench_pipeline)
+
+    args = p.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    main()
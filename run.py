@@ -2,11 +2,17 @@
 
 from datetime import datetime
 import argparse
-from typing import Any, Dict, Optional
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
 from langgraph.types import Command
 
 from app.graph import graph
 from app.state import Ticket
+from app.batch import BatchRunner
+from app.config import LOW_THRESHOLD_CENTS, MEDIUM_THRESHOLD_CENTS, REFUND_CAP_CENTS
 
 def _print_outputs(state: Dict[str, Any]):
     draft = state.get("draft")
@@ -48,8 +54,93 @@ def parse_args():
     p.add_argument("--meta", default=None, help='JSON blob to merge into metadata, e.g. {"gift_card": true}')
     return p.parse_args()
 
+def batch_main(argv: List[str]) -> int:
+    p = argparse.ArgumentParser(prog="run.py batch", description="Run a JSONL file of tickets through the graph")
+    p.add_argument("input", help="JSONL of Ticket dicts (id, text, metadata, ...)")
+    p.add_argument("--output", default="results.jsonl", help="Results JSONL; appended to, and used to resume")
+    p.add_argument("--pending", default="pending_approvals.jsonl", help="Queue file for tickets awaiting HIL approval")
+    p.add_argument("--concurrency", type=int, default=8, help="Tickets in flight at once")
+    p.add_argument("--mode", choices=["thread", "async"], default="thread", help="Thread pool or asyncio (graph.ainvoke)")
+    p.add_argument("--thread-prefix", default="batch", help="Checkpointer thread ids are <prefix>-<ticket id>")
+    p.add_argument("--preclassify", action="store_true", help="Label tickets with bulk classification requests before the graph runs")
+    args = p.parse_args(argv)
+
+    runner = BatchRunner(
+        graph,
+        output_path=args.output,
+        pending_path=args.pending,
+        concurrency=args.concurrency,
+        thread_prefix=args.thread_prefix,
+        preclassify=args.preclassify,
+    )
+    counts = asyncio.run(runner.arun(args.input)) if args.mode == "async" else runner.run(args.input)
+    print(json.dumps(counts))
+    return 1 if counts["error"] else 0
+
+
+def simulate_main(argv: List[str]) -> int:
+    from app.simulate import Thresholds, format_report, simulate
+
+    ints = lambda s: [int(x) for x in s.split(",") if x.strip()]
+    p = argparse.ArgumentParser(prog="run.py simulate", description="What-if policy simulation over historical tickets (no LLM)")
+    p.add_argument("input", help="JSONL (Ticket dicts or flat metadata) or .parquet of ticket metadata")
+    p.add_argument("--low", type=ints, default=[LOW_THRESHOLD_CENTS], help="Comma-separated LOW_THRESHOLD_CENTS values")
+    p.add_argument("--medium", type=ints, default=[MEDIUM_THRESHOLD_CENTS], help="Comma-separated MEDIUM_THRESHOLD_CENTS values")
+    p.add_argument("--cap", type=ints, default=[REFUND_CAP_CENTS], help="Comma-separated REFUND_CAP_CENTS values")
+    p.add_argument("--chunk-rows", type=int, default=200_000, help="Rows evaluated per columnar chunk")
+    p.add_argument("--json", action="store_true", help="Print the raw report as JSON")
+    args = p.parse_args(argv)
+
+    settings = [Thresholds(low, medium, cap) for low in args.low for medium in args.medium for cap in args.cap]
+    t0 = time.perf_counter()
+    report = simulate(args.input, settings, chunk_rows=args.chunk_rows)
+    elapsed = time.perf_counter() - t0
+    print(json.dumps(report) if args.json else format_report(report))
+    if not args.json:
+        print(f"\n{report['tickets'] / max(elapsed, 1e-9) * 60:,.0f} tickets/min ({elapsed:.2f}s)")
+    return 0
+
+
+def idempotency_main(argv: List[str]) -> int:
+    from app.idempotency import get_store
+
+    p = argparse.ArgumentParser(prog="run.py idempotency", description="Reconcile tool calls left without a recorded outcome")
+    sub = p.add_subparsers(dest="action", required=True)
+    ls = sub.add_parser("list", help="Pending (in-doubt) tool calls, oldest first")
+    ls.add_argument("--older-than", type=float, default=0.0, help="Only calls pending for at least this many seconds")
+    rs = sub.add_parser("resolve", help="Record the real outcome of an in-doubt call; later attempts replay it")
+    rs.add_argument("key")
+    rs.add_argument("--failed", action="store_true", help="The call did not take effect (it may then be retried)")
+    rs.add_argument("--result", default="{}", help="JSON result to record, e.g. the provider's refund id")
+    rl = sub.add_parser("release", help="Forget a key so the call runs again on the next attempt")
+    rl.add_argument("key")
+    args = p.parse_args(argv)
+
+    store = get_store()
+    if store is None:
+        print("Idempotency store is disabled (IDEMPOTENCY_DB_PATH is empty).")
+        return 1
+    if args.action == "list":
+        for row in store.in_doubt(older_than=args.older_than):
+            print(json.dumps(row))
+        return 0
+    if args.action == "resolve":
+        if not store.resolve(args.key, ok=not args.failed, result=json.loads(args.result)):
+            print(f"{args.key} is not pending")
+            return 1
+        return 0
+    store.release(args.key)
+    return 0
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "simulate":
+        sys.exit(simulate_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "idempotency":
+        sys.exit(idempotency_main(sys.argv[2:]))
+
     args = parse_args()
 
     # Build metadata
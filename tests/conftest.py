@@ -0,0 +1,38 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""
+Offline test setup: config is read at import, so the environment is fixed
+here before any app module loads, and app.fakes replaces OpenAI.
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+os.environ["OPENAI_API_KEY"] = "offline"
+os.environ["KB_INDEX_DIR"] = ""
+os.environ["CHECKPOINT_BACKEND"] = "memory"
+os.environ["IDEMPOTENCY_DB_PATH"] = ":memory:"
+os.environ["DRAFT_MODE"] = "template"
+os.environ["RETRIEVER_WARMUP"] = "lazy"
+
+import pytest
+
+from app import fakes
+
+fakes.install()
+
+
+def make_ticket(tid: str = "t1", text: str = "I was double charged, please refund.", **metadata):
+    from app.state import Ticket
+
+    return Ticket(id=tid, channel="email", created_at=datetime.now(timezone.utc),
+                  customer_id="cus_1", text=text, metadata=metadata)
+
+
+@pytest.fixture
+def ticket():
+    return make_ticket
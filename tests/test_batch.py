@@ -0,0 +1,86 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""BatchRunner: every ticket gets a row, HIL tickets are queued, and a re-run resumes."""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+from langgraph.types import Command
+
+from app.batch import BatchRunner, completed_ids
+from app.graph import graph
+
+
+def _rows(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def _write_tickets(path, n):
+    rows = []
+    for i in range(n):
+        meta = {"amount_cents": 1200, "order_id": f"A{i}", "explanation": "dup"}
+        if i % 3 == 0:
+            meta.update(amount_cents=3500, images=["p.png"])  # medium tier: parks for approval
+        rows.append({"id": f"t{i}", "customer_id": "cus_1", "text": "I was double charged, please refund.",
+                     "metadata": meta})
+    path.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+
+
+def _runner(tmp_path, **kwargs):
+    return BatchRunner(graph, output_path=str(tmp_path / "out.jsonl"), pending_path=str(tmp_path / "pending.jsonl"),
+                       thread_prefix=f"test-{uuid.uuid4().hex}", **kwargs)
+
+
+@pytest.mark.parametrize("mode", ["thread", "async"])
+@pytest.mark.parametrize("preclassify", [False, True])
+def test_every_ticket_recorded_and_hil_queued(tmp_path, mode, preclassify):
+    src = tmp_path / "in.jsonl"
+    _write_tickets(src, 9)
+    runner = _runner(tmp_path, concurrency=4, preclassify=preclassify, classify_window=4)
+    counts = runner.run(str(src)) if mode == "thread" else asyncio.run(runner.arun(str(src)))
+    assert counts == {"done": 6, "pending_approval": 3, "error": 0, "skipped": 0}
+
+    rows = {r["ticket_id"]: r for r in _rows(tmp_path / "out.jsonl")}
+    assert sorted(rows) == sorted(f"t{i}" for i in range(9))
+    assert rows["t1"]["executed"][0]["tool"] == "refund"
+    assert [p["ticket_id"] for p in sorted(_rows(tmp_path / "pending.jsonl"), key=lambda p: p["ticket_id"])] \
+        == ["t0", "t3", "t6"]
+
+
+def test_rerun_skips_finished_and_retries_errors(tmp_path):
+    src = tmp_path / "in.jsonl"
+    _write_tickets(src, 5)
+    out = tmp_path / "out.jsonl"
+    out.write_text(json.dumps({"ticket_id": "t1", "status": "done"}) + "\n"
+                   + json.dumps({"ticket_id": "t2", "status": "error"}) + "\n"
+                   + '{"ticket_id": "t4", "sta', encoding="utf-8")  # torn line from a crash
+    assert completed_ids(str(out)) == {"t1"}
+
+    counts = _runner(tmp_path).run(str(src))
+    assert counts["skipped"] == 1
+    assert counts["done"] + counts["pending_approval"] == 4
+    assert completed_ids(str(out)) == {"t0", "t1", "t2", "t3", "t4"}  # the torn line did not eat a new row
+
+
+def test_parked_ticket_resumes_on_its_thread(tmp_path):
+    src = tmp_path / "in.jsonl"
+    _write_tickets(src, 1)
+    runner = _runner(tmp_path)
+    runner.run(str(src))
+    (parked,) = _rows(tmp_path / "pending.jsonl")
+    done = graph.invoke(Command(resume="approve"), {"configurable": {"thread_id": parked["thread_id"]}})
+    assert [r.tool for r in done["executed"]] == ["refund"]
+
+
+def test_graph_errors_become_error_rows(tmp_path):
+    class Broken:
+        def invoke(self, *_args, **_kwargs):
+            raise RuntimeError("boom")
+
+    src = tmp_path / "in.jsonl"
+    _write_tickets(src, 2)
+    runner = BatchRunner(Broken(), output_path=str(tmp_path / "out.jsonl"), pending_path=str(tmp_path / "p.jsonl"))
+    assert runner.run(str(src))["error"] == 2
+    assert all("boom" in r["error"] for r in _rows(tmp_path / "out.jsonl"))
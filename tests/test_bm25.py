@@ -0,0 +1,90 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Native BM25: scores match the textbook formula, and in-place edits match a rebuild."""
+
+import math
+import random
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from app.bm25 import BM25Index, NativeBM25Retriever, tokenize
+
+
+def _reference(docs, query, k1=1.5, b=0.75):
+    n = len(docs)
+    avgdl = sum(map(len, docs)) / n
+    out = []
+    for d in docs:
+        s = 0.0
+        for t in query:
+            df = sum(t in other for other in docs)
+            if not df or t not in d:
+                continue
+            tf = d.count(t)
+            idf = math.log1p((n - df + 0.5) / (df + 0.5))
+            s += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(d) / avgdl))
+        out.append(s)
+    return out
+
+
+def _corpus(n, seed=0):
+    rnd = random.Random(seed)
+    words = [f"w{i}" for i in range(40)]
+    return [[rnd.choice(words) for _ in range(rnd.randint(1, 12))] for _ in range(n)]
+
+
+def test_scores_match_reference_formula():
+    docs = _corpus(60)
+    index = BM25Index.from_tokens(docs)
+    for query in (["w1"], ["w2", "w3", "w3"], ["w5", "missing"]):
+        # A repeated query term counts once per occurrence, as in the reference.
+        assert np.allclose(index.scores(query), _reference(docs, query), rtol=1e-5)
+
+
+def test_top_k_orders_by_score_and_omits_non_matches():
+    docs = [["refund", "refund", "policy"], ["shipping"], ["refund", "shipping", "policy", "days"]]
+    index = BM25Index.from_tokens(docs)
+    hits = index.top_k(["refund"], 5)
+    assert [i for i, _ in hits] == [0, 2]
+    assert hits[0][1] > hits[1][1] > 0
+    assert index.top_k(["unknown"], 5) == []
+    assert len(index.top_k(["refund", "shipping", "policy"], 2)) == 2
+
+
+def test_updated_matches_a_fresh_build():
+    docs = _corpus(50, seed=1)
+    index = BM25Index.from_tokens(docs)
+    remove = [0, 7, 49]
+    added = _corpus(5, seed=2) + [["brandnew", "w1"]]
+    edited = index.updated(remove=remove, add_tokens=added)
+    expected_docs = [d for i, d in enumerate(docs) if i not in remove] + added
+    fresh = BM25Index.from_tokens(expected_docs)
+    for query in (["w1"], ["w9", "brandnew"], ["w30", "w31"]):
+        assert np.allclose(edited.scores(query), fresh.scores(query), rtol=1e-5)
+    assert edited.n_docs == len(expected_docs)
+
+
+def test_updated_leaves_the_original_untouched():
+    index = BM25Index.from_tokens([["a", "b"], ["b", "c"]])
+    before = index.scores(["b"]).copy()
+    index.updated(remove=[0], add_tokens=[["b"]])
+    assert np.array_equal(index.scores(["b"]), before)
+
+
+def test_retriever_returns_documents_and_edits_by_id():
+    docs = [Document(page_content=t, metadata={"doc_id": i}) for i, t in
+            (("kb1", "Refunds up to $50 within 30 days."), ("kb2", "Refunds settle within 3-5 business days."))]
+    bm25 = NativeBM25Retriever.from_documents(docs, ["kb1", "kb2"])
+    assert bm25.invoke("business days")[0].metadata["doc_id"] == "kb2"
+
+    edited = bm25.updated(remove_ids=["kb2"], add=[("kb3", Document(page_content="Gift cards are final sale."))])
+    assert edited.ids == ["kb1", "kb3"]
+    assert [d.page_content for d in edited.invoke("gift cards")] == ["Gift cards are final sale."]
+    assert bm25.ids == ["kb1", "kb2"]
+
+
+@pytest.mark.parametrize("text,tokens", [("Double-charged, AGAIN!", ["double", "charged", "again"]), ("", [])])
+def test_tokenize(text, tokens):
+    assert tokenize(text) == tokens
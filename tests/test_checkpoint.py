@@ -0,0 +1,81 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""SQLiteSaver: parked tickets survive a restart, old checkpoints are compacted, closed threads expire."""
+
+import asyncio
+
+from langgraph.types import Command
+
+from app.checkpoint import SQLiteSaver, make_checkpointer
+from app.graph import workflow
+
+
+def _saver(path, **kwargs):
+    serde = make_checkpointer("memory", "").serde  # same allow-listed serializer as production
+    return SQLiteSaver(str(path), serde=serde, **kwargs)
+
+
+def _hil_ticket(ticket):
+    return ticket("t1", amount_cents=3500, order_id="A1", explanation="dup", images=["p.png"])
+
+
+def test_parked_ticket_resumes_after_restart(tmp_path, ticket):
+    cfg = {"configurable": {"thread_id": "th-1"}}
+    saver = _saver(tmp_path / "cp.sqlite")
+    parked = workflow.compile(checkpointer=saver).invoke({"ticket": _hil_ticket(ticket)}, cfg)
+    assert parked.get("__interrupt__")
+    saver.close()
+
+    restarted = workflow.compile(checkpointer=_saver(tmp_path / "cp.sqlite"))
+    assert restarted.get_state(cfg).next == ("approval",)
+    done = restarted.invoke(Command(resume="approve"), cfg)
+    assert [r.tool for r in done["executed"]] == ["refund"]
+    assert done["ticket"].id == "t1"
+
+
+def test_async_resume_after_restart(tmp_path, ticket):
+    cfg = {"configurable": {"thread_id": "th-async"}}
+    saver = _saver(tmp_path / "cp.sqlite")
+    asyncio.run(workflow.compile(checkpointer=saver).ainvoke({"ticket": _hil_ticket(ticket)}, cfg))
+    saver.close()
+    graph = workflow.compile(checkpointer=_saver(tmp_path / "cp.sqlite"))
+    done = asyncio.run(graph.ainvoke(Command(resume="approve"), cfg))
+    assert [r.tool for r in done["executed"]] == ["refund"]
+
+
+def test_only_the_last_checkpoints_and_their_blobs_are_kept(tmp_path, ticket):
+    saver = _saver(tmp_path / "cp.sqlite", keep_last=2)
+    graph = workflow.compile(checkpointer=saver)
+    cfg = {"configurable": {"thread_id": "th-2"}}
+    for i in range(3):
+        graph.invoke({"ticket": ticket(f"t{i}", amount_cents=1200, order_id=f"A{i}", explanation="dup")}, cfg)
+
+    assert len(list(saver.list(cfg))) == 2
+    live = {(ch, str(v)) for tup in saver.list(cfg) for ch, v in tup.checkpoint["channel_versions"].items()}
+    blobs = set(saver._conn.execute("SELECT channel, version FROM blobs WHERE thread_id='th-2'"))
+    assert blobs == live
+    assert graph.get_state(cfg).values["ticket"].id == "t2"
+
+
+def test_closed_threads_expire_and_reopen_on_new_input(tmp_path, ticket):
+    saver = _saver(tmp_path / "cp.sqlite")
+    graph = workflow.compile(checkpointer=saver)
+    for tid in ("old", "reopened", "open"):
+        graph.invoke({"ticket": ticket(amount_cents=1200, order_id="A1", explanation="dup")},
+                     {"configurable": {"thread_id": tid}})
+    saver.mark_closed("old")
+    saver.mark_closed("reopened")
+    graph.invoke({"ticket": ticket("t2", amount_cents=1200, order_id="A2", explanation="dup")},
+                 {"configurable": {"thread_id": "reopened"}})
+
+    assert saver.prune_closed(ttl=0) == 1
+    assert {t.config["configurable"]["thread_id"] for t in saver.list(None)} == {"reopened", "open"}
+
+
+def test_writes_are_buffered_until_flushed(tmp_path):
+    saver = _saver(tmp_path / "cp.sqlite", write_batch=1000)
+    cfg = {"configurable": {"thread_id": "th-3", "checkpoint_ns": "", "checkpoint_id": "c1"}}
+    saver.put_writes(cfg, [("retrieved", [])], task_id="task")
+    assert saver._pending
+    saver.flush()
+    assert saver._conn.execute("SELECT COUNT(*) FROM writes").fetchone()[0] == 1
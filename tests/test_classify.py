@@ -0,0 +1,62 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Classification fast path: clear refund tickets never reach the LLM, ambiguous ones do."""
+
+import pytest
+
+from app import classify as cls
+from app.classify import IntentLabel, classify, classify_fast, classify_stats, register_local_classifier
+
+
+@pytest.mark.parametrize("text,severity", [
+    ("I was double charged, please refund.", "normal"),
+    ("Refund me or I file a chargeback.", "high"),
+    ("This is fraud, I want my money back and a refund!", "high"),
+])
+def test_clear_refund_tickets_are_labeled_locally(text, severity):
+    label = classify_fast(text)
+    assert label == IntentLabel(intents=["billing"], severity=severity)
+
+
+@pytest.mark.parametrize("text", [
+    "I was charged twice and now I can't log in.",  # billing + access
+    "Refund please, the app crashes on checkout.",  # billing + bug
+    "The dashboard is down again.",                 # no billing signal
+    "How do I export my data?",
+])
+def test_ambiguous_or_non_refund_tickets_defer_to_the_llm(text):
+    assert classify_fast(text) is None
+
+
+def test_local_model_is_consulted_after_the_keyword_rules():
+    seen = []
+
+    def local(text):
+        seen.append(text)
+        return IntentLabel(intents=["feature"], severity="low")
+
+    register_local_classifier(local)
+    try:
+        assert classify_fast("Please refund my order.").intents == ["billing"]
+        assert classify_fast("Would be nice to have dark mode.").intents == ["feature"]
+        assert seen == ["Would be nice to have dark mode."]
+    finally:
+        register_local_classifier(None)
+
+
+def test_classify_counts_local_and_llm_tiers(monkeypatch):
+    monkeypatch.setattr(cls, "CLASSIFY_FAST_PATH", True)
+    before = classify_stats()
+    assert classify("Please refund the duplicate charge.").intents == ["billing"]
+    assert "bug" in classify("The export button throws an error.").intents  # fake LLM label
+    after = classify_stats()
+    assert after["local"] - before["local"] == 1
+    assert after["llm"] - before["llm"] == 1
+    assert 0.0 < after["local_fraction"] < 1.0
+
+
+def test_fast_path_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(cls, "CLASSIFY_FAST_PATH", False)
+    before = classify_stats()["llm"]
+    classify("Please refund the duplicate charge.")
+    assert classify_stats()["llm"] == before + 1
@@ -0,0 +1,95 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Bulk classification: token-budgeted batches, one label per ticket, dropped items retried."""
+
+import asyncio
+
+import pytest
+
+from app import classify as cls
+from app.classify import BatchIntentLabels, IntentLabel, TicketIntentLabel, aclassify_batch, classify_batch
+from app.fakes import fake_label
+
+AMBIGUOUS = "The app crashes with an error when I open settings."
+
+
+class _Remote:
+    """Structured-model stand-in that records batch sizes and can drop or fail batches."""
+
+    def __init__(self, *, drop=(), fail=False):
+        self.batches, self.singles = [], []
+        self.drop, self.fail = set(drop), fail
+
+    def batcher(self, messages):
+        ids = [line.split('"ticket_id": "')[1].split('"')[0] for line in messages[-1].content.splitlines()]
+        self.batches.append(ids)
+        if self.fail:
+            raise RuntimeError("malformed JSON")
+        return BatchIntentLabels(items=[TicketIntentLabel(ticket_id=i, intents=["bug"], severity="normal")
+                                        for i in ids if i not in self.drop])
+
+    def single(self, text):
+        self.singles.append(text)
+        return fake_label(text)
+
+    def install(self, monkeypatch):
+        class _Runnable:
+            def __init__(self, fn):
+                self.invoke = fn
+
+            async def ainvoke(self, inp):
+                return self.invoke(inp)
+
+        def get_structured_model(schema, **_kwargs):
+            return _Runnable(self.batcher if schema is BatchIntentLabels else self.single)
+
+        monkeypatch.setattr(cls, "get_structured_model", get_structured_model)
+        return self
+
+
+def test_token_batches_respect_budget_and_item_cap(monkeypatch):
+    monkeypatch.setattr(cls, "CLASSIFY_BATCH_TOKEN_BUDGET", 100)
+    monkeypatch.setattr(cls, "CLASSIFY_BATCH_MAX_ITEMS", 3)
+    items = [(f"t{i}", "x" * 40) for i in range(7)]  # 34 estimated tokens each
+    batches = list(cls._token_batches(items))
+    assert [len(b) for b in batches] == [2, 2, 2, 1]
+    assert [t for b in batches for t, _ in b] == [t for t, _ in items]
+
+    monkeypatch.setattr(cls, "CLASSIFY_BATCH_TOKEN_BUDGET", 10_000)
+    assert [len(b) for b in cls._token_batches(items)] == [3, 3, 1]
+    # An oversized ticket still goes out, alone.
+    assert [len(b) for b in cls._token_batches([("big", "x" * 100_000), ("t", "x")])] == [1, 1]
+
+
+@pytest.mark.parametrize("run", [classify_batch, lambda t: asyncio.run(aclassify_batch(t))])
+def test_one_label_per_ticket_with_clear_ones_local(monkeypatch, run):
+    remote = _Remote().install(monkeypatch)
+    monkeypatch.setattr(cls, "CLASSIFY_FAST_PATH", True)
+    tickets = [("r1", "Please refund the duplicate charge."), ("a1", AMBIGUOUS), ("a2", AMBIGUOUS)]
+    labels = run(tickets)
+    assert set(labels) == {"r1", "a1", "a2"}
+    assert labels["r1"].intents == ["billing"]
+    assert remote.batches == [["a1", "a2"]]
+
+
+@pytest.mark.parametrize("run", [classify_batch, lambda t: asyncio.run(aclassify_batch(t))])
+def test_dropped_items_are_retried_one_by_one(monkeypatch, run):
+    remote = _Remote(drop={"a2"}).install(monkeypatch)
+    labels = run([("a1", AMBIGUOUS), ("a2", "I can't log in")])
+    assert labels["a1"] == IntentLabel(intents=["bug"], severity="normal")
+    assert labels["a2"].intents == ["access"]
+    assert remote.singles == ["I can't log in"]
+
+
+def test_failed_batch_falls_back_to_single_calls(monkeypatch):
+    remote = _Remote(fail=True).install(monkeypatch)
+    labels = classify_batch([("a1", AMBIGUOUS), ("a2", AMBIGUOUS)])
+    assert set(labels) == {"a1", "a2"}
+    assert len(remote.singles) == 2
+
+
+def test_no_remote_call_when_every_ticket_is_clear(monkeypatch):
+    remote = _Remote().install(monkeypatch)
+    monkeypatch.setattr(cls, "CLASSIFY_FAST_PATH", True)
+    assert classify_batch([("r1", "refund please")])["r1"].intents == ["billing"]
+    assert remote.batches == [] and remote.singles == []
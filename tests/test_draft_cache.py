@@ -0,0 +1,67 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Draft prompts: a fixed system prefix, ticket values last, and identical prompts answered from cache."""
+
+import uuid
+
+import pytest
+
+from app import draft
+from app.cache import LRUCache
+from app.draft import _build_prompt, _polish_prompt, draft_reply
+from app.fakes import FakeChatModel
+
+
+class _CountingLLM:
+    def __init__(self):
+        self.calls = 0
+        self.inner = FakeChatModel()
+
+    def invoke(self, messages):
+        self.calls += 1
+        return self.inner.invoke(messages)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    counting = _CountingLLM()
+    monkeypatch.setattr(draft, "get_llm", lambda: counting)
+    monkeypatch.setattr(draft, "_responses", LRUCache(16))
+    return counting
+
+
+def _state(ticket, text="I was double charged, please refund.", **meta):
+    meta = {"order_id": "A1", "amount_cents": 1200, **meta}
+    return {"ticket": ticket(text=text, **meta), "retrieved": [{"doc_id": "kb1", "text": "Refunds up to $50."}],
+            "approvals": {"actions": True}, "missing_requirements": []}
+
+
+def test_system_prefix_is_identical_across_tickets(ticket):
+    a, _ = _build_prompt(_state(ticket, order_id="A1"))
+    b, _ = _build_prompt(_state(ticket, text="Charged twice!", order_id="B2", amount_cents=99))
+    assert a[0].content.encode() == b[0].content.encode()
+    assert a[1].content != b[1].content
+    assert "A1" not in a[0].content and "A1" in a[1].content
+
+    p, q = _polish_prompt(_state(ticket), "x"), _polish_prompt(_state(ticket, text="other"), "y")
+    assert p[0].content == q[0].content
+
+
+@pytest.mark.parametrize("mode", ["llm", "polish"])
+def test_identical_tickets_hit_the_cache(ticket, llm, monkeypatch, mode):
+    monkeypatch.setattr(draft, "DRAFT_MODE", mode)
+    first = draft_reply(_state(ticket, text="I was double   charged,\nplease refund."))
+    again = draft_reply(_state(ticket, text="I was double charged, please refund."))  # re-wrapped copy
+    assert llm.calls == 1
+    assert again.markdown == first.markdown
+    assert draft.draft_cache_stats()["hits"] == 1
+
+    draft_reply(_state(ticket, order_id=f"A-{uuid.uuid4().hex}"))
+    assert llm.calls == 2
+
+
+def test_template_mode_never_calls_the_llm(ticket, llm, monkeypatch):
+    monkeypatch.setattr(draft, "DRAFT_MODE", "template")
+    reply = draft_reply(_state(ticket))
+    assert llm.calls == 0
+    assert "$12.00" in reply.markdown and reply.citations == ["kb1"]
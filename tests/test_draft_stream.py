@@ -0,0 +1,122 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Streamed drafts: fence stripping on the fly matches the batch strip, and tokens reach the graph stream."""
+
+import asyncio
+import random
+import uuid
+
+import pytest
+
+from app import draft
+from app.draft import FenceStripper, _strip_md_fence, draft_reply
+from app.graph import graph
+
+REPLIES = [
+    "Hello there,\n\nYour refund of $12.00 is on its way [1].",
+    "```markdown\nHello,\n\nYour refund is on its way [1].\n```",
+    "```\nNo language tag.\n```\n",
+    "  \n```md\nTrailing spaces after the fence   \n```   ",
+    "Inline `code` and a ``double`` tick, no fence.",
+    "Ends with a fence that did not open one\n```",
+    "```",
+    "",
+]
+
+
+def _stream(text, rnd):
+    stripper, out, i = FenceStripper(), [], 0
+    while i < len(text):
+        n = rnd.randint(1, 6)
+        out.append(stripper.feed(text[i:i + n]))
+        i += n
+    out.append(stripper.finish())
+    return "".join(out)
+
+
+@pytest.mark.parametrize("text", REPLIES)
+def test_any_chunking_matches_the_batch_strip(text):
+    rnd = random.Random(0)
+    for _ in range(50):
+        assert _stream(text, rnd) == _strip_md_fence(text)
+
+
+def test_closing_fence_is_never_shown_mid_stream():
+    stripper = FenceStripper()
+    shown = [stripper.feed(c) for c in ["```md\nHi", " there\n", "``", "`"]]
+    assert "`" not in "".join(shown)
+    assert stripper.finish() == ""
+
+
+@pytest.fixture
+def llm_drafts(monkeypatch):
+    monkeypatch.setattr(draft, "DRAFT_MODE", "llm")
+
+
+def test_on_token_pieces_add_up_to_the_reply(ticket, llm_drafts):
+    state = {"ticket": ticket(order_id=f"A-{uuid.uuid4().hex}", amount_cents=1200), "retrieved": [],
+             "approvals": {"actions": True}, "missing_requirements": []}
+    pieces = []
+    reply = draft_reply(state, on_token=pieces.append)
+    assert len(pieces) > 1
+    assert "".join(pieces) == reply.markdown
+
+
+def test_graph_custom_stream_carries_draft_tokens(ticket, llm_drafts):
+    t = ticket("t-stream", amount_cents=1200, order_id=f"A-{uuid.uuid4().hex}", explanation="dup")
+    cfg = {"configurable": {"thread_id": f"test-{uuid.uuid4().hex}"}}
+    events = list(graph.stream({"ticket": t}, cfg, stream_mode="custom"))
+    assert events and all(e["event"] == "draft_token" and e["ticket_id"] == "t-stream" for e in events)
+    assert "".join(e["text"] for e in events) == graph.get_state(cfg).values["draft"].markdown
+
+
+def test_async_graph_stream_carries_draft_tokens(ticket, llm_drafts):
+    t = ticket("t-astream", amount_cents=1200, order_id=f"A-{uuid.uuid4().hex}", explanation="dup")
+    cfg = {"configurable": {"thread_id": f"test-{uuid.uuid4().hex}"}}
+
+    async def collect():
+        return [e async for e in graph.astream({"ticket": t}, cfg, stream_mode="custom")]
+
+    events = asyncio.run(collect())
+    assert len(events) > 1
+    assert "".join(e["text"] for e in events) == graph.get_state(cfg).values["draft"].markdown
+
+
+class _SpyLLM:
+    """Records which chat-model entry points the draft node uses."""
+
+    def __init__(self, llm):
+        self.llm, self.calls = llm, []
+
+    def __getattr__(self, name):
+        self.calls.append(name)
+        return getattr(self.llm, name)
+
+
+@pytest.fixture
+def spy_llm(monkeypatch, llm_drafts):
+    spy = _SpyLLM(draft.get_llm())
+    monkeypatch.setattr(draft, "get_llm", lambda: spy)
+    return spy
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_plain_invoke_does_not_stream_the_draft(ticket, spy_llm, mode):
+    t = ticket(f"t-{mode}", amount_cents=1200, order_id=f"A-{uuid.uuid4().hex}", explanation="dup")
+    cfg = {"configurable": {"thread_id": f"test-{uuid.uuid4().hex}"}}
+    if mode == "sync":
+        graph.invoke({"ticket": t}, cfg)
+    else:
+        asyncio.run(graph.ainvoke({"ticket": t}, cfg))
+    assert spy_llm.calls == ["invoke" if mode == "sync" else "ainvoke"]
+
+    spy_llm.calls.clear()
+    cfg = {"configurable": {"thread_id": f"test-{uuid.uuid4().hex}"}}
+    t = ticket(f"t-{mode}", amount_cents=1200, order_id=f"A-{uuid.uuid4().hex}", explanation="dup")
+    if mode == "sync":
+        assert list(graph.stream({"ticket": t}, cfg, stream_mode="custom"))
+    else:
+        async def collect():
+            return [e async for e in graph.astream({"ticket": t}, cfg, stream_mode="custom")]
+        assert asyncio.run(collect())
+    assert spy_llm.calls == ["stream" if mode == "sync" else "astream"]
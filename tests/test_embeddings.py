@@ -0,0 +1,72 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Content-addressed embedding cache: LRU, then the persistent store, then the provider."""
+
+import asyncio
+
+from app.embeddings import CachedEmbeddings, SQLiteEmbeddingStore
+from app.fakes import FakeEmbeddings
+
+
+class _Counting(FakeEmbeddings):
+    def __init__(self):
+        super().__init__(size=8)
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts += texts
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.texts.append(text)
+        return super().embed_query(text)
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+
+def test_each_distinct_text_is_embedded_once():
+    inner = _Counting()
+    emb = CachedEmbeddings(inner, model="m", lru_size=100)
+    vecs = emb.embed_documents(["a b", "c d", "a b"])
+    assert inner.texts == ["a b", "c d"]
+    assert vecs[0] == vecs[2] == inner._vec("a b")
+
+    emb.embed_documents(["c d", "e f"])
+    assert inner.texts == ["a b", "c d", "e f"]
+    assert emb.stats() == {"hits": 1, "store_hits": 0, "misses": 3}
+
+
+def test_queries_and_documents_are_cached_separately():
+    inner = _Counting()
+    emb = CachedEmbeddings(inner, model="m", lru_size=100)
+    emb.embed_documents(["refund"])
+    emb.embed_query("refund")
+    emb.embed_query("refund")
+    assert inner.texts == ["refund", "refund"]
+
+
+def test_store_survives_a_new_process(tmp_path):
+    path = str(tmp_path / "emb.sqlite")
+    first = _Counting()
+    CachedEmbeddings(first, model="m", store=SQLiteEmbeddingStore(path)).embed_documents(["a", "b"])
+
+    second = _Counting()
+    emb = CachedEmbeddings(second, model="m", store=SQLiteEmbeddingStore(path))
+    vecs = emb.embed_documents(["a", "b", "c"])
+    assert second.texts == ["c"]
+    assert emb.stats()["store_hits"] == 2
+    assert vecs[0] == first._vec("a")  # one-word vectors are exact in float32
+
+    # A different model never reads the other model's vectors.
+    other = _Counting()
+    CachedEmbeddings(other, model="m2", store=SQLiteEmbeddingStore(path)).embed_documents(["a"])
+    assert other.texts == ["a"]
+
+
+def test_async_path_shares_the_cache():
+    inner = _Counting()
+    emb = CachedEmbeddings(inner, model="m")
+    asyncio.run(emb.aembed_documents(["x", "y"]))
+    emb.embed_documents(["x", "y"])
+    assert inner.texts == ["x", "y"]
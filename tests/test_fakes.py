@@ -0,0 +1,54 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Offline fakes are deterministic, and the pipeline benchmark runs end to end on them."""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.fakes import FakeChatModel, FakeEmbeddings, fake_label
+from bench import synthetic_tickets
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_embeddings_are_deterministic_and_similar_texts_are_close():
+    a, b = FakeEmbeddings(size=64), FakeEmbeddings(size=64)
+    assert a.embed_query("refund my order") == b.embed_query("refund my order")
+    assert a.embed_documents(["x y", "z"]) == [a.embed_query("x y"), a.embed_query("z")]
+    v = np.array(a.embed_documents(["refund my double charge", "refund my charge", "reset my password"]))
+    assert np.allclose(np.linalg.norm(v, axis=1), 1.0)
+    assert v[0] @ v[1] > v[0] @ v[2]
+
+
+def test_chat_model_reports_usage_and_streams_the_same_reply():
+    llm = FakeChatModel()
+    msg = llm.invoke("hello " * 40)
+    assert msg.usage_metadata["input_tokens"] == 60 and msg.usage_metadata["output_tokens"] > 0
+    assert "".join(c.content for c in llm.stream("hello")) == msg.content
+
+
+def test_fake_label_matches_keywords():
+    assert fake_label("I was double charged").intents == ["billing"]
+    assert fake_label("refund, or I file a chargeback").severity == "high"
+    assert fake_label("the app crashes when I log in").intents == ["bug", "access"]
+    assert fake_label("dark mode please").intents == ["feature"]
+
+
+def test_synthetic_tickets_are_reproducible():
+    first, again = synthetic_tickets(10, seed=3), synthetic_tickets(10, seed=3)
+    assert [(t.id, t.text, t.metadata) for t in first] == [(t.id, t.text, t.metadata) for t in again]
+    assert [t.text for t in synthetic_tickets(10, seed=4)] != [t.text for t in first]
+
+
+@pytest.mark.parametrize("mode", ["async", "thread"])
+def test_pipeline_benchmark_smoke(mode):
+    out = subprocess.run(
+        [sys.executable, "bench.py", "pipeline", "--tickets", "20", "--concurrency", "4", "--mode", mode],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    assert f"20 tickets  mode={mode}" in out
+    assert "node:draft" in out
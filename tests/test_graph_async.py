@@ -0,0 +1,70 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""graph.ainvoke runs the async node bodies, concurrently, with results matching graph.invoke."""
+
+import asyncio
+import uuid
+
+from app import graph as graph_mod
+from app.graph import graph
+from app.limits import AsyncLimiter
+
+
+def _cfg():
+    return {"configurable": {"thread_id": f"test-{uuid.uuid4().hex}"}}
+
+
+def _summary(out):
+    return (out["intents"], out["missing_requirements"], [r.tool for r in out["executed"]],
+            [r["doc_id"] for r in out["retrieved"]], out["draft"].markdown if out["draft"] else None)
+
+
+def test_ainvoke_matches_invoke(ticket):
+    t = ticket("t1", amount_cents=1500, order_id="A1", explanation="dup")
+    sync = graph.invoke({"ticket": t}, _cfg())
+    out = asyncio.run(graph.ainvoke({"ticket": t}, _cfg()))
+    assert _summary(out) == _summary(sync)
+
+
+def test_ainvoke_uses_the_async_bodies(ticket, monkeypatch):
+    def blocking(*_args, **_kwargs):
+        raise AssertionError("sync body called from ainvoke")
+
+    monkeypatch.setattr(graph_mod, "classify", blocking)
+    monkeypatch.setattr(graph_mod, "draft_reply", blocking)
+    monkeypatch.setattr(graph_mod, "execute_plan", blocking)
+    t = ticket("t1", amount_cents=1500, order_id="A1", explanation="dup")
+    out = asyncio.run(graph.ainvoke({"ticket": t}, _cfg()))
+    assert [r.tool for r in out["executed"]] == ["refund"]
+
+
+def test_many_tickets_on_one_loop(ticket):
+    async def run_all():
+        return await asyncio.gather(*(
+            graph.ainvoke({"ticket": ticket(f"t{i}", amount_cents=1000 + i, order_id=f"A{i}", explanation="dup")}, _cfg())
+            for i in range(40)
+        ))
+
+    outs = asyncio.run(run_all())
+    assert [o["ticket"].id for o in outs] == [f"t{i}" for i in range(40)]
+    assert [o["executed"][0].result["amount"] for o in outs] == [1000 + i for i in range(40)]
+
+
+def test_async_limiter_bounds_concurrency():
+    limit = AsyncLimiter("test", 3)
+    active = peak = 0
+
+    async def call():
+        nonlocal active, peak
+        async with limit:
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def run_all():
+        await asyncio.gather(*(call() for _ in range(20)))
+
+    asyncio.run(run_all())
+    asyncio.run(run_all())  # a fresh loop gets a fresh semaphore
+    assert peak == 3
@@ -0,0 +1,67 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Several tickets on one thread (run.py's fixed --thread): nothing leaks between runs."""
+
+import uuid
+
+from langgraph.types import Command
+
+from app.graph import graph
+
+
+def _cfg():
+    return {"configurable": {"thread_id": f"test-{uuid.uuid4().hex}"}}
+
+
+def test_missing_requirements_cleared_on_next_ticket(ticket):
+    cfg = _cfg()
+    first = graph.invoke({"ticket": ticket("t1", amount_cents=1500, order_id=None, explanation="dup")}, cfg)
+    assert first["missing_requirements"] == ["order_id"]
+    assert "more details" in first["draft"].markdown
+
+    second = graph.invoke({"ticket": ticket("t2", amount_cents=1500, order_id="A1", explanation="dup")}, cfg)
+    assert second["missing_requirements"] == []
+    assert [r.tool for r in second["executed"]] == ["refund"]
+    assert "more details" not in second["draft"].markdown
+
+
+def test_intents_reclassified_per_ticket(ticket):
+    cfg = _cfg()
+    first = graph.invoke({"ticket": ticket("t1", amount_cents=1500, order_id="A1", explanation="dup")}, cfg)
+    assert first["intents"] == ["billing"]
+
+    second = graph.invoke({"ticket": ticket("t2", text="I can't log in, the app crashed with an error")}, cfg)
+    assert "billing" not in second["intents"]
+    assert set(second["intents"]) >= {"access", "bug"}
+    assert second["actions"] is None
+
+    third = graph.invoke({"ticket": ticket("t3", text="How do I change my avatar?")}, cfg)
+    assert third["missing_requirements"] == []
+    assert third["actions"] is None and third["draft"] is None and third["executed"] == []
+
+
+def test_preclassified_applies_to_its_run_only(ticket):
+    cfg = _cfg()
+    pre = {"intents": ["billing"], "severity": "high"}
+    first = graph.invoke({"ticket": ticket("t1", amount_cents=1500, order_id="A1", explanation="dup"),
+                          "preclassified": pre}, cfg)
+    assert first["intents"] == ["billing"] and first["severity"] == "high"
+
+    second = graph.invoke({"ticket": ticket("t2", text="The site is down, outage since noon")}, cfg)
+    assert "billing" not in second["intents"]
+    assert second["actions"] is None
+
+
+def test_hil_resume_then_new_ticket(ticket):
+    cfg = _cfg()
+    parked = graph.invoke({"ticket": ticket("t1", amount_cents=3500, order_id="A1", explanation="dup",
+                                            images=["p.png"])}, cfg)
+    assert parked.get("__interrupt__")
+    done = graph.invoke(Command(resume="approve"), cfg)
+    assert [r.tool for r in done["executed"]] == ["refund"]
+
+    nxt = graph.invoke({"ticket": ticket("t2", amount_cents=1200, order_id="A2", explanation="dup")}, cfg)
+    assert not nxt.get("__interrupt__")
+    assert nxt["approvals"] == {"actions": True}  # auto tier, not the previous human decision
+    assert [r.tool for r in nxt["executed"]] == ["refund"]
+    assert nxt["executed"][0].result["amount"] == 1200
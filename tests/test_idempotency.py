@@ -0,0 +1,180 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Tool-call idempotency: replay, crash-then-retry via the pending lease, and manual reconciliation."""
+
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+from pathlib import Path
+
+from app import export
+from app.export import execute_plan
+from app.idempotency import IdempotencyStore, idempotency_key
+from app.state import ActionPlan, ActionStep, ToolResult
+from app.tools import ToolRejected
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _ok(key, amount=1500):
+    return ToolResult(tool="refund", ok=True, result={"refund_id": "rf_1", "amount": amount}, idempotency_key=key)
+
+
+def _crash_mid_call(db: Path, key: str) -> None:
+    """Claim `key` in another process and die before recording an outcome."""
+    code = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {str(ROOT)!r})
+        from app.idempotency import IdempotencyStore
+        store = IdempotencyStore({str(db)!r}, lease=60)
+        assert store.begin({key!r}, ticket_id="t1", tool="refund") is None
+        os._exit(1)
+    """)
+    assert subprocess.run([sys.executable, "-c", code], env={"OPENAI_API_KEY": "offline"}).returncode == 1
+
+
+def test_key_is_canonical_over_arg_order():
+    assert idempotency_key("t1", "refund", {"a": 1, "b": 2}) == idempotency_key("t1", "refund", {"b": 2, "a": 1})
+    assert idempotency_key("t1", "refund", {"a": 1}) != idempotency_key("t2", "refund", {"a": 1})
+
+
+def test_done_calls_replay_and_failed_calls_retry(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite"))
+    assert store.begin("k", ticket_id="t1", tool="refund") is None
+    store.complete("k", _ok("k"))
+    assert store.begin("k", ticket_id="t1", tool="refund") == _ok("k")
+
+    assert store.begin("f", ticket_id="t1", tool="refund") is None
+    store.complete("f", ToolResult(tool="refund", ok=False, error="503", idempotency_key="f"))
+    assert store.begin("f", ticket_id="t1", tool="refund") is None
+
+
+def test_crash_then_retry_after_lease(tmp_path):
+    db = tmp_path / "idem.sqlite"
+    _crash_mid_call(db, "k")
+
+    store = IdempotencyStore(str(db), lease=0.3)
+    doubt = store.begin("k", ticket_id="t1", tool="refund")
+    assert doubt is not None and not doubt.ok and "no recorded outcome" in doubt.error
+    assert [r["key"] for r in store.in_doubt()] == ["k"]
+
+    time.sleep(0.35)
+    assert store.in_doubt()[0]["lease_expired"]
+    assert store.begin("k", ticket_id="t1", tool="refund") is None     # lease expired: take over
+    assert store.begin("k", ticket_id="t1", tool="refund") is not None  # ...and hold it ourselves
+    store.complete("k", _ok("k"))
+    assert store.begin("k", ticket_id="t1", tool="refund") == _ok("k")
+    assert store.in_doubt() == []
+
+
+def test_without_lease_in_doubt_needs_reconciliation(tmp_path):
+    db = tmp_path / "idem.sqlite"
+    _crash_mid_call(db, "a")
+    _crash_mid_call(db, "b")
+    store = IdempotencyStore(str(db), lease=0)
+    assert not store.begin("a", ticket_id="t1", tool="refund").ok
+
+    # Operator found the refund at the provider: record it, later attempts replay it.
+    assert store.resolve("a", ok=True, result={"refund_id": "rf_9"})
+    replay = store.begin("a", ticket_id="t1", tool="refund")
+    assert replay.ok and replay.result == {"refund_id": "rf_9"} and replay.tool == "refund"
+    assert not store.resolve("a", ok=True)  # no longer pending
+
+    # Operator confirmed it never happened: it may run again.
+    assert store.resolve("b", ok=False)
+    assert store.begin("b", ticket_id="t1", tool="refund") is None
+
+
+def test_release_forgets_the_key(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite"))
+    assert store.begin("k", ticket_id="t1", tool="refund") is None
+    store.release("k")
+    assert store.begin("k", ticket_id="t1", tool="refund") is None
+
+
+def test_one_claimant_among_concurrent_threads(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite"), lease=60)
+    results, barrier = [], threading.Barrier(8)
+
+    def claim():
+        barrier.wait()
+        results.append(store.begin("k", ticket_id="t1", tool="refund"))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sum(r is None for r in results) == 1
+
+
+def test_execute_plan_runs_each_step_once(monkeypatch, tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite"))
+    monkeypatch.setattr(export, "get_store", lambda: store)
+    calls = []
+    schema, impl = export.TOOLS["refund"]
+    monkeypatch.setitem(export.TOOLS, "refund", (schema, lambda args, **kw: calls.append(args) or impl(args, **kw)))
+
+    def plan(amount):
+        args = {"customer_id": "cus_1", "order_id": "A1", "amount": amount, "reason": "duplicate"}
+        return ActionPlan(ticket_id="t1", steps=[ActionStep(tool="refund", args=args, guard="", rationale="")])
+
+    first = execute_plan(plan("1500"))
+    again = execute_plan(plan(1500))  # same validated args: the recorded result is replayed
+    assert len(calls) == 1 and first == again and first[0].ok
+
+
+def _refund_plan():
+    args = {"customer_id": "cus_1", "order_id": "A1", "amount": 1500, "reason": "duplicate"}
+    return ActionPlan(ticket_id="t1", steps=[ActionStep(tool="refund", args=args, guard="", rationale="")])
+
+
+def _patch_refund(monkeypatch, tmp_path, outcomes, lease=60):
+    """Route refund calls through `outcomes` (exceptions raise, dicts return) and record the keys seen."""
+    store = IdempotencyStore(str(tmp_path / "idem.sqlite"), lease=lease)
+    monkeypatch.setattr(export, "get_store", lambda: store)
+    schema, _ = export.TOOLS["refund"]
+    keys = []
+
+    def refund(args, *, idempotency_key):
+        keys.append(idempotency_key)
+        out = outcomes.pop(0)
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+    monkeypatch.setitem(export.TOOLS, "refund", (schema, refund))
+    return store, keys
+
+
+def test_tool_exception_leaves_the_call_in_doubt(monkeypatch, tmp_path):
+    store, keys = _patch_refund(monkeypatch, tmp_path, [TimeoutError("read timed out"), {"refund_id": "rf_9"}])
+    (first,) = execute_plan(_refund_plan())
+    assert not first.ok and "read timed out" in first.error
+    (again,) = execute_plan(_refund_plan())  # the refund may have landed: no second call
+    assert not again.ok and len(keys) == 1
+    assert keys[0] == first.idempotency_key
+    (row,) = store.in_doubt()
+    assert row["key"] == first.idempotency_key and "read timed out" in row["error"]
+
+    assert store.resolve(first.idempotency_key, ok=True, result={"refund_id": "rf_9"})
+    (settled,) = execute_plan(_refund_plan())
+    assert settled.ok and settled.result == {"refund_id": "rf_9"} and len(keys) == 1
+
+
+def test_in_doubt_call_is_retried_with_the_same_key_once_the_lease_expires(monkeypatch, tmp_path):
+    store, keys = _patch_refund(monkeypatch, tmp_path, [TimeoutError("t"), {"refund_id": "rf_9"}], lease=0.05)
+    execute_plan(_refund_plan())
+    time.sleep(0.1)
+    (result,) = execute_plan(_refund_plan())
+    assert result.ok and len(keys) == 2 and keys[0] == keys[1]
+
+
+def test_rejected_call_may_be_retried_at_once(monkeypatch, tmp_path):
+    store, keys = _patch_refund(monkeypatch, tmp_path, [ToolRejected("card expired"), {"refund_id": "rf_9"}])
+    (first,) = execute_plan(_refund_plan())
+    assert not first.ok and first.error == "card expired"
+    (again,) = execute_plan(_refund_plan())
+    assert again.ok and len(keys) == 2 and store.in_doubt() == []
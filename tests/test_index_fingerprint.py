@@ -0,0 +1,67 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Index fingerprints follow the active embeddings; dropped dense legs are counted."""
+
+import os
+
+import pytest
+from langchain_core.documents import Document
+
+from app import fakes
+from app.embeddings import get_embeddings, set_embeddings
+from app.index_store import kb_fingerprint
+from app.retriever import SimpleHybridRetriever, build_hybrid_retriever, retrieval_leg_stats
+
+CHUNKS = [
+    {"text": "Refunds up to $50 within 30 days.", "meta": {"doc_id": "kb1"}},
+    {"text": "Refunds typically settle within 3–5 business days.", "meta": {"doc_id": "kb2"}},
+]
+
+
+@pytest.fixture
+def restore_fakes():
+    yield
+    fakes.install()
+
+
+def test_fingerprint_is_order_independent_and_keyed_by_embedder():
+    a = kb_fingerprint(CHUNKS, embedder="FakeEmbeddings:fake-embed:64")
+    assert a == kb_fingerprint(CHUNKS[::-1], embedder="FakeEmbeddings:fake-embed:64")
+    assert a != kb_fingerprint(CHUNKS, embedder="FakeEmbeddings:fake-embed:32")
+    assert a != kb_fingerprint(CHUNKS[:1], embedder="FakeEmbeddings:fake-embed:64")
+
+
+def test_signature_reports_provider_model_and_dimension(restore_fakes):
+    set_embeddings(fakes.FakeEmbeddings(size=48), model="fake-embed")
+    assert get_embeddings().signature == "FakeEmbeddings:fake-embed:48"
+
+
+def test_swapped_embeddings_do_not_load_a_mismatched_index(tmp_path, restore_fakes):
+    root = str(tmp_path)
+    build_hybrid_retriever(CHUNKS, index_dir=root)
+
+    # Same model name, different vector size: must not reuse the 64-d index.
+    set_embeddings(fakes.FakeEmbeddings(size=32), model="fake-embed")
+    before = retrieval_leg_stats().get("dense.error", 0)
+    hybrid = build_hybrid_retriever(CHUNKS, index_dir=root)
+    assert hybrid.dense.vectorstore.index.d == 32
+    assert len([d for d in os.listdir(root) if not d.startswith(".")]) == 2
+
+    docs = hybrid.invoke("business days")
+    assert {d.metadata["doc_id"] for d in docs} == {"kb1", "kb2"}
+    assert retrieval_leg_stats().get("dense.error", 0) == before
+
+
+def test_dense_failures_are_counted():
+    class Broken:
+        def invoke(self, query):
+            raise RuntimeError("embedding API down")
+
+    class Sparse:
+        def invoke(self, query):
+            return [Document(page_content="x", metadata={"doc_id": "kb1"})]
+
+    before = retrieval_leg_stats().get("dense.error", 0)
+    docs = SimpleHybridRetriever(sparse=Sparse(), dense=Broken()).invoke("q")
+    assert [d.metadata["doc_id"] for d in docs] == ["kb1"]
+    assert retrieval_leg_stats()["dense.error"] == before + 1
@@ -0,0 +1,44 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""A reloaded KB index maps its files instead of reading private copies, and stays editable."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+from app.embeddings import get_embeddings
+from app.index_store import kb_fingerprint, load_index
+from app.kb import KBIndexManager
+from app.retriever import build_hybrid_retriever
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc/self/maps")
+
+CHUNKS = [{"text": f"Refund policy clause {i} covers case {i * 7}.", "meta": {"doc_id": f"kb{i}"}} for i in range(500)]
+
+
+def _mapped(path: Path) -> bool:
+    return str(path) in Path("/proc/self/maps").read_text()
+
+
+def test_faiss_and_bm25_files_are_memory_mapped(tmp_path):
+    build_hybrid_retriever(CHUNKS, index_dir=str(tmp_path))
+    fingerprint = kb_fingerprint(CHUNKS, embedder=get_embeddings().signature)
+    loaded = load_index(str(tmp_path), fingerprint, embeddings=get_embeddings())
+    assert loaded is not None
+    _, store = loaded
+
+    folder = tmp_path / fingerprint
+    assert _mapped(folder / "index.faiss")
+    assert _mapped(folder / "bm25_post_doc.npy")
+    assert store.index.ntotal == len(CHUNKS)
+    assert len(store.similarity_search("refund policy clause", k=3)) == 3
+
+
+def test_mapped_index_can_still_be_edited(tmp_path):
+    KBIndexManager(CHUNKS, index_dir=str(tmp_path)).retriever()
+    kb = KBIndexManager(CHUNKS, index_dir=str(tmp_path))
+    kb.upsert([{"text": "Gift cards are never refundable.", "meta": {"doc_id": "gift"}}])
+    kb.delete(["kb3"])
+    assert kb.search("gift cards never refundable")[0].metadata["doc_id"] == "gift"
+    assert "kb3" not in [d.metadata["doc_id"] for d in kb.search("Refund policy clause 3 covers case 21.")]
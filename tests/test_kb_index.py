@@ -0,0 +1,83 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""On-disk KB index: edits by doc_id, reload from disk, and retention of old versions."""
+
+import os
+
+import pytest
+
+from app import kb as kb_module
+from app import retriever
+from app.index_store import prune_indexes
+from app.kb import KBIndexManager
+
+CHUNKS = [
+    {"text": "Refunds up to $50 within 30 days.", "meta": {"doc_id": "kb1"}},
+    {"text": "Refunds typically settle within 3–5 business days.", "meta": {"doc_id": "kb2"}},
+]
+
+
+def _published(root):
+    return sorted(d for d in os.listdir(root) if not d.startswith("."))
+
+
+def _no_rebuild(*args, **kwargs):
+    raise AssertionError("index was rebuilt instead of loaded")
+
+
+def _ids(docs):
+    return [d.metadata["doc_id"] for d in docs]
+
+
+def test_upsert_delete_and_reload(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    kb = KBIndexManager(CHUNKS, index_dir=root)
+    assert "kb2" in _ids(kb.search("how many business days to settle"))
+
+    kb.upsert([{"text": "Gift cards are never refundable.", "meta": {"doc_id": "kb3"}}])
+    kb.delete(["kb2"])
+    assert _ids(kb.search("gift cards"))[0] == "kb3"
+    assert "kb2" not in _ids(kb.search("business days settle"))
+
+    # A fresh process with the edited content loads the published index instead of rebuilding.
+    edited = [CHUNKS[0], {"text": "Gift cards are never refundable.", "meta": {"doc_id": "kb3"}}]
+    monkeypatch.setattr(retriever.FAISS, "from_documents", _no_rebuild)
+    reloaded = KBIndexManager(edited, index_dir=root)
+    assert _ids(reloaded.search("gift cards"))[0] == "kb3"
+    assert len(_published(root)) <= 2
+
+
+def test_repeated_edits_keep_only_newest_versions(tmp_path, monkeypatch):
+    monkeypatch.setattr(kb_module, "KB_INDEX_KEEP", 2)
+    root = str(tmp_path)
+    kb = KBIndexManager(CHUNKS, index_dir=root)
+    kb.warmup()
+    for i in range(6):
+        kb.upsert([{"text": f"Edit number {i} of the shipping policy.", "meta": {"doc_id": "kb9"}}])
+    assert len(_published(root)) == 2
+
+    # Reverting to earlier content reuses its directory (if kept) and keeps it as newest.
+    kb.upsert([{"text": "Edit number 4 of the shipping policy.", "meta": {"doc_id": "kb9"}}])
+    assert len(_published(root)) == 2
+
+
+def test_prune_keeps_current_and_sweeps_stale_temp_dirs(tmp_path):
+    for name, age in (("a", 30), ("b", 20), ("c", 10)):
+        d = tmp_path / name
+        d.mkdir()
+        (d / "manifest.json").write_text("{}")
+        t = os.path.getmtime(d / "manifest.json") - age
+        os.utime(d / "manifest.json", (t, t))
+    (tmp_path / ".c.tmp1").mkdir()                     # a writer still going
+    old_tmp = tmp_path / ".b.tmp2"
+    old_tmp.mkdir()
+    os.utime(old_tmp, (1, 1))                            # a writer that died long ago
+
+    assert prune_indexes(str(tmp_path), keep=2, current="a") == 2
+    assert sorted(os.listdir(tmp_path)) == [".c.tmp1", "a", "c"]
+
+
+@pytest.mark.parametrize("keep", [0, -1])
+def test_prune_disabled(tmp_path, keep):
+    (tmp_path / "a").mkdir()
+    assert prune_indexes(str(tmp_path), keep=keep) == 0
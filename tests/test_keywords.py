@@ -0,0 +1,82 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""KeywordMatcher: same answers as a naive whole-word regex, with separator and suffix handling."""
+
+import random
+import re
+
+import pytest
+
+from app.keywords import KeywordMatcher, normalize
+from app.plan import BILLING_MATCHER, REFUND_KEYWORDS
+
+KEYWORDS = ["refund", "refunds", "double charge", "double charged", "charge", "charged twice",
+            "money back", "over-charge", "ref", "c++ bug"]
+SUFFIXES = ("s", "es", "d", "ed", "ing")
+
+
+def _naive(keywords, suffixes=()):
+    """Longest-first alternation with lookbehind boundaries: the obvious, slower pattern."""
+    alts = sorted({normalize(k) for k in keywords}, key=len, reverse=True)
+    body = "|".join(r"[\s\-]+".join(re.escape(w) for w in k.split(" ")) for k in alts)
+    suffix = "(?:" + "|".join(re.escape(s) for s in sorted(suffixes, key=len, reverse=True)) + ")?" if suffixes else ""
+    return re.compile(rf"(?<!\w)(?P<kw>{body}){suffix}(?!\w)")
+
+
+def _random_text(rnd, n_words):
+    words = ["refund", "Refunds", "double", "DOUBLE", "charge", "charged", "twice", "money", "back", "over",
+             "xrefund", "refundx", "ref", "c++", "bug", "charging", "the", "a", "_refund", "refund_", "é"]
+    seps = [" ", "  ", "-", " - ", "\n", ", ", ".", "!", "\t"]
+    return "".join(rnd.choice(words) + rnd.choice(seps) for _ in range(n_words))
+
+
+@pytest.mark.parametrize("suffixes", [(), SUFFIXES])
+def test_agrees_with_naive_regex_on_random_text(suffixes):
+    matcher, naive = KeywordMatcher(KEYWORDS, suffixes=suffixes), _naive(KEYWORDS, suffixes)
+    canonical = {normalize(k): k for k in reversed(KEYWORDS)}
+    rnd = random.Random(0)
+    for _ in range(2000):
+        text = _random_text(rnd, rnd.randint(0, 12))
+        expected = list(dict.fromkeys(canonical[normalize(m.group("kw"))] for m in naive.finditer(text.lower())))
+        assert matcher.matches(text) == expected, text
+        assert matcher.search(text) == bool(expected), text
+
+
+@pytest.mark.parametrize("text,hit", [
+    ("I want a REFUND.", True),
+    ("refund", True),
+    ("nonrefundable item", False),         # no match inside a word
+    ("refunded yesterday", False),         # suffixes are opt-in
+    ("refund_id=42", False),               # underscore is a word character
+    ("(refund)", True),
+])
+def test_whole_words_only(text, hit):
+    assert KeywordMatcher(["refund"]).search(text) is hit
+
+
+def test_separator_runs_and_suffixes():
+    m = KeywordMatcher(["double charge"], suffixes=("d",))
+    for text in ("double charge", "Double-Charged", "double \n - charge", "DOUBLE--charged"):
+        assert m.matches(text) == ["double charge"], text
+    assert not m.search("doublecharge")
+    assert not m.search("double chargex")
+
+
+def test_longest_keyword_wins_and_reports_the_original_spelling():
+    m = KeywordMatcher(["money", "Money Back", "money-back guarantee"])
+    assert m.matches("money back guarantee, money back, money") == ["money-back guarantee", "Money Back", "money"]
+    assert m.keywords == ["money", "Money Back", "money-back guarantee"]
+
+
+def test_billing_matcher_covers_the_refund_keywords():
+    for kw in REFUND_KEYWORDS:
+        assert BILLING_MATCHER.search(f"Hi, {kw.upper()} please"), kw
+    for text in ("I was double-charged", "You keep overcharging me", "stop over-charging my card",
+                 "double charging again", "refunding takes forever", "two chargebacks"):
+        assert BILLING_MATCHER.search(text), text
+    assert not BILLING_MATCHER.search("How do I change my avatar?")
+
+
+def test_empty_keyword_list_is_rejected():
+    with pytest.raises(ValueError):
+        KeywordMatcher([])
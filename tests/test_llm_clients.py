@@ -0,0 +1,67 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Chat clients are built once per config (and per event loop) and share one HTTP pool."""
+
+import asyncio
+
+import pytest
+
+from app import fakes
+from app.classify import IntentLabel
+from app.llm import aclose_models, get_chat_model, get_structured_model, set_chat_model_factory, shared_http_client
+
+
+@pytest.fixture
+def real_openai():
+    set_chat_model_factory(None)
+    yield
+    fakes.install()
+
+
+def test_same_config_reuses_one_client():
+    a = get_chat_model(api_key="k", model="m")
+    assert get_chat_model(api_key="k", model="m") is a
+    assert get_chat_model(api_key="k", model="m", temperature=0.2) is not a
+    assert get_chat_model(api_key="other", model="m") is not a
+    s = get_structured_model(IntentLabel, api_key="k", model="m")
+    assert get_structured_model(IntentLabel, api_key="k", model="m") is s
+
+
+def test_each_event_loop_gets_its_own_client():
+    sync = get_chat_model(api_key="k", model="m")
+
+    async def twice():
+        return get_chat_model(api_key="k", model="m"), get_chat_model(api_key="k", model="m")
+
+    first, again = asyncio.run(twice())
+    second, _ = asyncio.run(twice())
+    assert first is again
+    assert first is not sync and second is not first
+
+
+def test_swapping_the_factory_drops_cached_clients():
+    before = get_chat_model(api_key="k", model="m")
+    fakes.install()
+    assert get_chat_model(api_key="k", model="m") is not before
+
+
+def test_openai_clients_share_the_keepalive_pool(real_openai):
+    a = get_chat_model(api_key="sk-test", model="gpt-4o-mini")
+    b = get_chat_model(api_key="sk-test", model="gpt-4o")
+    assert a is not b
+    assert a.http_client is b.http_client is shared_http_client()
+
+
+def test_aclose_models_closes_the_loop_pool(real_openai):
+    async def run():
+        a = get_chat_model(api_key="sk-test", model="gpt-4o-mini")
+        b = get_chat_model(api_key="sk-test", model="gpt-4o")
+        assert a.http_async_client is b.http_async_client
+        await aclose_models()
+        fresh = get_chat_model(api_key="sk-test", model="gpt-4o-mini")
+        await aclose_models()
+        return a.http_async_client, fresh
+
+    pool, fresh = asyncio.run(run())
+    assert pool.is_closed
+    assert fresh.http_async_client is not pool and fresh.http_async_client.is_closed
@@ -0,0 +1,124 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Policy packs: the vectorized batch evaluators agree with the per-ticket path, row by row."""
+
+import random
+
+import numpy as np
+import pytest
+
+from app.policy import which_missing, which_missing_columns
+from app.policy_engine import PolicyPack, load_policy_pack
+
+_KEYS = {
+    "outside_window": [True, False, 0, 1],
+    "nonrefundable": [True, False],
+    "gift_card": [True, False, "", "yes"],
+    "digital_item_delivered": [True, False],
+    "evidence_of_non_delivery": [True, False],
+    "chargeback_open": [True, False],
+    "fraud_score": [0, 50, 79, 80, 95, 80.5],
+    "fraud_threshold": [60, 80, "90", 85.9],
+    "payment_method": ["card", "paypal", "wire", "crypto"],
+    "recent_refund_count": [0, 2, 3, 5],
+    "refund_rate_limit": [1, 3, "4"],
+    "manual_review_hold": [True, False],
+    "physical_item": [True, False],
+    "requires_return": [True, False],
+    "return_status": ["", "initiated", "received", "none"],
+    "images": [[], ["p.png"]],
+    "evidence_required": [True, False],
+    "photo_threshold_cents": [500, 2000, 5000],
+    "order_id": ["A1", "", None],
+    "explanation": ["dup", ""],
+}
+
+
+def _random_rows(n, seed):
+    rnd = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        # Each key is absent from a row about half the time.
+        rows.append({k: rnd.choice(vals) for k, vals in _KEYS.items() if rnd.random() < 0.5})
+    cents = [rnd.choice([100, 999, 1000, 1999, 2000, 4999, 5000, 9000]) for _ in range(n)]
+    return rows, cents
+
+
+def _columns(rows):
+    """Object columns with None for absent cells, as a JSONL/DataFrame reader would give them."""
+    return {k: [r.get(k) for r in rows] for k in _KEYS}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_vectorized_matches_scalar_on_random_metadata(seed):
+    pack = load_policy_pack()
+    rows, cents = _random_rows(500, seed)
+    blocked, reasons = pack.evaluate_blocks(_columns(rows), cents)
+    evidence = pack.evaluate_evidence(_columns(rows), cents)
+    for i, (m, c) in enumerate(zip(rows, cents)):
+        assert pack.block_reason(m, cents=c) == (bool(blocked[i]), reasons[i])
+        assert pack.required_evidence(cents=c, metadata=m) == [k for k in pack.evidence_items if evidence[k][i]]
+
+
+def test_numpy_columns_match_object_columns():
+    pack = load_policy_pack()
+    rng = np.random.default_rng(0)
+    n = 200
+    cols = {
+        "fraud_score": rng.integers(0, 100, n).astype(float),
+        "recent_refund_count": rng.integers(0, 5, n),
+        "gift_card": rng.random(n) < 0.2,
+        "payment_method": rng.choice(np.array(["card", "wire", "crypto"]), n),
+    }
+    cols["fraud_score"][::7] = np.nan  # absent cells in a float column take the default
+    obj = {k: [None if isinstance(v, float) and np.isnan(v) else v for v in col.tolist()] for k, col in cols.items()}
+    cents = rng.integers(100, 8000, n)
+    reasons = pack.evaluate_blocks(cols, cents)[1]
+    assert np.array_equal(reasons, pack.evaluate_blocks(obj, cents)[1])
+    for i in range(n):
+        meta = {k: v[i] for k, v in obj.items() if v[i] is not None}
+        assert pack.block_reason(meta, cents=int(cents[i]))[1] == reasons[i]
+
+
+def test_missing_columns_match_which_missing():
+    rows, cents = _random_rows(300, 7)
+    texts = ["", "short", "I was double charged for order A1 last week and want my money back."] * 100
+    pack = load_policy_pack()
+    cols = _columns(rows)
+    required = pack.evaluate_evidence(cols, cents)
+    missing = which_missing_columns(required=required, columns=cols, text=texts)
+    for i, m in enumerate(rows):
+        req = [k for k in pack.evidence_items if required[k][i]]
+        assert which_missing(required=req, metadata=m, text=texts[i]) == [k for k in req if missing[k][i]]
+
+
+def test_first_matching_block_wins_and_evidence_dedupes():
+    pack = PolicyPack({
+        "blocks": [{"reason": "a", "when": {"truthy": "x"}}, {"reason": "b", "when": {"truthy": "x"}}],
+        "evidence": [{"item": "e", "when": True}, {"item": "e", "when": {"gt": ["$cents", 0]}}],
+    })
+    assert pack.block_reason({"x": 1}, cents=100) == (True, "a")
+    assert list(pack.evaluate_blocks({"x": [1, 0]}, [100, 100])[1]) == ["a", ""]
+    assert pack.required_evidence(cents=5, metadata={}) == ["e"]
+
+
+def test_block_rules_can_use_the_requested_amount():
+    pack = PolicyPack({"blocks": [
+        {"reason": "wire_over_limit", "when": {"all": [{"in": ["payment_method", ["wire"]]}, {"gt": ["$cents", 2500]}]}},
+    ]})
+    assert pack.block_reason({"payment_method": "wire"}, cents=3000) == (True, "wire_over_limit")
+    assert pack.block_reason({"payment_method": "wire"}, cents=2000) == (False, "")
+    blocked, reasons = pack.evaluate_blocks({"payment_method": ["wire", "wire", "card"]}, [3000, 2000, 3000])
+    assert list(blocked) == [True, False, False]
+    assert list(reasons) == ["wire_over_limit", "", ""]
+
+
+@pytest.mark.parametrize("spec", [
+    {"blocks": [{"reason": "r", "when": {"gt": ["$amount", 1]}}]},
+    {"blocks": [{"reason": "r", "when": {"nope": "x"}}]},
+    {"blocks": [{"reason": "r", "when": {"gte": [True, 1]}}]},
+    {"blocks": [{"reason": "r", "when": {"gte": [{"field": "x", "cast": "str"}, 1]}}]},
+])
+def test_bad_packs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        PolicyPack(spec)
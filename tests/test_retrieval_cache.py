@@ -0,0 +1,54 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Retrieval result cache: keyed on normalized ticket text and KB version."""
+
+import asyncio
+
+from app.kb import KBIndexManager, normalize_query
+
+CHUNKS = [
+    {"text": "Refunds up to $50 within 30 days.", "meta": {"doc_id": "kb1"}},
+    {"text": "Refunds typically settle within 3–5 business days.", "meta": {"doc_id": "kb2"}},
+]
+
+
+class _Counting:
+    def __init__(self, inner):
+        self.inner, self.calls = inner, 0
+
+    def invoke(self, query):
+        self.calls += 1
+        return self.inner.invoke(query)
+
+    async def ainvoke(self, query):
+        self.calls += 1
+        return await self.inner.ainvoke(query)
+
+
+def _kb():
+    kb = KBIndexManager(CHUNKS, index_dir=None)
+    counting = _Counting(kb.retriever())
+    kb._provider.swap(counting)
+    return kb, counting
+
+
+def test_normalize_query():
+    assert normalize_query("  I was DOUBLE-charged!!  ") == normalize_query("i was double charged")
+    assert normalize_query("Ｒｅｆｕｎｄ") == "refund"  # full-width folds to ASCII
+
+
+def test_repeat_and_reworded_queries_hit_the_cache():
+    kb, counting = _kb()
+    first = kb.search("Refund please!")
+    assert kb.search("refund   please") is first
+    assert asyncio.run(kb.asearch("REFUND, please")) is first
+    assert counting.calls == 1
+    assert kb.cache_stats()["hits"] == 2
+
+
+def test_kb_edit_invalidates_cached_results():
+    kb = KBIndexManager(CHUNKS, index_dir=None)
+    assert "kb3" not in [d.metadata["doc_id"] for d in kb.search("business days")]
+    kb.upsert([{"text": "Business days exclude public holidays.", "meta": {"doc_id": "kb3"}}])
+    assert "kb3" in [d.metadata["doc_id"] for d in kb.search("business days")]
+    assert kb.version == 1
@@ -0,0 +1,30 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Checkpoints keep retrieval refs (doc_id, score), not chunk text; text is resolved from the KB."""
+
+import uuid
+
+from app.graph import graph, kb, resolve_chunks
+
+
+def test_state_holds_refs_only(ticket):
+    cfg = {"configurable": {"thread_id": f"test-{uuid.uuid4().hex}"}}
+    out = graph.invoke({"ticket": ticket(amount_cents=1200, order_id="A1", explanation="dup")}, cfg)
+    assert out["retrieved"]
+    for ref in out["retrieved"]:
+        assert set(ref) == {"doc_id", "score"}
+        assert isinstance(ref["score"], float)
+    # The draft still cites the resolved sources.
+    assert out["draft"].citations and all(c.startswith("kb://") for c in out["draft"].citations)
+
+
+def test_resolve_chunks_expands_known_ids_in_order():
+    snippets = resolve_chunks([{"doc_id": "kb2", "score": 0.5}, {"doc_id": "kb1", "score": 0.25}])
+    assert [s["doc_id"] for s in snippets] == ["kb2", "kb1"]
+    assert snippets[0] == {"doc_id": "kb2", "source": "kb://settlement",
+                           "text": kb.get_chunk("kb2")["text"], "score": 0.5}
+
+
+def test_resolve_chunks_drops_ids_removed_from_the_kb():
+    assert resolve_chunks([{"doc_id": "gone", "score": 1.0}]) == []
+    assert resolve_chunks(None) == []
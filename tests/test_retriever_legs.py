@@ -0,0 +1,121 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Hybrid retrieval under load: slow dense calls must not starve the sparse leg."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.documents import Document
+
+from app import retriever
+from app.retriever import SimpleHybridRetriever, _LegPool
+
+
+class _Leg:
+    def __init__(self, prefix: str, delay: float = 0.0):
+        self.prefix, self.delay = prefix, delay
+
+    def invoke(self, query: str):
+        time.sleep(self.delay)
+        return [Document(page_content=f"{self.prefix} {query}", metadata={"doc_id": f"{self.prefix}-{query}"})]
+
+
+def _hybrid(dense_delay: float, dense_timeout: float) -> SimpleHybridRetriever:
+    return SimpleHybridRetriever(sparse=_Leg("bm25"), dense=_Leg("faiss", dense_delay),
+                                 sparse_timeout=0.05, dense_timeout=dense_timeout)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    def install(workers: int) -> _LegPool:
+        p = _LegPool(workers)
+        monkeypatch.setattr(retriever, "_LEG_POOL", p)
+        return p
+    return install
+
+
+def test_sparse_results_survive_slow_dense_under_load(pool):
+    pool(2)
+    hybrid = _hybrid(dense_delay=1.0, dense_timeout=0.2)
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=32) as ex:
+        results = list(ex.map(lambda i: hybrid.invoke(f"q{i}"), range(32)))
+    elapsed = time.monotonic() - started
+
+    for i, docs in enumerate(results):
+        assert f"bm25-q{i}" in [d.metadata["doc_id"] for d in docs]
+    # Every caller gives up on dense after at most one wait for a slot plus one call timeout.
+    assert elapsed < 1.0
+
+
+def test_dense_timeout_starts_when_the_call_starts(pool):
+    pool(1)
+    hybrid = _hybrid(dense_delay=0.15, dense_timeout=0.25)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        results = list(ex.map(lambda q: hybrid.invoke(q), ["a", "b"]))
+    # The second query waits ~0.15s for the only worker, then still gets its full 0.25s.
+    for q, docs in zip("ab", results):
+        assert f"faiss-{q}" in [d.metadata["doc_id"] for d in docs]
+
+
+def test_timed_out_dense_keeps_its_slot_until_it_returns(pool):
+    p = pool(1)
+    hybrid = _hybrid(dense_delay=0.3, dense_timeout=0.05)
+    docs = hybrid.invoke("a")
+    assert [d.metadata["doc_id"] for d in docs] == ["bm25-a"]
+    assert not p._slots.acquire(blocking=False)  # still running
+    time.sleep(0.35)
+    assert p._slots.acquire(blocking=False)
+    p._slots.release()
+
+
+def test_async_sparse_only_when_dense_times_out():
+    hybrid = _hybrid(dense_delay=0.0, dense_timeout=0.05)
+
+    class _SlowAsync(_Leg):
+        async def ainvoke(self, query):
+            await asyncio.sleep(0.5)
+            return self.invoke(query)
+
+    hybrid.dense = _SlowAsync("faiss")
+    docs = asyncio.run(hybrid.ainvoke("a"))
+    assert [d.metadata["doc_id"] for d in docs] == ["bm25-a"]
+
+
+class _AsyncLeg(_Leg):
+    async def ainvoke(self, query):
+        await asyncio.sleep(self.delay)
+        return _Leg(self.prefix).invoke(query)
+
+
+def test_async_legs_run_in_parallel():
+    hybrid = SimpleHybridRetriever(sparse=_Leg("bm25", 0.2), dense=_AsyncLeg("faiss", 0.2),
+                                   sparse_timeout=1.0, dense_timeout=1.0)
+    started = time.monotonic()
+    docs = asyncio.run(hybrid.ainvoke("a"))
+    assert time.monotonic() - started < 0.35
+    assert {d.metadata["doc_id"] for d in docs} == {"bm25-a", "faiss-a"}
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_sparse_timeout_drops_the_leg(pool, mode):
+    pool(2)
+    hybrid = SimpleHybridRetriever(sparse=_Leg("bm25", 0.3), dense=_AsyncLeg("faiss"),
+                                   sparse_timeout=0.05, dense_timeout=1.0)
+    before = retriever.retrieval_leg_stats().get("sparse.timeout", 0)
+
+    async def timed():
+        started = time.monotonic()
+        # Timed inside the loop: asyncio.run() itself waits for the abandoned BM25 thread on exit.
+        return await hybrid.ainvoke("a"), time.monotonic() - started
+
+    if mode == "sync":
+        started = time.monotonic()
+        docs, elapsed = hybrid.invoke("a"), time.monotonic() - started
+    else:
+        docs, elapsed = asyncio.run(timed())
+    assert elapsed < 0.25
+    assert [d.metadata["doc_id"] for d in docs] == ["faiss-a"]
+    assert retriever.retrieval_leg_stats()["sparse.timeout"] == before + 1
@@ -0,0 +1,77 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""The KB retriever is built on first use, once, however many callers race for it."""
+
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from app.retriever import RetrieverProvider
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class _Factory:
+    def __init__(self, delay: float = 0.0, fail: int = 0):
+        self.calls, self.delay, self.fail = 0, delay, fail
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.calls <= self.fail:
+            raise RuntimeError("embedding API down")
+        return object()
+
+
+def test_builds_lazily_and_once_under_concurrency():
+    factory = _Factory(delay=0.05)
+    provider = RetrieverProvider(factory)
+    assert not provider.ready and factory.calls == 0
+
+    got = []
+    threads = [threading.Thread(target=lambda: got.append(provider.get())) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert factory.calls == 1 and provider.ready
+    assert all(r is got[0] for r in got)
+
+
+def test_background_warmup_then_get_waits_for_it():
+    factory = _Factory(delay=0.1)
+    provider = RetrieverProvider(factory)
+    thread = provider.warmup(background=True)
+    assert thread is not None and provider.get() is not None
+    thread.join()
+    assert factory.calls == 1
+
+
+def test_failed_background_build_is_retried_by_get():
+    factory = _Factory(fail=1)
+    provider = RetrieverProvider(factory)
+    provider.warmup(background=True).join()
+    assert not provider.ready
+    assert provider.get() is not None and factory.calls == 2
+
+
+def test_swap_and_reset():
+    factory = _Factory()
+    provider = RetrieverProvider(factory)
+    first = provider.get()
+    replacement = object()
+    provider.swap(replacement)
+    assert provider.get() is replacement
+    provider.reset()
+    assert provider.get() is not first and factory.calls == 2
+
+
+def test_importing_the_graph_does_not_build_the_index():
+    code = (
+        "import sys; sys.path.insert(0, 'tests'); import conftest\n"
+        "from app import graph\n"
+        "assert not graph.kb.ready\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
@@ -0,0 +1,55 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Reciprocal Rank Fusion: weights, dedupe across lists, truncation and tie-breaks."""
+
+import pytest
+from langchain_core.documents import Document
+
+from app.retriever import chunk_id, rrf_merge
+
+
+def _doc(doc_id, text=None):
+    return Document(page_content=text or f"text of {doc_id}", metadata={"doc_id": doc_id})
+
+
+def _ids(docs):
+    return [d.metadata["doc_id"] for d in docs]
+
+
+def test_fused_scores_follow_weighted_rrf():
+    sparse = [_doc("a"), _doc("b")]
+    dense = [_doc("b"), _doc("c")]
+    fused = rrf_merge(sparse, dense, k_rrf=60, weights=[0.4, 0.6])
+    scores = {d.metadata["doc_id"]: d.metadata["score"] for d in fused}
+    assert scores["b"] == pytest.approx(0.4 / 62 + 0.6 / 61)
+    assert scores["a"] == pytest.approx(0.4 / 61)
+    assert scores["c"] == pytest.approx(0.6 / 62)
+    assert _ids(fused) == ["b", "c", "a"]
+
+
+def test_only_first_k_of_each_list_count_and_top_n_truncates():
+    ranked = [_doc(str(i)) for i in range(10)]
+    assert _ids(rrf_merge(ranked, k=3)) == ["0", "1", "2"]
+    assert _ids(rrf_merge(ranked, k=10, top_n=2)) == ["0", "1"]
+
+
+def test_any_number_of_lists_with_equal_default_weights():
+    fused = rrf_merge([_doc("a")], [_doc("b")], [_doc("b")])
+    assert _ids(fused) == ["b", "a"]
+    with pytest.raises(ValueError):
+        rrf_merge([_doc("a")], [_doc("b")], weights=[1.0])
+
+
+def test_ties_go_to_the_shorter_chunk_and_inputs_are_not_mutated():
+    long, short = _doc("long", "x" * 50), _doc("short", "x")
+    fused = rrf_merge([long], [short])
+    assert _ids(fused) == ["short", "long"]
+    assert "score" not in long.metadata
+
+
+def test_documents_without_doc_id_dedupe_by_content():
+    a1 = Document(page_content="same text")
+    a2 = Document(page_content="same text")
+    assert len(rrf_merge([a1], [a2])) == 1
+    assert chunk_id({"text": "same text"}) == chunk_id({"text": "same text", "meta": {}})
+    assert chunk_id({"text": "t", "meta": {"doc_id": "kb7"}}) == "kb7"
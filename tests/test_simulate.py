@@ -0,0 +1,99 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Policy simulation: vectorized tiers match plan_actions row by row; JSONL and Parquet read alike."""
+
+import json
+import random
+from collections import Counter
+
+import pytest
+
+from app import plan
+from app.plan import plan_actions
+from app.simulate import TIERS, Simulation, Thresholds, _to_columns, format_report, simulate
+
+from conftest import make_ticket
+
+_TEXTS = ["I was double charged, please refund.", "Refund my order please", "How do I reset my password?", ""]
+
+
+def _random_rows(n, seed):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        meta = {}
+        if rnd.random() < 0.9:
+            meta["amount_cents"] = rnd.choice([0, 500, 2000, 2001, 4999, 5000, 5001, 9000])
+        if rnd.random() < 0.8:
+            meta["order_id"] = f"A{i}"
+        if rnd.random() < 0.7:
+            meta["explanation"] = "charged twice"
+        for key, p in (("chargeback_open", 0.1), ("physical_item", 0.2), ("evidence_required", 0.2)):
+            if rnd.random() < p:
+                meta[key] = True
+        if rnd.random() < 0.3:
+            meta["fraud_score"] = float(rnd.choice([10, 80, 95]))
+        if rnd.random() < 0.3:
+            meta["payment_method"] = rnd.choice(["card", "wire"])
+        if rnd.random() < 0.2:
+            meta["return_status"] = rnd.choice(["initiated", "none"])
+        rows.append({"id": f"t{i}", "text": rnd.choice(_TEXTS), "metadata": meta})
+    return rows
+
+
+def _plan_tier(row):
+    """The TIERS entry plan_actions' decision for this row corresponds to."""
+    ticket = make_ticket(row["id"], row["text"], **row["metadata"])
+    actions, missing = plan_actions({"ticket": ticket, "intents": []})
+    if actions is None:
+        return "MISSING" if missing else "NOT_BILLING"
+    step = actions.steps[0]
+    if step.guard.startswith("policy_block_"):
+        return "BLOCKED"
+    if step.guard == "auto_escalate_over_cap":
+        return "OVER_CAP"
+    if step.guard == "auto_escalate_high":
+        return "HIGH"
+    return "HIL" if actions.requires_approval else "AUTO"
+
+
+def _sim_tier(row, setting):
+    sim = Simulation([setting])
+    sim.add(_to_columns([row["metadata"]]), 1, [row["text"]])
+    (tier,) = [t for t, c in sim.report()["settings"][0]["tiers"].items() if c]
+    return tier
+
+
+@pytest.mark.parametrize("setting", [Thresholds(), Thresholds(low=1000, medium=3000, cap=4000)])
+def test_tiers_match_plan_actions_per_row(setting, monkeypatch):
+    monkeypatch.setattr(plan, "LOW_THRESHOLD_CENTS", setting.low)
+    monkeypatch.setattr(plan, "MEDIUM_THRESHOLD_CENTS", setting.medium)
+    monkeypatch.setattr(plan, "REFUND_CAP_CENTS", setting.cap)
+    rows = _random_rows(300, seed=setting.low)
+    for row in rows:
+        assert _sim_tier(row, setting) == _plan_tier(row), row
+
+    sim = Simulation([setting])
+    sim.add(_to_columns([r["metadata"] for r in rows]), len(rows), [r["text"] for r in rows])
+    expected = Counter(_plan_tier(r) for r in rows)
+    assert sim.report()["settings"][0]["tiers"] == {t: expected.get(t, 0) for t in TIERS}
+
+
+def test_chunked_jsonl_and_parquet_give_the_same_report(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = _random_rows(200, seed=1)
+    settings = [Thresholds(), Thresholds(low=500, medium=2000, cap=5000)]
+
+    jsonl = tmp_path / "tickets.jsonl"
+    jsonl.write_text("".join(json.dumps(r) + "\n" for r in rows), encoding="utf-8")
+    whole = simulate(str(jsonl), settings, chunk_rows=1000)
+    assert simulate(str(jsonl), settings, chunk_rows=17) == whole
+    assert whole["tickets"] == 200
+
+    flat = [{**r["metadata"], "text": r["text"]} for r in rows]
+    keys = sorted({k for f in flat for k in f})
+    parquet = tmp_path / "tickets.parquet"
+    pq.write_table(pa.table({k: [f.get(k) for f in flat] for k in keys}), parquet)
+    assert simulate(str(parquet), settings, chunk_rows=33) == whole
+    assert "200 tickets" in format_report(whole)
@@ -0,0 +1,113 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Span aggregation and LLM cost accounting (prompt-cache hits at each model's cached rate)."""
+
+import asyncio
+import json
+import uuid
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from langgraph.errors import GraphInterrupt
+
+from app import telemetry
+from app.telemetry import LLMUsageCallback, Telemetry, estimate_cost, summarize_trace
+
+
+@pytest.fixture
+def tel(monkeypatch):
+    t = Telemetry()
+    monkeypatch.setattr(telemetry, "TELEMETRY", t)
+    return t
+
+
+def test_cached_input_uses_per_model_rate():
+    # gpt-4o-mini: cached input at half price; gpt-4.1-mini: at a quarter.
+    assert estimate_cost("gpt-4o-mini", 1_000_000, cached_in=1_000_000) == pytest.approx(0.075)
+    assert estimate_cost("gpt-4.1-mini", 1_000_000, cached_in=1_000_000) == pytest.approx(0.10)
+    assert estimate_cost("gpt-4.1-mini", 2_000_000, 1_000_000, cached_in=1_000_000) == pytest.approx(0.40 + 0.10 + 1.60)
+    # No cached rate configured: cached tokens cost full input price; unknown models cost 0.
+    assert estimate_cost("text-embedding-3-small", 1_000_000, cached_in=500_000) == pytest.approx(0.02)
+    assert estimate_cost("some-local-model", 1_000_000, 1_000_000) == 0.0
+
+
+def test_llm_callback_records_tokens_and_cost(tel):
+    cb, run = LLMUsageCallback(), uuid.uuid4()
+    cb.on_chat_model_start({}, [[]], run_id=run, invocation_params={"model": "gpt-4.1-mini"})
+    msg = AIMessage(content="hi", usage_metadata={
+        "input_tokens": 2000, "output_tokens": 100, "total_tokens": 2100,
+        "input_token_details": {"cache_read": 1024},
+    })
+    cb.on_llm_end(LLMResult(generations=[[ChatGeneration(message=msg)]]), run_id=run)
+
+    row = tel.summary()["llm:gpt-4.1-mini"]
+    assert (row["tokens_in"], row["tokens_out"], row["cached_tokens"]) == (2000, 100, 1024)
+    assert row["cost_usd"] == pytest.approx((976 * 0.40 + 1024 * 0.10 + 100 * 1.60) / 1_000_000)
+
+
+def test_spans_fold_into_summary_and_trace_replay(tel):
+    with telemetry.span("tool", "refund"):
+        pass
+    with pytest.raises(ValueError):
+        with telemetry.span("tool", "refund"):
+            raise ValueError("boom")
+    telemetry.count("cache", "draft", cache_hits=1)
+
+    summary = tel.summary()
+    assert summary["tool:refund"]["count"] == 2 and summary["tool:refund"]["errors"] == 1
+    assert summary["cache:draft"]["cache_hits"] == 1
+
+    rows = [{"kind": "tool", "name": "refund", "ms": 5.0, "ts": 0}, {"kind": "tool", "name": "refund", "ms": 7.0, "ts": 0}]
+    assert summarize_trace(rows)["tool:refund"]["p50"] == 7.0
+
+
+def test_traced_node_is_identity_when_tracing_is_off(monkeypatch):
+    monkeypatch.setattr(telemetry, "TELEMETRY", None)
+
+    def node(state):
+        return {}
+
+    assert telemetry.traced_node(node) is node
+
+
+def test_traced_node_scopes_inner_spans_to_the_run(tmp_path, monkeypatch, ticket):
+    t = Telemetry(str(tmp_path / "trace.jsonl"))
+    monkeypatch.setattr(telemetry, "TELEMETRY", t)
+
+    def node(state, config):
+        with telemetry.span("tool", "refund"):
+            pass
+        return {"seen": config["configurable"]["thread_id"]}
+
+    async def anode(state):
+        telemetry.count("cache", "draft", cache_hits=1)
+        return {}
+
+    cfg = {"configurable": {"thread_id": "th-1"}}
+    assert telemetry.traced_node(node, "execute")({"ticket": ticket("t9")}, cfg) == {"seen": "th-1"}
+    asyncio.run(telemetry.traced_node(anode, "draft")({"ticket": ticket("t9")}, cfg))
+    t.close()
+
+    rows = [json.loads(line) for line in (tmp_path / "trace.jsonl").read_text().splitlines()]
+    assert [(r["kind"], r["name"], r["node"]) for r in rows] == [
+        ("tool", "refund", "execute"), ("node", "execute", "execute"),
+        ("cache", "draft", "draft"), ("node", "draft", "draft"),
+    ]
+    assert all(r["thread_id"] == "th-1" and r["ticket_id"] == "t9" for r in rows)
+
+
+def test_traced_node_counts_errors_but_not_hil_interrupts(tel):
+    def failing(state):
+        raise ValueError("boom")
+
+    def parked(state):
+        raise GraphInterrupt(())
+
+    with pytest.raises(ValueError):
+        telemetry.traced_node(failing, "execute")({})
+    with pytest.raises(GraphInterrupt):
+        telemetry.traced_node(parked, "approval")({})
+    summary = tel.summary()
+    assert summary["node:execute"]["errors"] == 1
+    assert "errors" not in summary["node:approval"]
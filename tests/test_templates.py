@@ -0,0 +1,68 @@
+# Copyright Lukas Licon 2025. All Rights Reserved.
+
+"""Templated replies: quoted facts come from the snippet they cite."""
+
+from app import templates
+from app.draft import _render_template
+from app.plan import plan_actions
+from app.templates import render_reply
+
+POLICY = "Refunds up to $50 within 30 days."
+SETTLEMENT = "Refunds typically settle within 3–5 business days."
+
+
+def test_approved_quotes_and_cites_the_settlement_snippet():
+    md = render_reply("APPROVED", amount="$15.00", order_id="A1", snippets=[POLICY, SETTLEMENT])
+    assert "within 3-5 business days, depending on your bank [2]." in md
+    assert "refund policy [1]." in md
+    assert "5-10" not in md
+
+
+def test_citation_indices_follow_snippet_order():
+    md = render_reply("APPROVED", amount="$15.00", snippets=[SETTLEMENT, "Unrelated note.", POLICY])
+    assert "business days, depending on your bank [1]." in md
+    assert "refund policy [3]." in md
+
+
+def test_no_supporting_snippet_means_no_citation(monkeypatch):
+    md = render_reply("APPROVED", amount="$15.00", snippets=["Our office is closed on Sundays."])
+    assert "[" not in md
+    assert "a few business days" in md
+
+    monkeypatch.setattr(templates, "REFUND_SETTLEMENT_DAYS", "2-4")
+    md = render_reply("APPROVED", amount="$15.00")
+    assert "within 2-4 business days, depending on your bank." in md and "[" not in md
+
+
+def test_escalated_quotes_a_timeframe_only_when_configured(monkeypatch):
+    md = render_reply("ESCALATED", amount="$900.00")
+    assert "follow up with you directly." in md and "business days" not in md
+
+    monkeypatch.setattr(templates, "ESCALATION_RESPONSE_DAYS", "1-2")
+    md = render_reply("ESCALATED", amount="$900.00")
+    assert "follow up with you directly, typically within 1-2 business days." in md
+
+
+def test_denied_cites_policy_snippet_only():
+    md = render_reply("DENIED", amount="$900.00", snippets=[SETTLEMENT, POLICY])
+    assert "refund policy [2]." in md
+    assert "business days" not in md
+
+
+def test_render_template_aligns_snippets_with_citations(ticket):
+    t = ticket("t1", amount_cents=1500, order_id="A1", explanation="dup")
+    state = {
+        "ticket": t,
+        "intents": ["billing"],
+        "retrieved": [
+            {"text": "No source, so not citable: refunds within 1 business day."},
+            {"doc_id": "kb1", "url": "kb://refunds", "text": POLICY},
+            {"doc_id": "kb2", "url": "kb://settlement", "text": SETTLEMENT},
+        ],
+        "approvals": {"actions": True},
+    }
+    state["actions"], state["missing_requirements"] = plan_actions(state)
+    markdown, citations = _render_template(state)
+    assert citations == ["kb://refunds", "kb://settlement"]
+    assert "within 3-5 business days, depending on your bank [2]." in markdown
+    assert "refund policy [1]." in markdown